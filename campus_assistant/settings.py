@@ -117,6 +117,185 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
+# Caches
+# 'llm' stores LLM responses on disk so they survive restarts and are shared by workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.llm_cache',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000')),
+            'CULL_FREQUENCY': 4,  # Evict 1/4 of entries when full
+        },
+    },
+}
+
+# LLM response cache - opt-in per endpoint
+# mode: 'always' (any temperature), 'deterministic' (temperature 0 only) or 'never'
+# Teach mode and learn-mode explanations are cached at any temperature. Quizzes and
+# papers are sampled at 0.6-0.7 and must differ between retakes and regenerations, so
+# they stay uncached; RAG chat is covered by SEMANTIC_CACHE below
+LLM_CACHE = {
+    'ENABLED': os.getenv('LLM_CACHE_ENABLED', 'True') == 'True',
+    'ALIAS': 'llm',
+    'DEFAULT_TTL': 60 * 60 * 24,
+    'POLICIES': {
+        'teach': {'mode': 'always', 'ttl': 60 * 60 * 24 * 7},
+        'learn': {'mode': 'always', 'ttl': 60 * 60 * 24},
+        'quiz': {'mode': 'never'},
+        'paper': {'mode': 'never'},
+    },
+}
+
+# Per-document semantic answer cache for RAG chat
+# THRESHOLD is the cosine similarity a new query needs to reuse a cached answer
+SEMANTIC_CACHE = {
+    'ENABLED': os.getenv('SEMANTIC_CACHE_ENABLED', 'True') == 'True',
+    'ALIAS': 'llm',
+    'THRESHOLD': float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+    'MAX_ENTRIES_PER_DOCUMENT': 200,
+    'TTL': 60 * 60 * 24 * 7,
+}
+
+# Single-flight coalescing of identical concurrent LLM requests
+# CROSS_WORKER also coordinates worker processes through a lock in CACHES[ALIAS];
+# point ALIAS at a shared backend (database/Redis) when running several workers
+SINGLE_FLIGHT = {
+    'ENABLED': True,
+    'CROSS_WORKER': os.getenv('SINGLE_FLIGHT_CROSS_WORKER', 'False') == 'True',
+    'ALIAS': 'llm',
+    'LOCK_TIMEOUT': 120,
+    'WAIT_TIMEOUT': 120,
+}
+
+# LLM_BACKEND: 'live' calls Groq/Gemini; 'fake' calls the offline provider (chatbot/fake_provider.py)
+# in-process; 'standin' reaches the same provider over HTTP (python manage.py run_llm_standin)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'live')
+LLM_STANDIN_URL = os.getenv('LLM_STANDIN_URL', 'http://127.0.0.1:8765')
+
+# Per-model rate-limit scheduler. LIMITS are the free-tier quotas and are corrected
+# at runtime from Groq's x-ratelimit-* headers; interactive chat queues ahead of
+# quiz/paper generation and requests that cannot start within DEADLINES get a 429.
+LLM_SCHEDULER = {
+    'ENABLED': os.getenv('LLM_SCHEDULER_ENABLED', 'True') == 'True',
+    'DEFAULT_LIMITS': {'rpm': 30, 'tpm': 6000},
+    'LIMITS': {
+        'llama-3.1-8b-instant': {'rpm': 30, 'tpm': 6000},
+        'llama-3.3-70b-versatile': {'rpm': 30, 'tpm': 12000},
+        'mixtral-8x7b-32768': {'rpm': 30, 'tpm': 5000},
+        'gemini-2.5-flash': {'rpm': 10, 'tpm': 250000},
+        'gemini-2.0-flash-exp': {'rpm': 10, 'tpm': 250000},
+        'gemini-2.0-flash-lite': {'rpm': 30, 'tpm': 1000000},
+    },
+    'DEADLINES': {0: 20, 10: 120},  # seconds, by priority (0 = interactive, 10 = batch)
+}
+
+# Model router: endpoints that do not pin a model get the fastest healthy model of the
+# capability tier they need (1 basic, 2 standard, 3 advanced), from rolling latency/error stats
+MODEL_ROUTER = {
+    'ENABLED': os.getenv('MODEL_ROUTER_ENABLED', 'True') == 'True',
+    'WINDOW_SECONDS': 300,
+    'MAX_ERROR_RATE': 0.5,
+    'HYSTERESIS': 0.2,
+    'MIN_DWELL': 30,
+}
+
+# Hedged generation (opt-in): if the routed model is slower than PERCENTILE of its
+# recent calls, quiz/paper requests are also sent to the next model and the first
+# valid answer wins. BUDGET_RATIO caps hedges at ~10% extra requests.
+LLM_HEDGING = {
+    'ENABLED': os.getenv('LLM_HEDGING_ENABLED', 'False') == 'True',
+    'PERCENTILE': 0.95,
+    'BUDGET_RATIO': 0.1,
+}
+
+# Local stand-in server behaviour (see chatbot/llm_standin.py for all options)
+LLM_STANDIN = {
+    'LATENCY': {'distribution': 'lognormal', 'median': 0.6, 'sigma': 0.5},
+    'ERROR_RATE': 0.0,
+    'RATE_LIMIT_RATE': 0.0,
+}
+
+# Record/replay of provider calls for reproducible benchmarks: 'record' saves every
+# response with its latency to PATH, 'replay' serves them back without network calls
+LLM_CASSETTE = {
+    'MODE': os.getenv('LLM_CASSETTE_MODE', 'off'),
+    'PATH': os.getenv('LLM_CASSETTE_PATH') or BASE_DIR / 'cassettes' / 'llm.json.gz',
+    'SIMULATE_LATENCY': os.getenv('LLM_CASSETTE_SIMULATE_LATENCY', 'False') == 'True',
+}
+
+# Progressive quizzes (/api/quiz/start/) are generated by a per-process thread pool;
+# a quiz still generating STALE_AFTER seconds after its generator started is marked failed
+PROGRESSIVE_QUIZ = {
+    'MAX_WORKERS': 4,
+    'STALE_AFTER': 300,
+}
+
+# Pre-generated quiz question pools per document / heading section, built in the
+# background after upload and sampled by document quizzes without an LLM call
+QUESTION_POOL = {
+    'ENABLED': os.getenv('QUESTION_POOL_ENABLED', 'True') == 'True',
+    'BUILD_ON_UPLOAD': os.getenv('QUESTION_POOL_BUILD_ON_UPLOAD', 'True') == 'True',
+    'DOCUMENT_TARGET': 30,
+    'SECTION_TARGET': 10,
+}
+
+# Map-reduce condensing of long documents / previous papers for quiz and paper
+# generation: sections are digested by a basic-tier model, cached by section hash
+CONCEPT_MAP = {
+    'ENABLED': os.getenv('CONCEPT_MAP_ENABLED', 'True') == 'True',
+    'SECTION_TOKENS': 3000,
+    'MAX_SECTIONS': 30,
+}
+
+# Whole-document quizzes over the input budget use one vector-store chunk per
+# k-means topic cluster (clusters cached on Document.chunk_clusters)
+QUIZ_CONTEXT = {
+    'MAX_CLUSTERS': 24,
+}
+
+# Previous papers are segmented into questions and clustered into ranked
+# per-subject topics; prediction prompts list the top TABLE_SIZE topics
+PAPER_MINING = {
+    'HALF_LIFE_YEARS': 3,
+    'TABLE_SIZE': 60,
+}
+
+# ModelUsage prompt counts are buffered per process and written in one
+# transaction every FLUSH_EVERY prompts, or by a timer FLUSH_INTERVAL seconds
+# after the first unflushed prompt
+USAGE_COUNTERS = {
+    'FLUSH_EVERY': 50,
+    'FLUSH_INTERVAL': 10,
+}
+
+# Near-duplicate question filtering (MinHash/LSH over stemmed word shingles);
+# questions at or above THRESHOLD Jaccard similarity are treated as repeats
+# (previous-paper topic mining uses the looser PAPER_MINING match threshold)
+QUESTION_DEDUP = {
+    'THRESHOLD': float(os.getenv('QUESTION_DEDUP_THRESHOLD', '0.6')),
+}
+
+# In-process offline provider (LLM_BACKEND = 'fake'); also accepts ERROR_RATE, RATE_LIMIT_RATE, SEED
+FAKE_PROVIDER = {
+    'RPM': 30,
+    'TPM': 6000,
+    'LATENCY': 0.05,
+}
+
+# Rolling chat memory: prompts carry chat.summary plus every message not yet folded into it;
+# the summary is refreshed in the background every SUMMARIZE_EVERY messages, leaving the
+# last RECENT_MESSAGES unfolded
+CHAT_MEMORY = {
+    'RECENT_MESSAGES': 6,
+    'SUMMARIZE_EVERY': 10,
+    'SUMMARY_MODEL': 'llama-3.1-8b-instant',
+}
+
 # Email Configuration for Learning Track Sharing & OTP
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
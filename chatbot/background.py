@@ -0,0 +1,41 @@
+"""
+Minimal background task runner
+Runs work in daemon threads so views can return immediately.
+"""
+import threading
+import traceback
+from django.conf import settings
+from django.db import connections
+
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) in a daemon thread
+
+    Each thread gets its own DB connections, which are closed when the task
+    finishes. Set BACKGROUND_TASKS_SYNC = True to run tasks inline (tests,
+    benchmarks, management commands).
+
+    Returns:
+        The started Thread, or None when run inline
+    """
+    def runner():
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            print(f"[BACKGROUND] Task {getattr(fn, '__name__', fn)} failed:")
+            traceback.print_exc()
+        finally:
+            connections.close_all()
+
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            print(f"[BACKGROUND] Task {getattr(fn, '__name__', fn)} failed:")
+            traceback.print_exc()
+        return None
+
+    thread = threading.Thread(target=runner, daemon=True, name=f"bg-{getattr(fn, '__name__', 'task')}")
+    thread.start()
+    return thread
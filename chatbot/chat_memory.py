@@ -0,0 +1,115 @@
+"""
+Rolling conversation memory for long chats
+Each Chat keeps a running summary of its older messages; prompts carry the
+summary plus every message not folded into it yet (at most RECENT_MESSAGES +
+SUMMARIZE_EVERY), so per-turn DB and token cost stays bounded however long
+the chat grows and no turn falls between the summary and the history.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .background import run_in_background
+from .models import Chat
+from .token_budget import fit_text_for_model
+from .llm_scheduler import PRIORITY_BATCH
+from .utils import call_llm_api
+
+DEFAULT_CONFIG = {
+    'RECENT_MESSAGES': 6,        # Messages left out of the summary by each refresh
+    'SUMMARIZE_EVERY': 10,       # Refresh once this many more messages are unsummarized
+    'SUMMARY_MODEL': 'llama-3.1-8b-instant',
+    'SUMMARY_MAX_TOKENS': 300,
+}
+
+
+def get_config() -> dict:
+    """Merge CHAT_MEMORY settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'CHAT_MEMORY', {}))
+    return config
+
+
+def get_recent_history(chat) -> list:
+    """
+    Fetch the messages not yet folded into the summary
+
+    A refresh is scheduled once RECENT_MESSAGES + SUMMARIZE_EVERY messages
+    are pending, so that many covers everything newer than the summary
+    unless a refresh is still running. The prompt builder trims the oldest
+    of them to the token budget.
+
+    Returns:
+        List of {'role', 'content'} dicts, oldest first
+    """
+    config = get_config()
+    recent = list(
+        chat.messages
+        .filter(id__gt=chat.summary_last_message_id)
+        .order_by('-created_at', '-id')
+        .values('role', 'content')[:config['RECENT_MESSAGES'] + config['SUMMARIZE_EVERY']]
+    )
+    recent.reverse()
+    return recent
+
+
+def maybe_schedule_summary(chat):
+    """Refresh the summary in the background every SUMMARIZE_EVERY turns"""
+    config = get_config()
+    pending = chat.messages.filter(id__gt=chat.summary_last_message_id).count()
+    if pending < config['RECENT_MESSAGES'] + config['SUMMARIZE_EVERY']:
+        return
+    
+    # One refresh per chat at a time
+    if cache.add(f'chat_summary_lock:{chat.id}', 1, timeout=300):
+        run_in_background(refresh_summary, chat.id)
+
+
+def refresh_summary(chat_id: int):
+    """Fold messages older than the recent window into the chat's summary"""
+    config = get_config()
+    try:
+        chat = Chat.objects.get(id=chat_id)
+        unsummarized = list(
+            chat.messages
+            .filter(id__gt=chat.summary_last_message_id)
+            .order_by('created_at', 'id')
+            .values('id', 'role', 'content')
+        )
+        to_fold = unsummarized[:-config['RECENT_MESSAGES']]
+        if not to_fold:
+            return
+        
+        transcript = "\n".join(
+            f"{'Student' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in to_fold
+        )
+        transcript = fit_text_for_model(
+            transcript, config['SUMMARY_MODEL'],
+            max_output_tokens=config['SUMMARY_MAX_TOKENS'],
+            reserved_tokens=config['SUMMARY_MAX_TOKENS'] + 200
+        )
+        
+        messages = [
+            {
+                "role": "system",
+                "content": "You maintain a running summary of a study conversation between a student and an AI tutor about their course document. Keep key questions asked, facts explained, and anything the student struggled with. Write at most 150 words of plain prose."
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{chat.summary or '(none yet)'}\n\nNew conversation to fold in:\n{transcript}\n\nReturn the updated summary only."
+            }
+        ]
+        summary = call_llm_api(
+            config['SUMMARY_MODEL'], messages,
+            temperature=0.2, max_tokens=config['SUMMARY_MAX_TOKENS'],
+            priority=PRIORITY_BATCH
+        ).strip()
+        
+        # update() so a concurrent rename or model switch is not overwritten
+        Chat.objects.filter(id=chat_id).update(
+            summary=summary,
+            summary_last_message_id=to_fold[-1]['id']
+        )
+        print(f"[CHAT MEMORY] Folded {len(to_fold)} messages into summary for chat {chat_id}")
+    finally:
+        cache.delete(f'chat_summary_lock:{chat_id}')
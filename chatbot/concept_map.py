@@ -0,0 +1,207 @@
+"""
+Map-reduce condensing of long sources for question generation
+A textbook or a stack of previous papers does not fit one prompt, and
+truncating keeps only the first pages. Sources over the generator's input
+budget are split into sections, every section is reduced in parallel to its
+key concepts (or, for exam papers, the questions and topics it contains) by
+a basic-tier model, and questions are generated from the joined digests.
+Section digests are cached by the hash of the section text, so a document is
+only mapped once however many quizzes and papers are generated from it.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from . import metrics
+from .llm_scheduler import RateLimitExceeded, PRIORITY_BATCH
+from .model_router import router, TIER_BASIC
+from .token_budget import TokenBudget, estimate_tokens, fit_text_for_model, truncate_to_tokens
+
+KEY_PREFIX = 'concepts:v1:'
+KIND_NOTES = 'notes'
+KIND_PAPERS = 'papers'
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'SECTION_TOKENS': 3000,      # Source tokens per map call
+    'MAX_SECTIONS': 30,          # Longer sources get larger sections instead of more calls
+    'DIGEST_TOKENS': 300,        # Completion budget per section digest
+    'MAX_DEPTH': 2,              # Digests still over budget are condensed again up to this depth
+    'MAX_ATTEMPTS': 2,
+    'MAX_WORKERS': 4,
+    'CACHE_ALIAS': 'llm',
+    'CACHE_TTL': 60 * 60 * 24 * 30,
+}
+
+MAP_PROMPTS = {
+    KIND_NOTES: """Extract the key concepts from this section of study material.
+For each concept write one bullet: the term, then its definition or the key fact, formula or
+example a student would be examined on. Cover the whole section, keep it under {words} words
+and do not add anything that is not in the text.
+
+Section {index} of {total}:
+{text}""",
+    KIND_PAPERS: """List what this part of previous exam papers asks.
+For each question write one bullet: the marks (if shown), the topic it tests and a short
+paraphrase of the question. Group repeated topics and note how often they appear. Keep it
+under {words} words.
+
+Excerpt {index} of {total}:
+{text}""",
+}
+
+
+def get_config() -> dict:
+    """Merge CONCEPT_MAP settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'CONCEPT_MAP', {}))
+    return config
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()['MAX_WORKERS'],
+                thread_name_prefix='concept-map'
+            )
+        return _executor
+
+
+def split_sections(text: str, section_tokens: int) -> list:
+    """Pack whole lines into sections of about section_tokens tokens"""
+    sections = []
+    current = []
+    size = 0
+    for line in _lines(text, section_tokens):
+        tokens = estimate_tokens(line) + 1
+        if current and size + tokens > section_tokens:
+            sections.append('\n'.join(current).strip())
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        sections.append('\n'.join(current).strip())
+    return [section for section in sections if section]
+
+
+def _lines(text: str, section_tokens: int):
+    """Lines of text, with lines longer than a section (e.g. PDF text without breaks) cut into word runs"""
+    words_per_piece = max(int(section_tokens * 0.6), 1)
+    for line in text.splitlines():
+        if estimate_tokens(line) <= section_tokens:
+            yield line
+            continue
+        words = line.split()
+        for i in range(0, len(words), words_per_piece):
+            yield ' '.join(words[i:i + words_per_piece])
+
+
+def section_key(kind: str, text: str) -> str:
+    return KEY_PREFIX + hashlib.sha256(f"{kind}\n{text}".encode('utf-8')).hexdigest()
+
+
+def digest_section(text: str, kind: str, index: int, total: int, label: str) -> str:
+    """
+    Reduce one section to its key concepts (cached by section hash)
+
+    A section no model could digest is truncated to the digest size instead,
+    so it still contributes to the reduced source.
+    """
+    from .utils import call_llm_api
+    config = get_config()
+    cache = caches[config['CACHE_ALIAS']]
+    key = section_key(kind, text)
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr('concept_map.cache_hits')
+        return cached
+
+    prompt_words = int(config['DIGEST_TOKENS'] * 0.7)
+    for model_id in router.candidates(TIER_BASIC, reason=label)[:config['MAX_ATTEMPTS']]:
+        section = fit_text_for_model(text, model_id, max_output_tokens=config['DIGEST_TOKENS'])
+        prompt = MAP_PROMPTS[kind].format(words=prompt_words, index=index + 1, total=total, text=section)
+        try:
+            digest = call_llm_api(
+                model_id,
+                [{"role": "user", "content": prompt}],
+                temperature=0.2,
+                max_tokens=config['DIGEST_TOKENS'],
+                priority=PRIORITY_BATCH
+            ).strip()
+        except RateLimitExceeded as e:
+            print(f"[CONCEPT MAP] {label} section {index + 1}: {model_id} rate limited: {e}")
+            continue
+        except Exception as e:
+            print(f"[CONCEPT MAP] {label} section {index + 1}: {model_id} failed: {type(e).__name__}: {e}")
+            continue
+        if digest:
+            cache.set(key, digest, config['CACHE_TTL'])
+            metrics.incr('concept_map.sections')
+            return digest
+
+    metrics.incr('concept_map.fallbacks')
+    return truncate_to_tokens(text, config['DIGEST_TOKENS'])
+
+
+def _digest_in_thread(text, kind, index, total, label):
+    try:
+        return digest_section(text, kind, index, total, label)
+    finally:
+        # Pool threads must not hold on to database connections
+        connections.close_all()
+
+
+def condense(text: str, max_tokens: int, label: str, kind: str = KIND_NOTES, depth: int = 0) -> str:
+    """
+    Reduce text to at most max_tokens, keeping coverage of all of it
+
+    Text that already fits is returned unchanged. Otherwise every section is
+    digested in parallel and the digests are joined in document order; if
+    they still do not fit they are condensed again (up to MAX_DEPTH), then
+    truncated.
+
+    Args:
+        text: Source material
+        max_tokens: Token budget for the result
+        label: Caller label for logs
+        kind: KIND_NOTES for study material, KIND_PAPERS for previous exam papers
+    """
+    config = get_config()
+    total_tokens = estimate_tokens(text)
+    if total_tokens <= max_tokens:
+        return text
+    if not config['ENABLED'] or depth >= config['MAX_DEPTH']:
+        return truncate_to_tokens(text, max_tokens)
+
+    section_tokens = max(config['SECTION_TOKENS'], -(-total_tokens // config['MAX_SECTIONS']))
+    sections = split_sections(text, section_tokens)
+    print(f"[CONCEPT MAP] {label}: condensing {total_tokens} tokens as {len(sections)} sections "
+          f"into {max_tokens} (depth {depth + 1})")
+    executor = _get_executor()
+    futures = [
+        executor.submit(_digest_in_thread, section, kind, i, len(sections), label)
+        for i, section in enumerate(sections)
+    ]
+    digests = [future.result() for future in futures]
+    reduced = '\n\n'.join(f"[Section {i + 1}]\n{digest}" for i, digest in enumerate(digests) if digest)
+    return condense(reduced, max_tokens, label, kind, depth + 1)
+
+
+def condense_for_model(text: str, model_id: str, label: str, kind: str = KIND_NOTES,
+                       max_output_tokens: int = 1024, reserved_tokens: int = 500) -> str:
+    """
+    Fit source material into a model's input budget by condensing instead of truncating
+
+    Drop-in replacement for fit_text_for_model on whole-document inputs.
+    """
+    budget = TokenBudget.for_model(model_id, max_output_tokens=max_output_tokens)
+    return condense(text, budget.limit - reserved_tokens, label, kind)
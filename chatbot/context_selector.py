@@ -0,0 +1,107 @@
+"""
+Representative-chunk context selection for document quizzes
+Instead of the first pages of a long document, the quiz generator gets one
+chunk from every topic the document covers: the document's vector store
+chunks are clustered with k-means, the chunk closest to each centroid
+represents its cluster, and representatives (largest clusters first, then
+second-closest chunks, ...) are taken up to the token budget and put back in
+document order. Clusters are computed once and cached on the Document row.
+"""
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .models import Document
+from .token_budget import TokenBudget
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'MAX_CLUSTERS': 24,    # Roughly the number of chunks one quiz prompt holds
+    'SEED': 0,
+}
+
+
+def get_config() -> dict:
+    """Merge QUIZ_CONTEXT settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'QUIZ_CONTEXT', {}))
+    return config
+
+
+def compute_clusters(embeddings, max_clusters: int, seed: int = 0) -> list:
+    """
+    Cluster chunk vectors with k-means
+
+    Returns:
+        List of clusters, largest first; each is a list of chunk indices
+        ordered by distance to the cluster centroid (closest first)
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import normalize
+
+    vectors = normalize(np.asarray(embeddings, dtype='float32'))
+    k = min(max_clusters, len(vectors))
+    if k <= 1:
+        return [list(range(len(vectors)))]
+
+    kmeans = KMeans(n_clusters=k, n_init=3, random_state=seed).fit(vectors)
+    clusters = []
+    for label in range(k):
+        members = np.where(kmeans.labels_ == label)[0]
+        if not len(members):
+            continue
+        distances = ((vectors[members] - kmeans.cluster_centers_[label]) ** 2).sum(axis=1)
+        clusters.append([int(members[i]) for i in np.argsort(distances, kind='stable')])
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+    return clusters
+
+
+def get_clusters(document_id: int, embeddings, num_chunks: int) -> list:
+    """Cached clusters for a document, computed on first use or after re-indexing"""
+    cached = Document.objects.filter(id=document_id).values_list('chunk_clusters', flat=True).first() or {}
+    if cached.get('chunks') == num_chunks and cached.get('clusters'):
+        metrics.incr('quiz_context.cluster_cache_hits')
+        return cached['clusters']
+
+    config = get_config()
+    clusters = compute_clusters(embeddings, config['MAX_CLUSTERS'], config['SEED'])
+    Document.objects.filter(id=document_id).update(chunk_clusters={'chunks': num_chunks, 'clusters': clusters})
+    metrics.incr('quiz_context.clusterings')
+    print(f"[QUIZ CONTEXT] Document {document_id}: clustered {num_chunks} chunks into {len(clusters)} topics")
+    return clusters
+
+
+def representative_context(document_id: int, max_tokens: int, model_id: str = ''):
+    """
+    Pick representative chunks of a document up to max_tokens
+
+    Args:
+        document_id: Indexed document
+        max_tokens: Token budget for the returned context
+        model_id: Model whose tokenizer sizes the chunks
+
+    Returns:
+        Chunks joined in document order, or None if the document has no vector store
+    """
+    from .utils import load_vector_store
+    if not get_config()['ENABLED']:
+        return None
+    embeddings, chunks, _ = load_vector_store(document_id)
+    if embeddings is None or not chunks:
+        return None
+
+    clusters = get_clusters(document_id, embeddings, len(chunks))
+    # Round-robin over clusters: every topic's best chunk before any topic's second
+    order = [
+        members[rank]
+        for rank in range(max(len(members) for members in clusters))
+        for members in clusters
+        if rank < len(members)
+    ]
+    budget = TokenBudget(model_id, max_tokens)
+    picked = sorted(budget.take(order, text_of=lambda index: chunks[index]))
+    picked_set = set(picked)
+    covered = sum(1 for members in clusters if picked_set.intersection(members))
+    print(f"[QUIZ CONTEXT] Document {document_id}: {len(picked)}/{len(chunks)} chunks "
+          f"covering {covered}/{len(clusters)} topics")
+    return '\n\n'.join(chunks[index] for index in picked)
@@ -0,0 +1,212 @@
+"""
+Near-duplicate detection for generated questions
+Questions are reduced to shingles (stemmed content words and word bigrams),
+summarised as MinHash signatures and bucketed with locality-sensitive hashing,
+so each new question is only compared with the few earlier questions that
+share an LSH band. Filtering a whole pool is roughly linear in its size and
+catches reworded and reordered variants, not just identical text.
+"""
+import hashlib
+import random
+import re
+from django.conf import settings
+
+DEFAULT_CONFIG = {
+    # Shingle Jaccard similarity at or above which questions are duplicates. Swapping one
+    # content word ("time" / "space complexity of merge sort") scores ~0.56, rewordings ~0.6-1.0
+    'THRESHOLD': 0.6,
+    'NUM_PERM': 96,       # MinHash signature length
+    # LSH bands of NUM_PERM / BANDS rows; a pair with Jaccard s becomes a candidate with
+    # probability 1 - (1 - s^rows)^BANDS: ~0.999 at 0.6 and ~0.58 at 0.3 for 32 bands of 3 rows,
+    # so the S-curve sits below THRESHOLD and extra candidates only cost an exact comparison
+    'BANDS': 32,
+    'SEED': 1,
+}
+
+# Words that say nothing about what a question is about. "how", "why", "when", "where"
+# and "who" change what is asked and are kept
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from in is it its of on or that the their this to
+was what which will with explain describe define discuss state write briefly
+following give list mention short note notes brief detail details example examples between
+""".split())
+
+# Words that invert what an MCQ asks for ("which is NOT a property of ...")
+NEGATIONS = frozenset('not no never except cannot false incorrect'.split())
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def get_config() -> dict:
+    """Merge QUESTION_DEDUP settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'QUESTION_DEDUP', {}))
+    return config
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so 'scheduling' / 'scheduler' / 'schedules' meet"""
+    for suffix in ('ations', 'ation', 'ings', 'ing', 'ers', 'er', 'ies', 'es', 's', 'ed', 'ly'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def shingles(text: str) -> set:
+    """
+    Stemmed content words plus adjacent content-word bigrams
+
+    A negated question gets every shingle marked, so it shares nothing with
+    its positive form ("is a property of" vs "is NOT a property of").
+    """
+    tokens = re.findall(r'[a-z0-9]+', (text or '').lower().replace("n't", ' not'))
+    negated = any(token in NEGATIONS for token in tokens)
+    words = [_stem(w) for w in tokens if w not in STOPWORDS and w not in NEGATIONS]
+    features = set(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    if negated:
+        features = {f"not:{feature}" for feature in features}
+    return features
+
+
+def _hash_shingle(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class MinHasher:
+    """Fixed family of NUM_PERM universal hash functions"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._a = [rng.randrange(1, _MERSENNE_PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, _MERSENNE_PRIME) for _ in range(num_perm)]
+
+    def signature(self, features: set) -> tuple:
+        if not features:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [_hash_shingle(feature) for feature in features]
+        prime = _MERSENNE_PRIME
+        return tuple(
+            min((a * h + b) % prime for h in hashes) & _MAX_HASH
+            for a, b in zip(self._a, self._b)
+        )
+
+
+_hashers = {}
+
+
+def _get_hasher(num_perm: int, seed: int) -> MinHasher:
+    key = (num_perm, seed)
+    if key not in _hashers:
+        _hashers[key] = MinHasher(num_perm, seed)
+    return _hashers[key]
+
+
+def similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def jaccard(features_a: set, features_b: set) -> float:
+    """Exact Jaccard similarity of two shingle sets"""
+    if not features_a or not features_b:
+        return 0.0
+    return len(features_a & features_b) / len(features_a | features_b)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of question texts
+
+    Usage:
+        index = NearDuplicateIndex()
+        for question in questions:
+            if not index.is_duplicate(question['question']):
+                index.add(question['question'])
+    """
+
+    def __init__(self, threshold: float = None, num_perm: int = None, bands: int = None):
+        config = get_config()
+        self.threshold = config['THRESHOLD'] if threshold is None else threshold
+        num_perm = num_perm or config['NUM_PERM']
+        self.bands = bands or config['BANDS']
+        self.rows = num_perm // self.bands
+        self._hasher = _get_hasher(num_perm, config['SEED'])
+        self._buckets = [{} for _ in range(self.bands)]
+        self._features = []
+        self._exact = {}          # Sorted shingles -> first position with them
+
+    def __len__(self):
+        return len(self._features)
+
+    def _bands_of(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def _prepare(self, text):
+        features = frozenset(shingles(text))
+        exact = ' '.join(sorted(features)) or (text or '').strip().lower()
+        return exact, features, self._hasher.signature(features)
+
+    def _match(self, exact, features, signature):
+        if exact in self._exact:
+            return self._exact[exact], 1.0
+        candidates = set()
+        for band, key in self._bands_of(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        # LSH only picks the candidates; they are scored on their actual shingles
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            score = jaccard(features, self._features[candidate])
+            if score > best_score:
+                best, best_score = candidate, score
+        return best, best_score
+
+    def _insert(self, exact, features, signature) -> int:
+        position = len(self._features)
+        self._features.append(features)
+        self._exact.setdefault(exact, position)
+        for band, key in self._bands_of(signature):
+            self._buckets[band].setdefault(key, []).append(position)
+        return position
+
+    def best_match(self, text: str):
+        """(index of the most similar stored text, similarity) or (None, 0.0)"""
+        return self._match(*self._prepare(text))
+
+    def is_duplicate(self, text: str) -> bool:
+        _, score = self.best_match(text)
+        return score >= self.threshold
+
+    def add(self, text: str) -> int:
+        """Index text; returns its position"""
+        return self._insert(*self._prepare(text))
+
+    def add_if_new(self, text: str) -> bool:
+        """Index text unless it duplicates something already indexed"""
+        prepared = self._prepare(text)
+        if self._match(*prepared)[1] >= self.threshold:
+            return False
+        self._insert(*prepared)
+        return True
+
+
+def dedupe(items, text_of=lambda item: item, existing=(), threshold: float = None) -> list:
+    """
+    Drop near-duplicate items, keeping the first of each group
+
+    Args:
+        items: Items to filter, in preference order
+        text_of: Callable returning the text to compare for an item
+        existing: Texts already in use (e.g. the rest of a pool); items similar to them are dropped too
+        threshold: Override the configured similarity threshold
+
+    Returns:
+        List of the items that are not near-duplicates
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    for text in existing:
+        index.add(text)
+    return [item for item in items if index.add_if_new(text_of(item))]
@@ -0,0 +1,252 @@
+"""
+Deterministic offline LLM provider for tests, demos and benchmarks
+Enforces per-model requests/tokens per minute with Groq-style rate-limit
+headers, draws latency from a configurable distribution, injects errors and
+answers with canned quiz / question-paper JSON or prose, so the scheduler,
+the generators and the views all run without API keys.
+
+Used in-process with LLM_BACKEND = 'fake'; chatbot/llm_standin.py serves the
+same provider over the Groq and Gemini HTTP protocols (LLM_BACKEND = 'standin').
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+
+from .token_budget import estimate_tokens
+
+
+class FakeRateLimitError(Exception):
+    """The stand-in's equivalent of an HTTP 429"""
+
+    def __init__(self, message, headers):
+        super().__init__(message)
+        self.headers = headers
+
+
+class FakeServerError(Exception):
+    """The stand-in's equivalent of an HTTP 500 (injected with error_rate)"""
+
+    def __init__(self, message, headers):
+        super().__init__(message)
+        self.headers = headers
+
+
+def sample_latency(spec, rng: random.Random) -> float:
+    """Draw a latency (seconds) from a distribution spec or a fixed number of seconds"""
+    if not isinstance(spec, dict):
+        return float(spec)
+    distribution = spec.get('distribution', 'fixed')
+    if distribution == 'uniform':
+        return rng.uniform(spec.get('low', 0.1), spec.get('high', 1.0))
+    if distribution == 'lognormal':
+        return rng.lognormvariate(math.log(spec.get('median', 0.6)), spec.get('sigma', 0.5))
+    return float(spec.get('value', spec.get('median', 0.5)))
+
+
+# ===== Canned responses =====
+
+# Canned questions are worded from this vocabulary so near-duplicate filtering keeps them
+CANNED_TERMS = """
+paging segmentation caching hashing sorting recursion inheritance encapsulation polymorphism
+normalization indexing transactions locking replication sharding routing switching encryption
+compression parsing tokenizing linking loading scheduling threading interrupts pipelining
+virtualization containers sockets protocols checksums queues stacks heaps graphs trees
+""".split()
+
+
+def _canned_terms(seed: str, count: int = 3) -> list:
+    return random.Random(zlib.crc32(seed.encode('utf-8'))).sample(CANNED_TERMS, count)
+
+
+def _quiz_questions(count: int, topic: str, variant: str = '') -> list:
+    letters = ['A', 'B', 'C', 'D']
+    questions = []
+    for i in range(count):
+        options = [f"{letter}) Option {letter} about {topic} #{i + 1}" for letter in letters]
+        first, second, third = _canned_terms(f"{topic}{variant}{i}")
+        questions.append({
+            'question': f"Stand-in question {i + 1}{variant}: how do {first} and {second} affect {third}?",
+            'options': options,
+            'correct_answer': options[i % 4],
+            'explanation': f"Option {letters[i % 4]} is the stand-in's correct answer.",
+        })
+    return questions
+
+
+def _paper_questions(requirements: dict, variant: str = '') -> dict:
+    return {
+        str(marks): [
+            {
+                'question': "Stand-in {}-mark question {}: compare {} with {} for {}".format(
+                    marks, f"{i + 1}{variant}", *_canned_terms(f"{marks}-{i}{variant}")
+                ),
+                'hint': f"Cover the key points for {marks} marks",
+                'reasoning': 'Appears in the stand-in pattern',
+            }
+            for i in range(count)
+        ]
+        for marks, count in requirements.items()
+    }
+
+
+def canned_response(prompt: str) -> str:
+    """
+    Pick a plausible response for a prompt
+
+    Quiz prompts get a JSON array with the requested number of questions,
+    question-paper prompts a marks-keyed JSON object, anything else prose.
+    """
+    # Different prompts (e.g. parallel quiz batches or paper parts) get different questions
+    variant = f"-{zlib.crc32(prompt.encode('utf-8')) % 10000:04d}"
+    requirements = {int(marks): int(count) for count, marks in re.findall(r'(\d+) (\d+)-mark questions', prompt)}
+    if requirements:
+        return json.dumps(_paper_questions(requirements, variant), indent=2)
+
+    if '"correct_answer"' in prompt:
+        match = re.search(r'(\d+)\s+(?:multiple choice\s+|unique\s+)?(?:quiz\s+)?questions', prompt)
+        count = int(match.group(1)) if match else 5
+        topic = re.search(r'(?:about|Document):\s*(.+)', prompt)
+        topic = topic.group(1).strip()[:60] if topic else 'the topic'
+        return json.dumps(_quiz_questions(count, topic, variant), indent=2)
+
+    question = prompt.strip().splitlines()[-1] if prompt.strip() else ''
+    return (
+        f"This is a stand-in answer. You asked: {question[:200]}\n\n"
+        "The key idea is explained step by step: first the definition, then an example, "
+        "and finally how it connects to the rest of the course material."
+    )
+
+
+# ===== Provider =====
+
+class FakeRateLimitedProvider:
+    """Chat completions stand-in with continuously replenishing RPM/TPM limits (like Groq)"""
+
+    def __init__(self, rpm=30, tpm=6000, latency=0.05, model_latency=None,
+                 error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        """
+        Args:
+            rpm, tpm: Limits enforced per model
+            latency: Seconds before answering, or a spec such as
+                {'distribution': 'lognormal', 'median': 0.6, 'sigma': 0.5}
+            model_latency: model_id -> latency overriding latency
+            error_rate: Share of admitted requests failed with FakeServerError
+            rate_limit_rate: Share of admitted requests rejected with FakeRateLimitError
+            seed: Seed for reproducible latency and errors
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._state = {}  # model_id -> [requests_left, tokens_left, updated]
+        self.requests = 0
+        self.calls = 0
+        self.rejected = 0
+
+    def _refill(self, model_id, now):
+        state = self._state.setdefault(model_id, [float(self.rpm), float(self.tpm), now])
+        elapsed = now - state[2]
+        state[0] = min(self.rpm, state[0] + elapsed * self.rpm / 60.0)
+        state[1] = min(self.tpm, state[1] + elapsed * self.tpm / 60.0)
+        state[2] = now
+        return state
+
+    def _headers(self, state):
+        requests_reset = (self.rpm - state[0]) * 60.0 / self.rpm
+        tokens_reset = (self.tpm - state[1]) * 60.0 / self.tpm
+        return {
+            'x-ratelimit-limit-requests': str(self.rpm),
+            'x-ratelimit-remaining-requests': str(int(state[0])),
+            'x-ratelimit-reset-requests': f'{requests_reset:.2f}s',
+            'x-ratelimit-limit-tokens': str(self.tpm),
+            'x-ratelimit-remaining-tokens': str(int(state[1])),
+            'x-ratelimit-reset-tokens': f'{tokens_reset:.2f}s',
+        }
+
+    def admit(self, model_id, messages, max_tokens=1024):
+        """
+        Apply limits, latency and injected errors to one request
+
+        Returns:
+            Rate-limit headers of the admitted request (after its latency)
+
+        Raises:
+            FakeRateLimitError: when the request would exceed RPM or TPM, or an injected 429
+            FakeServerError: for an injected 500
+        """
+        prompt_tokens = sum(estimate_tokens(msg.get('content', ''), model_id) for msg in messages)
+        cost = prompt_tokens + max_tokens
+        with self._lock:
+            self.requests += 1
+            latency = sample_latency(self.model_latency.get(model_id, self.latency), self._rng)
+            roll = self._rng.random()
+            state = self._refill(model_id, time.monotonic())
+            if state[0] < 1 or state[1] < cost:
+                self.rejected += 1
+                headers = self._headers(state)
+                wait = max((1 - state[0]) * 60.0 / self.rpm, (cost - state[1]) * 60.0 / self.tpm, 0)
+                headers['retry-after'] = f'{wait:.2f}'
+                raise FakeRateLimitError(f"Rate limit reached for model {model_id}", headers)
+            state[0] -= 1
+            state[1] -= cost
+            headers = self._headers(state)
+            if self.error_rate <= roll < self.error_rate + self.rate_limit_rate:
+                self.rejected += 1
+                raise FakeRateLimitError('Injected rate limit', dict(headers, **{'retry-after': '1'}))
+            self.calls += 1
+
+        time.sleep(latency)
+        if roll < self.error_rate:
+            raise FakeServerError('Injected server error', headers)
+        return headers
+
+    def complete(self, model_id, messages, temperature=0.7, max_tokens=1024):
+        """
+        Serve one completion
+
+        Returns:
+            Tuple of (text, headers)
+
+        Raises:
+            FakeRateLimitError, FakeServerError: as for admit()
+        """
+        headers = self.admit(model_id, messages, max_tokens)
+        prompt = '\n'.join(msg.get('content', '') for msg in messages)
+        return canned_response(prompt), headers
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_fake_provider() -> FakeRateLimitedProvider:
+    """Process-wide stand-in configured from settings.FAKE_PROVIDER"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            from django.conf import settings
+            options = getattr(settings, 'FAKE_PROVIDER', {})
+            _provider = FakeRateLimitedProvider(
+                rpm=options.get('RPM', 30),
+                tpm=options.get('TPM', 6000),
+                latency=options.get('LATENCY', 0.05),
+                error_rate=options.get('ERROR_RATE', 0.0),
+                rate_limit_rate=options.get('RATE_LIMIT_RATE', 0.0),
+                seed=options.get('SEED')
+            )
+        return _provider
+
+
+def set_fake_provider(provider):
+    """Install a specific stand-in (tests)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
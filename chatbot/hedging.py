@@ -0,0 +1,190 @@
+"""
+Hedged LLM requests for tail-latency control
+If the primary model has not answered within a percentile of its recent
+latency, the same request is sent to the next candidate and whichever valid
+response arrives first wins. Hedges are paid for from a budget that earns a
+fraction of a hedge per primary request, capping the extra load.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .llm_scheduler import RateLimitExceeded
+
+DEFAULT_CONFIG = {
+    'ENABLED': False,
+    'PERCENTILE': 0.95,      # Hedge once the primary is slower than this share of its recent calls
+    'DEFAULT_DELAY': 8.0,    # Seconds to wait when the primary has too little telemetry
+    'MIN_DELAY': 1.0,
+    'BUDGET_RATIO': 0.1,     # At most ~10% extra requests
+    'MAX_BURST': 2,          # Hedges that may be saved up during quiet periods
+    'MAX_WORKERS': 8,
+}
+
+
+def get_config() -> dict:
+    """Merge LLM_HEDGING settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'LLM_HEDGING', {}))
+    return config
+
+
+def is_enabled() -> bool:
+    return get_config()['ENABLED']
+
+
+class HedgeBudget:
+    """Each primary request earns BUDGET_RATIO of a hedge; each hedge spends one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credit = 0.0
+
+    def earn(self, config: dict):
+        with self._lock:
+            self._credit = min(self._credit + config['BUDGET_RATIO'], config['MAX_BURST'])
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                return True
+            return False
+
+    @property
+    def credit(self) -> float:
+        return self._credit
+
+
+budget = HedgeBudget()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()['MAX_WORKERS'],
+                thread_name_prefix='llm-hedge'
+            )
+        return _executor
+
+
+def _run(fn, model_id):
+    try:
+        return fn(model_id)
+    finally:
+        # Pool threads must not hold on to database connections
+        connections.close_all()
+
+
+def hedge_delay(model_id: str, config: dict = None) -> float:
+    """Seconds to wait on model_id before hedging"""
+    from .model_router import router
+    config = config or get_config()
+    observed = router.latency_percentile(model_id, config['PERCENTILE'])
+    delay = observed if observed is not None else config['DEFAULT_DELAY']
+    return max(delay, config['MIN_DELAY'])
+
+
+def hedged_call(fn, model_ids, label='', is_valid=bool):
+    """
+    Call fn(model_id) on the first model, hedging to the next one when it is slow
+
+    A failed attempt falls through to the next model immediately (a plain
+    fallback, not charged to the budget). At most one hedge is fired per call.
+    The losing request cannot be interrupted mid-flight; its result is
+    discarded (and still warms the response cache).
+
+    Args:
+        fn: Callable taking a model_id and returning a result (raises on failure)
+        model_ids: Candidate models, best first
+        label: Caller label for logs
+        is_valid: Predicate a result must pass to win
+
+    Returns:
+        Tuple of (result, model_id)
+
+    Raises:
+        RateLimitExceeded: if every attempt was rate limited
+        Exception: the last error if every attempt failed
+    """
+    config = get_config()
+    executor = _get_executor()
+    queue = list(model_ids)
+    pending = {}
+    errors = []
+    primary = queue[0]
+    hedged = False
+
+    def launch(model_id):
+        pending[executor.submit(_run, fn, model_id)] = model_id
+
+    budget.earn(config)
+    metrics.incr('hedging.requests')
+    launch(queue.pop(0))
+    hedge_at = time.monotonic() + hedge_delay(primary, config)
+
+    while pending:
+        timeout = max(hedge_at - time.monotonic(), 0.0) if queue and hedge_at is not None else None
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            # Hedge timer fired with the primary still running
+            hedge_at = None
+            if budget.try_spend():
+                model_id = queue.pop(0)
+                metrics.incr('hedging.fired')
+                print(f"[HEDGE] {label}: {primary} slow, hedging to {model_id}")
+                launch(model_id)
+                hedged = True
+            else:
+                metrics.incr('hedging.budget_denied')
+            continue
+
+        for future in done:
+            model_id = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                print(f"[HEDGE] {label}: {model_id} failed: {type(e).__name__}: {e}")
+                continue
+            if not is_valid(result):
+                errors.append(ValueError(f"{model_id} returned no valid result"))
+                continue
+            for other in pending:
+                other.cancel()
+            if hedged and model_id != primary:
+                metrics.incr('hedging.wins')
+            return result, model_id
+
+        if not pending and queue:
+            # Everything in flight failed - fall back to the next model
+            hedge_at = None
+            launch(queue.pop(0))
+
+    if errors and all(isinstance(e, RateLimitExceeded) for e in errors):
+        raise min(errors, key=lambda error: error.retry_after)
+    raise errors[-1] if errors else ValueError("No models to call")
+
+
+def get_stats() -> dict:
+    """Hedge counters for the metrics endpoint"""
+    config = get_config()
+    requests = metrics.get_counter('hedging.requests')
+    fired = metrics.get_counter('hedging.fired')
+    return {
+        'enabled': config['ENABLED'],
+        'requests': requests,
+        'hedges': fired,
+        'hedge_wins': metrics.get_counter('hedging.wins'),
+        'budget_denied': metrics.get_counter('hedging.budget_denied'),
+        'extra_load': round(fired / requests, 3) if requests else 0.0,
+        'budget_credit': round(budget.credit, 2),
+    }
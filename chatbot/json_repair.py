@@ -0,0 +1,263 @@
+"""
+Tolerant, incremental JSON parsing for LLM output
+Models wrap JSON in code fences, use smart quotes as delimiters, leave
+trailing commas and get cut off at max_tokens. Instead of slicing between the
+first and last bracket and failing on the first defect, the parser here scans
+the text once (or chunk by chunk from a stream), repairs those defects as it
+goes and hands back every complete item object it finds, so a single broken
+or truncated question does not cost the whole response.
+"""
+import json
+import re
+
+from . import metrics
+
+# Curly double quotes models use in place of '"'
+SMART_QUOTES = '“”„‟'
+
+_FENCE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.S)
+
+
+def strip_code_fences(text: str) -> str:
+    """Return the body of the first ``` fenced block, or text unchanged"""
+    match = _FENCE.search(text or '')
+    return match.group(1) if match else (text or '')
+
+
+class IncrementalJSONParser:
+    """
+    Streaming scanner that emits item objects as soon as they close
+
+    Items are objects inside the top-level array (quiz: [{...}, {...}]) or
+    inside an array value of the top-level object (paper: {"2": [{...}], ...}).
+    Each item is returned as (key, object) where key is the top-level key of
+    its array, or None for a top-level array.
+
+    While scanning, the text is normalised: smart-quote delimiters become
+    '"', raw newlines / tabs inside strings are escaped, trailing commas
+    before '}' or ']' are dropped and a missing comma between '}' '{' is added.
+
+    Usage:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for key, item in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self._out = []            # Normalised text of the root value
+        self._stack = []          # Open containers: [kind, start offset, key]
+        self._in_string = False
+        self._curly_string = False
+        self._escape = False
+        self._pending_close = None  # (quote, whitespace) that may end a smart-quoted string
+        self._string_start = 0
+        self._last_string = None  # Most recent complete string at depth 1 (candidate key)
+        self._key = None          # Current top-level key
+        self.started = False
+        self.done = False
+        self.root = None          # Parsed root value once it closes cleanly
+        self.emitted = 0
+        self.rejected = 0
+
+    def feed(self, text: str):
+        """Consume more text; return the list of newly completed (key, item) pairs"""
+        items = []
+        for char in text:
+            if self.done:
+                break
+            if not self.started:
+                if char in '[{':
+                    self.started = True
+                else:
+                    continue
+            if self._pending_close is not None:
+                item = self._resolve_close(char)
+                if item is not None:
+                    items.append(item)
+            elif self._in_string:
+                self._string_char(char)
+            else:
+                item = self._structural_char(char)
+                if item is not None:
+                    items.append(item)
+        return items
+
+    # ----- scanning -----
+
+    def _string_char(self, char):
+        out = self._out
+        if self._escape:
+            out.append(char)
+            self._escape = False
+        elif char == '\\':
+            out.append(char)
+            self._escape = True
+        elif self._curly_string and (char == '"' or char in SMART_QUOTES):
+            # Smart quotes also appear inside text; decide once the next token is seen
+            self._pending_close = (char, [])
+        elif char == '"':
+            self._close_string()
+        elif char == '\n':
+            out.append('\\n')
+        elif char == '\r':
+            out.append('\\r')
+        elif char == '\t':
+            out.append('\\t')
+        elif ord(char) < 0x20:
+            out.append('\\u%04x' % ord(char))
+        else:
+            out.append(char)
+
+    def _close_string(self):
+        self._out.append('"')
+        self._in_string = False
+        if len(self._stack) == 1:
+            self._last_string = ''.join(self._out[self._string_start + 1:-1])
+
+    def _resolve_close(self, char):
+        quote, whitespace = self._pending_close
+        if char.isspace():
+            whitespace.append(char)
+            return None
+        self._pending_close = None
+        if char in ':,}]':
+            self._close_string()
+            self._out.extend(whitespace)
+            return self._structural_char(char)
+        # The quote was part of the text
+        self._out.append('\\"' if quote == '"' else quote)
+        for pending in whitespace + [char]:
+            self._string_char(pending)
+        return None
+
+    def _structural_char(self, char):
+        out = self._out
+        stack = self._stack
+
+        if char == '"' or char in SMART_QUOTES:
+            self._in_string = True
+            self._curly_string = char != '"'
+            self._string_start = len(out)
+            out.append('"')
+            return None
+
+        if char in '[{':
+            if char == '{' and self._last_significant() == '}':
+                out.append(',')
+            key = None
+            if char == '[' and len(stack) == 1 and stack[0][0] == '{':
+                key = self._key
+            stack.append([char, len(out), key])
+            out.append(char)
+            return None
+
+        if char in ']}':
+            self._drop_trailing_comma()
+            if not stack:
+                return None
+            kind, start, _ = stack.pop()
+            out.append('}' if kind == '{' else ']')
+            if not stack:
+                self._finish_root()
+                return None
+            if kind == '{' and self._is_item_array(stack):
+                return self._emit(''.join(out[start:]), stack[-1][2])
+            return None
+
+        if char == ':' and len(stack) == 1 and stack[0][0] == '{':
+            self._key = self._last_string
+
+        out.append(char)
+        return None
+
+    def _is_item_array(self, stack) -> bool:
+        """True if the innermost open container is an array that holds items"""
+        if stack[-1][0] != '[':
+            return False
+        return len(stack) == 1 or (len(stack) == 2 and stack[0][0] == '{')
+
+    def _last_significant(self):
+        for piece in reversed(self._out):
+            if not piece.isspace():
+                return piece
+        return None
+
+    def _drop_trailing_comma(self):
+        out = self._out
+        index = len(out) - 1
+        while index >= 0 and out[index].isspace():
+            index -= 1
+        if index >= 0 and out[index] == ',':
+            del out[index]
+
+    def _emit(self, text: str, key):
+        try:
+            item = json.loads(text)
+        except ValueError:
+            self.rejected += 1
+            return None
+        self.emitted += 1
+        return key, item
+
+    def _finish_root(self):
+        self.done = True
+        try:
+            self.root = json.loads(''.join(self._out))
+        except ValueError:
+            self.root = None
+
+
+def parse_json_lenient(text: str):
+    """
+    Parse the JSON value in an LLM response, repairing common defects
+
+    Returns:
+        The parsed value, or None if the response holds no complete JSON value
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(strip_code_fences(text))
+    return parser.root
+
+
+def salvage_items(text: str):
+    """All complete, valid (key, item) pairs in a possibly broken or truncated response"""
+    parser = IncrementalJSONParser()
+    items = parser.feed(strip_code_fences(text))
+    if parser.rejected or not parser.done:
+        metrics.incr('json_repair.partial_responses')
+        metrics.incr('json_repair.rejected_items', parser.rejected)
+        print(f"[JSON REPAIR] Salvaged {parser.emitted} items "
+              f"({parser.rejected} malformed, {'complete' if parser.done else 'truncated'} response)")
+    return items
+
+
+def is_valid_quiz_question(item) -> bool:
+    """A quiz item has question, options (list), correct_answer and explanation"""
+    return (
+        isinstance(item, dict)
+        and all(k in item for k in ('question', 'options', 'correct_answer', 'explanation'))
+        and isinstance(item['question'], str)
+        and isinstance(item['options'], list)
+    )
+
+
+def salvage_quiz_questions(text: str) -> list:
+    """Every valid quiz question object in a response"""
+    return [item for _, item in salvage_items(text) if is_valid_quiz_question(item)]
+
+
+def salvage_questions_by_marks(text: str) -> dict:
+    """
+    Every valid question in a marks-keyed paper response
+
+    Returns:
+        Dict of {marks (str): [question dicts]} for keys that look like marks
+    """
+    by_marks = {}
+    for key, item in salvage_items(text):
+        if key is None or not str(key).strip().isdigit():
+            continue
+        if isinstance(item, dict) and item.get('question'):
+            by_marks.setdefault(str(key).strip(), []).append(item)
+    return by_marks
@@ -0,0 +1,132 @@
+"""
+Exact-match response cache for LLM completions
+Responses are keyed by a canonical hash of (model_id, messages, temperature, max_tokens)
+and stored in a dedicated Django cache backend (see CACHES['llm'] in settings).
+Caching is opt-in: call sites pass a policy name to call_llm_api.
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+KEY_PREFIX = 'llm:v1:'
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'ALIAS': 'llm',
+    'DEFAULT_TTL': 60 * 60 * 24,
+    'POLICIES': {},
+}
+
+
+def get_config() -> dict:
+    """Merge LLM_CACHE settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'LLM_CACHE', {}))
+    return config
+
+
+def make_request_key(model_id, messages, temperature, max_tokens) -> str:
+    """
+    Build a canonical hash for an LLM request
+
+    Only role and content of each message take part in the key, so extra
+    metadata attached to message dicts does not fragment the cache.
+    """
+    payload = {
+        'model': model_id,
+        'messages': [
+            {'role': msg.get('role', ''), 'content': msg.get('content', '')}
+            for msg in messages
+        ],
+        'temperature': round(float(temperature), 3),
+        'max_tokens': int(max_tokens),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_policy(policy_name):
+    """Return the policy dict for an endpoint, or None if caching is off for it"""
+    config = get_config()
+    if not config['ENABLED'] or not policy_name:
+        return None
+    policy = config['POLICIES'].get(policy_name)
+    if not policy or policy.get('mode', 'never') == 'never':
+        return None
+    return policy
+
+
+def is_cacheable(policy, temperature) -> bool:
+    """
+    Check whether a request may be served from / stored in the cache
+
+    Modes:
+        'always'        - cache regardless of sampling temperature
+        'deterministic' - cache only when temperature is 0
+    """
+    if policy is None:
+        return False
+    if policy.get('mode') == 'deterministic':
+        return float(temperature) == 0.0
+    return policy.get('mode') == 'always'
+
+
+def cached_completion(policy_name, model_id, messages, temperature, max_tokens, compute):
+    """
+    Serve a completion from the cache or compute and store it
+
+    Args:
+        policy_name: Endpoint policy name from settings.LLM_CACHE['POLICIES']
+        model_id, messages, temperature, max_tokens: The request tuple
+        compute: Zero-argument callable that performs the real API call
+
+    Returns:
+        Generated text response
+    """
+    policy = get_policy(policy_name)
+    if not is_cacheable(policy, temperature):
+        metrics.incr('llm_cache.bypass')
+        return compute()
+
+    config = get_config()
+    cache = caches[config['ALIAS']]
+    key = KEY_PREFIX + make_request_key(model_id, messages, temperature, max_tokens)
+
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr('llm_cache.hits')
+        metrics.incr(f'llm_cache.{policy_name}.hits')
+        print(f"[LLM CACHE] Hit for {policy_name} ({model_id})")
+        return cached
+
+    metrics.incr('llm_cache.misses')
+    metrics.incr(f'llm_cache.{policy_name}.misses')
+    answer = compute()
+
+    # Never cache empty answers - they are almost always provider hiccups
+    if answer:
+        cache.set(key, answer, timeout=policy.get('ttl', config['DEFAULT_TTL']))
+    return answer
+
+
+def get_cache_stats() -> dict:
+    """Hit-rate summary for the metrics endpoint"""
+    config = get_config()
+    stats = {
+        'enabled': config['ENABLED'],
+        'hits': metrics.get_counter('llm_cache.hits'),
+        'misses': metrics.get_counter('llm_cache.misses'),
+        'bypass': metrics.get_counter('llm_cache.bypass'),
+        'hit_rate': metrics.hit_rate('llm_cache'),
+        'policies': {},
+    }
+    for name in config['POLICIES']:
+        stats['policies'][name] = {
+            'hits': metrics.get_counter(f'llm_cache.{name}.hits'),
+            'misses': metrics.get_counter(f'llm_cache.{name}.misses'),
+            'hit_rate': metrics.hit_rate(f'llm_cache.{name}'),
+        }
+    return stats
@@ -0,0 +1,167 @@
+"""
+Record/replay cassettes for LLM provider calls
+In record mode every successful provider response is saved with its observed
+latency, keyed by the request hash; in replay mode responses are served from
+the cassette (optionally sleeping for the recorded latency), so benchmarks of
+retrieval, prompt assembly and database overhead run without network noise
+or spending quota.
+
+The cassette is a gzip-compressed JSON file:
+    {"version": 1, "entries": {"<request hash>": [[response, latency], ...]}}
+Requests recorded several times replay their responses in recorded order.
+"""
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+
+from . import metrics
+
+CASSETTE_VERSION = 1
+
+DEFAULT_CONFIG = {
+    'MODE': 'off',               # off | record | replay
+    'PATH': None,                # defaults to BASE_DIR / 'cassettes' / 'llm.json.gz'
+    'SIMULATE_LATENCY': False,   # replay: sleep for the recorded latency
+    'LATENCY_SCALE': 1.0,
+    'ON_MISS': 'error',          # replay: 'error' or 'live' (call the provider)
+    'FLUSH_EVERY': 20,           # record: write the file every N new responses
+}
+
+
+def get_config() -> dict:
+    """Merge LLM_CASSETTE settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'LLM_CASSETTE', {}))
+    if not config['PATH']:
+        config['PATH'] = Path(settings.BASE_DIR) / 'cassettes' / 'llm.json.gz'
+    return config
+
+
+def cassette_mode() -> str:
+    return get_config()['MODE']
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a request"""
+
+
+class Cassette:
+    """In-memory cassette backed by a gzip JSON file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._cursors = {}
+        self._unsaved = 0
+        if self.path.exists():
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version in {self.path}")
+            self._entries = data['entries']
+            print(f"[CASSETTE] Loaded {len(self._entries)} recorded requests from {self.path}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, key: str, response: str, latency: float, flush_every: int = 20):
+        """Append a response (and its latency in seconds) for a request hash"""
+        with self._lock:
+            self._entries.setdefault(key, []).append([response, round(latency, 4)])
+            self._unsaved += 1
+            should_flush = self._unsaved >= flush_every
+        metrics.incr('cassette.recorded')
+        if should_flush:
+            self.flush()
+
+    def play(self, key: str):
+        """
+        Next recorded (response, latency) for a request hash, or None
+
+        Repeated requests cycle through their recordings in order.
+        """
+        with self._lock:
+            recordings = self._entries.get(key)
+            if not recordings:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            response, latency = recordings[cursor % len(recordings)]
+        return response, latency
+
+    def flush(self):
+        """Write the cassette atomically"""
+        with self._lock:
+            if not self._unsaved:
+                return
+            payload = {'version': CASSETTE_VERSION, 'entries': self._entries}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'), ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._unsaved = 0
+        print(f"[CASSETTE] Saved {len(self._entries)} recorded requests to {self.path}")
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette:
+    """Process-wide cassette for the configured PATH"""
+    global _cassette
+    path = Path(get_config()['PATH'])
+    with _cassette_lock:
+        if _cassette is None or _cassette.path != path:
+            if _cassette is not None:
+                _cassette.flush()
+            _cassette = Cassette(path)
+        return _cassette
+
+
+def replay(model_id, messages, temperature, max_tokens):
+    """
+    Serve a request from the cassette
+
+    Returns:
+        Tuple of (response, latency), or None on a miss when ON_MISS is 'live'
+
+    Raises:
+        CassetteMiss: on a miss when ON_MISS is 'error'
+    """
+    from .llm_cache import make_request_key
+    config = get_config()
+    key = make_request_key(model_id, messages, temperature, max_tokens)
+    hit = get_cassette().play(key)
+    if hit is None:
+        metrics.incr('cassette.misses')
+        if config['ON_MISS'] == 'live':
+            return None
+        raise CassetteMiss(f"No recorded response for {model_id} request {key[:12]} in {config['PATH']}")
+
+    metrics.incr('cassette.hits')
+    response, latency = hit
+    if config['SIMULATE_LATENCY']:
+        time.sleep(latency * config['LATENCY_SCALE'])
+    return response, latency
+
+
+def record(model_id, messages, temperature, max_tokens, response, latency):
+    """Save a live provider response to the cassette"""
+    from .llm_cache import make_request_key
+    config = get_config()
+    key = make_request_key(model_id, messages, temperature, max_tokens)
+    get_cassette().record(key, response, latency, flush_every=config['FLUSH_EVERY'])
+
+
+@atexit.register
+def _flush_on_exit():
+    if _cassette is not None:
+        _cassette.flush()
@@ -0,0 +1,266 @@
+"""
+Rate-limit-aware request scheduler for LLM providers
+Keeps per-model request/token buckets (synced from provider rate-limit headers),
+queues requests by priority (interactive chat ahead of batch generation) and
+sheds load with RateLimitExceeded when the queue wait would exceed the caller's deadline.
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    # Requests / tokens per minute when the provider has not told us otherwise
+    'DEFAULT_LIMITS': {'rpm': 30, 'tpm': 6000},
+    'LIMITS': {},
+    # Seconds a caller is willing to queue, by priority
+    'DEADLINES': {PRIORITY_INTERACTIVE: 20, PRIORITY_BATCH: 120},
+    # Seconds to hold a Gemini model back after a quota error (it sends no headers)
+    'GEMINI_BACKOFF': 30,
+}
+
+
+def get_config() -> dict:
+    """Merge LLM_SCHEDULER settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'LLM_SCHEDULER', {}))
+    return config
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be served within its deadline"""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = max(float(retry_after), 0.0)
+
+
+def rate_limited_response(error: RateLimitExceeded) -> JsonResponse:
+    """Build the 429 response views return when load is shed"""
+    retry_after = int(error.retry_after + 0.999)
+    response = JsonResponse({
+        'status': 'error',
+        'message': f'The AI service is busy right now. Please try again in {retry_after} seconds.',
+        'retry_after': retry_after
+    }, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def parse_duration(value) -> float:
+    """Parse provider reset durations like '2m59.56s', '7.66s', '120ms' or '30'"""
+    if value is None:
+        return 0.0
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        amount = float(amount)
+        total += {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}[unit] * amount
+    return total
+
+
+class TokenBucket:
+    """Continuously refilling bucket (capacity per minute)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)"""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate else float('inf')
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, remaining: float, limit: float = None):
+        """
+        Adopt the provider's view of the bucket when it is more pessimistic
+
+        Headers of concurrent responses arrive out of order, so a stale (higher)
+        remaining count must not undo consumption we already recorded.
+        """
+        now = time.monotonic()
+        self.refill(now)
+        if limit:
+            self.capacity = float(limit)
+            self.rate = self.capacity / 60.0
+        self.tokens = min(self.tokens, float(remaining), self.capacity)
+
+
+class ModelLimiter:
+    """Request and token buckets plus a hard block (after a 429) for one model"""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.queue = []  # heap of (priority, seq, tokens)
+
+    def time_until(self, requests: float, tokens: float, now: float) -> float:
+        return max(
+            self.blocked_until - now,
+            self.requests.time_until(requests, now),
+            self.tokens.time_until(tokens, now),
+            0.0
+        )
+
+
+class LLMScheduler:
+    """Per-model priority queues in front of the provider APIs"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._limiters = {}
+        self._seq = itertools.count()
+
+    def _limiter(self, model_id: str) -> ModelLimiter:
+        limiter = self._limiters.get(model_id)
+        if limiter is None:
+            config = get_config()
+            limits = config['LIMITS'].get(model_id, config['DEFAULT_LIMITS'])
+            limiter = ModelLimiter(limits['rpm'], limits['tpm'])
+            self._limiters[model_id] = limiter
+        return limiter
+
+    def acquire(self, model_id: str, tokens: int, priority: int = PRIORITY_INTERACTIVE, deadline: float = None):
+        """
+        Wait for a slot to call model_id
+
+        Args:
+            model_id: Model the request is for
+            tokens: Estimated prompt + completion tokens
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH (lower runs first)
+            deadline: Seconds the caller can wait (defaults by priority)
+
+        Raises:
+            RateLimitExceeded: if the expected queue wait exceeds the deadline
+        """
+        config = get_config()
+        if not config['ENABLED']:
+            return
+        if deadline is None:
+            deadline = config['DEADLINES'].get(priority, 30)
+        give_up_at = time.monotonic() + deadline
+
+        with self._cond:
+            limiter = self._limiter(model_id)
+            ticket = (priority, next(self._seq), tokens)
+            heapq.heappush(limiter.queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    # Everything queued ahead of us (and we) must fit through the buckets first
+                    ahead = [t for t in limiter.queue if t <= ticket]
+                    wait = limiter.time_until(len(ahead), sum(t[2] for t in ahead), now)
+
+                    if limiter.queue[0] == ticket and wait == 0.0:
+                        heapq.heappop(limiter.queue)
+                        limiter.requests.consume(1)
+                        limiter.tokens.consume(tokens)
+                        metrics.incr('scheduler.admitted')
+                        return
+
+                    if now + wait > give_up_at:
+                        metrics.incr('scheduler.shed')
+                        print(f"[SCHEDULER] Shedding {model_id} request (priority {priority}): expected wait {wait:.1f}s exceeds deadline")
+                        raise RateLimitExceeded(
+                            f"Rate limit for {model_id}: expected wait {wait:.1f}s exceeds deadline",
+                            retry_after=wait
+                        )
+
+                    metrics.incr('scheduler.waits')
+                    self._cond.wait(timeout=min(max(wait, 0.05), 1.0))
+            finally:
+                if ticket in limiter.queue:
+                    limiter.queue.remove(ticket)
+                    heapq.heapify(limiter.queue)
+                self._cond.notify_all()
+
+    def observe_headers(self, model_id: str, headers):
+        """
+        Sync buckets from provider rate-limit headers
+
+        Understands the OpenAI-style headers Groq sends:
+        x-ratelimit-{limit,remaining,reset}-{requests,tokens} and retry-after.
+        """
+        headers = {k.lower(): v for k, v in dict(headers or {}).items()}
+        with self._cond:
+            limiter = self._limiter(model_id)
+            now = time.monotonic()
+
+            # Token limit is per minute and replenishes continuously
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            if remaining_tokens is not None:
+                limiter.tokens.sync(float(remaining_tokens), headers.get('x-ratelimit-limit-tokens'))
+
+            # Groq's request limit is per day; only honour it once exhausted, and then
+            # wait for one request to replenish (reset-requests is the time to a full refill)
+            remaining_requests = headers.get('x-ratelimit-remaining-requests')
+            limit_requests = headers.get('x-ratelimit-limit-requests')
+            if remaining_requests is not None and float(remaining_requests) <= 0 and limit_requests:
+                reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+                limiter.blocked_until = max(limiter.blocked_until, now + reset / float(limit_requests))
+
+            retry_after = headers.get('retry-after')
+            if retry_after is not None:
+                limiter.blocked_until = max(limiter.blocked_until, now + parse_duration(retry_after))
+            self._cond.notify_all()
+
+    def blocked_for(self, model_id: str) -> float:
+        """Seconds model_id stays blocked after a 429 / exhausted quota"""
+        with self._cond:
+            limiter = self._limiters.get(model_id)
+            return max(limiter.blocked_until - time.monotonic(), 0.0) if limiter else 0.0
+
+    def queue_depth(self, model_id: str) -> int:
+        with self._cond:
+            return len(self._limiter(model_id).queue)
+
+    def get_stats(self) -> dict:
+        """Per-model bucket levels and queue depth for the metrics endpoint"""
+        with self._cond:
+            now = time.monotonic()
+            stats = {}
+            for model_id, limiter in self._limiters.items():
+                limiter.requests.refill(now)
+                limiter.tokens.refill(now)
+                stats[model_id] = {
+                    'queued': len(limiter.queue),
+                    'requests_available': round(limiter.requests.tokens, 1),
+                    'tokens_available': round(limiter.tokens.tokens),
+                    'blocked_for': round(max(limiter.blocked_until - now, 0.0), 1),
+                }
+            return stats
+
+    def reset(self):
+        """Forget all buckets (used by tests and benchmarks)"""
+        with self._cond:
+            self._limiters.clear()
+
+
+# Process-wide instance
+scheduler = LLMScheduler()
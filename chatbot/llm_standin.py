@@ -0,0 +1,242 @@
+"""
+Local LLM stand-in server for load and regression testing
+Serves the offline provider in chatbot/fake_provider.py (limits, latency
+distributions, error injection, canned quiz / question-paper JSON) over the
+Groq OpenAI-compatible chat completions protocol and a Gemini generateContent
+REST shim, with SSE streaming, so the app's real HTTP client code and the
+benchmarks in testing/ run without API keys.
+
+Run it with `python manage.py run_llm_standin` and point the app at it with
+LLM_BACKEND=standin (LLM_STANDIN_URL defaults to http://127.0.0.1:8765).
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from .fake_provider import FakeRateLimitedProvider, FakeRateLimitError, FakeServerError, canned_response
+
+DEFAULT_CONFIG = {
+    # Seconds until the first token. distribution: fixed | uniform | lognormal
+    'LATENCY': {'distribution': 'lognormal', 'median': 0.6, 'sigma': 0.5},
+    'MODEL_LATENCY': {},         # model_id -> latency spec overriding LATENCY
+    'TOKENS_PER_SECOND': 400,    # Streaming pace after the first token
+    'ERROR_RATE': 0.0,           # Share of requests answered with a 500
+    'RATE_LIMIT_RATE': 0.0,      # Share of requests answered with a 429
+    'RPM': 1000,                 # Enforced limits (reported in x-ratelimit-* headers)
+    'TPM': 1000000,
+    'SEED': None,
+}
+
+GROQ_PATH = '/openai/v1/chat/completions'
+GEMINI_PATH = re.compile(r'^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$')
+
+
+def get_config(overrides: dict = None) -> dict:
+    """Merge LLM_STANDIN settings (and explicit overrides) over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    try:
+        from django.conf import settings
+        config.update(getattr(settings, 'LLM_STANDIN', {}))
+    except Exception:
+        pass
+    config.update(overrides or {})
+    return config
+
+
+# ===== HTTP server =====
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: dict):
+        super().__init__(address, StandinHandler)
+        self.config = config
+        self.provider = FakeRateLimitedProvider(
+            rpm=config['RPM'],
+            tpm=config['TPM'],
+            latency=config['LATENCY'],
+            model_latency=config['MODEL_LATENCY'],
+            error_rate=config['ERROR_RATE'],
+            rate_limit_rate=config['RATE_LIMIT_RATE'],
+            seed=config['SEED']
+        )
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+    # ----- plumbing -----
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, headers: dict = None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_event(self, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _pieces(self, text: str):
+        """Split text into ~token-sized pieces with the configured streaming pace"""
+        words = re.findall(r'\S+\s*|\s+', text)
+        delay = 1.0 / max(self.server.config['TOKENS_PER_SECOND'], 1)
+        for i in range(0, len(words), 4):
+            time.sleep(delay * 4)
+            yield ''.join(words[i:i + 4])
+
+    def _admit(self, model_id: str, messages: list, max_tokens: int):
+        """Apply the provider's limits, latency and injected errors; returns headers or None after replying"""
+        try:
+            return self.server.provider.admit(model_id, messages, max_tokens)
+        except FakeRateLimitError as e:
+            self._send_error(429, e.headers, str(e))
+        except FakeServerError as e:
+            self._send_error(500, e.headers, str(e))
+        return None
+
+    def _send_error(self, status, headers, message):
+        if self.path.startswith('/v1beta/'):
+            code = 'RESOURCE_EXHAUSTED' if status == 429 else 'INTERNAL'
+            if status == 429:
+                message = 'Resource has been exhausted (e.g. check quota).'
+            self._send_json(status, {'error': {'code': status, 'message': message, 'status': code}}, headers)
+        else:
+            kind = 'rate_limit_exceeded' if status == 429 else 'server_error'
+            self._send_json(status, {'error': {'message': message, 'type': kind}}, headers)
+
+    # ----- routes -----
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'requests_served': self.server.provider.requests})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == GROQ_PATH:
+            return self._groq()
+        match = GEMINI_PATH.match(path)
+        if match:
+            return self._gemini(match.group('model'), match.group('method') == 'streamGenerateContent')
+        self._send_json(404, {'error': {'message': f'Unknown endpoint {path}'}})
+
+    def _groq(self):
+        body = self._read_json()
+        model_id = body.get('model', 'unknown')
+        messages = body.get('messages', [])
+        headers = self._admit(model_id, messages, body.get('max_tokens', 1024))
+        if headers is None:
+            return
+
+        prompt = '\n'.join(m.get('content', '') for m in messages)
+        text = canned_response(prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if body.get('stream'):
+            self._start_stream(headers)
+            for piece in self._pieces(text):
+                self._send_event({
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model_id,
+                    'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}],
+                })
+            self._send_event({
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model_id,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            })
+            self._send_event('[DONE]')
+            return
+
+        prompt_tokens = len(prompt.split())
+        completion_tokens = len(text.split())
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model_id,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }, headers)
+
+    def _gemini(self, model_id, stream):
+        body = self._read_json()
+        prompt = '\n'.join(
+            part.get('text', '')
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        max_tokens = body.get('generationConfig', {}).get('maxOutputTokens', 1024)
+        # Gemini does not send rate-limit headers - drop the Groq-style ones
+        if self._admit(model_id, [{'role': 'user', 'content': prompt}], max_tokens) is None:
+            return
+
+        text = canned_response(prompt)
+
+        def candidate(piece, finish=None):
+            payload = {'candidates': [{'content': {'parts': [{'text': piece}], 'role': 'model'}, 'index': 0}]}
+            if finish:
+                payload['candidates'][0]['finishReason'] = finish
+            return payload
+
+        if stream and parse_qs(urlparse(self.path).query).get('alt') == ['sse']:
+            self._start_stream()
+            for piece in self._pieces(text):
+                self._send_event(candidate(piece))
+            self._send_event(candidate('', 'STOP'))
+            return
+
+        payload = candidate(text, 'STOP')
+        payload['usageMetadata'] = {
+            'promptTokenCount': len(prompt.split()),
+            'candidatesTokenCount': len(text.split()),
+        }
+        self._send_json(200, payload)
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8765, config: dict = None) -> StandinServer:
+    """Build (but do not start) a stand-in server"""
+    return StandinServer((host, port), get_config(config))
+
+
+def start_in_thread(host: str = '127.0.0.1', port: int = 0, config: dict = None):
+    """
+    Serve from a daemon thread (benchmarks / tests)
+
+    Returns:
+        Tuple of (server, base_url). Call server.shutdown() when done.
+    """
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True, name='llm-standin').start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,27 @@
+"""
+Management command to build pre-generated quiz question pools
+"""
+from django.core.management.base import BaseCommand
+from chatbot.models import Document
+from chatbot.question_pool import build_pool, get_pool_stats
+
+
+class Command(BaseCommand):
+    help = 'Generate quiz question pools for documents (all documents when no ids are given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('document_ids', nargs='*', type=int)
+        parser.add_argument('--sections', nargs='*', help='Only build these heading ids (e.g. h0 h3)')
+
+    def handle(self, *args, **options):
+        documents = Document.objects.all()
+        if options['document_ids']:
+            documents = documents.filter(id__in=options['document_ids'])
+
+        for document in documents:
+            self.stdout.write(f"Building question pool for {document.id}: {document.title}")
+            build_pool(document.id, options['sections'] or None)
+            for section in get_pool_stats(document.id)['sections']:
+                self.stdout.write(f"  {section['section']:<10} {section['questions']:>4} questions  {section['title']}")
+
+        self.stdout.write(self.style.SUCCESS('Question pools built'))
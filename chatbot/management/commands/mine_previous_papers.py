@@ -0,0 +1,30 @@
+"""
+Management command to mine previous papers into ranked per-subject topics
+"""
+from django.core.management.base import BaseCommand
+from chatbot.models import PreviousPaper
+from chatbot.paper_mining import mine_subject, get_subject_stats, topic_table
+
+
+class Command(BaseCommand):
+    help = 'Segment and cluster unmined previous papers (all subjects when none are given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subjects', nargs='*')
+        parser.add_argument('--show', type=int, default=0, help='Print the top N ranked topics per subject')
+
+    def handle(self, *args, **options):
+        subjects = options['subjects'] or sorted(
+            set(PreviousPaper.objects.values_list('subject', flat=True)), key=str.lower
+        )
+        for subject in subjects:
+            added = mine_subject(subject)
+            stats = get_subject_stats(subject)
+            self.stdout.write(
+                f"{subject}: +{added} questions ({stats['papers']} papers, "
+                f"{stats['questions']} questions, {stats['topics']} topics)"
+            )
+            if options['show']:
+                self.stdout.write(topic_table(subject, options['show']))
+
+        self.stdout.write(self.style.SUCCESS('Previous papers mined'))
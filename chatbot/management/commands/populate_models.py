@@ -13,6 +13,9 @@ class Command(BaseCommand):
             {
                 'name': 'Gemini 2.5 Flash',
                 'model_id': 'gemini-2.5-flash',
+                'context_window': 1048576,
+                'input_token_budget': 16000,
+                'capability_tier': 3,
                 'provider': 'gemini',
                 'description': 'Latest Gemini model with enhanced performance and reasoning capabilities',
                 'strength': 'Superior speed, excellent reasoning, large context window',
@@ -21,6 +24,9 @@ class Command(BaseCommand):
             {
                 'name': 'Gemini 2.0 Flash Lite',
                 'model_id': 'gemini-2.0-flash-lite',
+                'context_window': 1048576,
+                'input_token_budget': 12000,
+                'capability_tier': 1,
                 'provider': 'gemini',
                 'description': 'Lightweight text model optimized for speed',
                 'strength': 'Very fast, low cost',
@@ -29,6 +35,9 @@ class Command(BaseCommand):
             {
                 'name': 'Llama 3.1 8B Instant',
                 'model_id': 'llama-3.1-8b-instant',
+                'context_window': 131072,
+                'input_token_budget': 6000,
+                'capability_tier': 1,
                 'provider': 'groq',
                 'description': 'General-purpose LLM with excellent speed and good reasoning',
                 'strength': 'Best overall Groq free model, very fast inference',
@@ -37,6 +46,9 @@ class Command(BaseCommand):
             {
                 'name': 'Llama 3.3 70B Versatile',
                 'model_id': 'llama-3.3-70b-versatile',
+                'context_window': 131072,
+                'input_token_budget': 8000,
+                'capability_tier': 3,
                 'provider': 'groq',
                 'description': 'Powerful 70B parameter model with excellent reasoning and instruction following',
                 'strength': 'Superior reasoning, handles complex tasks, very fast inference',
@@ -0,0 +1,41 @@
+"""
+Management command to run the local LLM stand-in server
+"""
+from django.core.management.base import BaseCommand
+from chatbot.llm_standin import make_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local Groq/Gemini-compatible LLM stand-in for load and regression testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, help='Median seconds to first token (lognormal)')
+        parser.add_argument('--sigma', type=float, default=0.5, help='Lognormal sigma for --latency')
+        parser.add_argument('--error-rate', type=float, help='Share of requests answered with a 500')
+        parser.add_argument('--rate-limit-rate', type=float, help='Share of requests answered with a 429')
+        parser.add_argument('--rpm', type=int, help='Requests per minute enforced per model')
+        parser.add_argument('--tpm', type=int, help='Tokens per minute enforced per model')
+        parser.add_argument('--seed', type=int, help='Seed for reproducible latency and errors')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['latency'] is not None:
+            overrides['LATENCY'] = {'distribution': 'lognormal', 'median': options['latency'], 'sigma': options['sigma']}
+        for option, key in [('error_rate', 'ERROR_RATE'), ('rate_limit_rate', 'RATE_LIMIT_RATE'),
+                            ('rpm', 'RPM'), ('tpm', 'TPM'), ('seed', 'SEED')]:
+            if options[option] is not None:
+                overrides[key] = options[option]
+
+        server = make_server(options['host'], options['port'], overrides)
+        self.stdout.write(self.style.SUCCESS(
+            f"LLM stand-in listening on http://{options['host']}:{options['port']} "
+            f"(set LLM_BACKEND=standin LLM_STANDIN_URL=http://{options['host']}:{options['port']})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('\nStopping stand-in')
+        finally:
+            server.server_close()
@@ -0,0 +1,57 @@
+"""
+Lightweight in-process metrics for the LLM layer
+Counters and gauges are kept per worker process and exposed through /api/metrics/
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def incr(name: str, amount: int = 1):
+    """Increment a named counter"""
+    with _lock:
+        _counters[name] += amount
+
+
+def set_gauge(name: str, value):
+    """Set a named gauge to its current value"""
+    with _lock:
+        _gauges[name] = value
+
+
+def get_counter(name: str) -> int:
+    """Read the current value of a counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def hit_rate(prefix: str) -> float:
+    """
+    Compute the hit rate for a counter family
+
+    Expects counters named '<prefix>.hits' and '<prefix>.misses'.
+    """
+    with _lock:
+        hits = _counters.get(f'{prefix}.hits', 0)
+        misses = _counters.get(f'{prefix}.misses', 0)
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+def snapshot() -> dict:
+    """Return a copy of all counters and gauges"""
+    with _lock:
+        return {
+            'counters': dict(sorted(_counters.items())),
+            'gauges': dict(sorted(_gauges.items())),
+        }
+
+
+def reset():
+    """Clear all metrics (used by tests and benchmarks)"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-19 04:25
+
+from django.db import migrations, models
+
+
+# (context_window, input_token_budget) for models shipped in fixtures / populate_models
+KNOWN_LIMITS = {
+    'llama-3.1-8b-instant': (131072, 6000),
+    'llama-3.3-70b-versatile': (131072, 8000),
+    'mixtral-8x7b-32768': (32768, 8000),
+    'gemini-2.5-flash': (1048576, 16000),
+    'gemini-2.0-flash-exp': (1048576, 16000),
+    'gemini-2.0-flash-lite': (1048576, 12000),
+    'distilgpt2': (1024, 512),
+}
+
+
+def set_known_limits(apps, schema_editor):
+    AIModel = apps.get_model('chatbot', 'AIModel')
+    for model_id, (context_window, input_token_budget) in KNOWN_LIMITS.items():
+        AIModel.objects.filter(model_id=model_id).update(
+            context_window=context_window,
+            input_token_budget=input_token_budget
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_alter_aimodel_provider'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimodel',
+            name='context_window',
+            field=models.IntegerField(default=8192, help_text='Maximum prompt + completion tokens the model accepts'),
+        ),
+        migrations.AddField(
+            model_name='aimodel',
+            name='input_token_budget',
+            field=models.IntegerField(default=4000, help_text='Prompt tokens to spend per request (context, history, instructions)'),
+        ),
+        migrations.AlterField(
+            model_name='aimodel',
+            name='provider',
+            field=models.CharField(choices=[('gemini', 'Gemini'), ('groq', 'Groq'), ('gpt', 'OpenAI GPT'), ('local', 'Local Model'), ('wikipedia', 'Wikipedia')], max_length=20),
+        ),
+        migrations.RunPython(set_known_limits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_aimodel_token_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='summary',
+            field=models.TextField(blank=True, help_text='Rolling summary of messages older than the recent window'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='summary_last_message_id',
+            field=models.BigIntegerField(default=0, help_text='Last message folded into the summary'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+# Capability tiers for models shipped in fixtures / populate_models (1 basic, 2 standard, 3 advanced)
+KNOWN_TIERS = {
+    'llama-3.1-8b-instant': 1,
+    'llama-3.3-70b-versatile': 3,
+    'mixtral-8x7b-32768': 2,
+    'gemini-2.5-flash': 3,
+    'gemini-2.0-flash-exp': 2,
+    'gemini-2.0-flash-lite': 1,
+    'distilgpt2': 1,
+}
+
+
+def set_known_tiers(apps, schema_editor):
+    AIModel = apps.get_model('chatbot', 'AIModel')
+    for model_id, tier in KNOWN_TIERS.items():
+        AIModel.objects.filter(model_id=model_id).update(capability_tier=tier)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0009_chat_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimodel',
+            name='capability_tier',
+            field=models.IntegerField(choices=[(1, 'Basic'), (2, 'Standard'), (3, 'Advanced')], default=2, help_text='Hardest task the router may send to this model'),
+        ),
+        migrations.RunPython(set_known_tiers, migrations.RunPython.noop),
+    ]
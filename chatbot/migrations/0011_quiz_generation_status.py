@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0010_aimodel_capability_tier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='generation_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='generation_status',
+            field=models.CharField(choices=[('generating', 'Generating'), ('complete', 'Complete'), ('failed', 'Failed')], default='complete', max_length=20),
+        ),
+    ]
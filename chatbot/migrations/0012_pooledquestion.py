@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-19 04:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0011_quiz_generation_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(blank=True, max_length=20)),
+                ('section_title', models.CharField(blank=True, max_length=255)),
+                ('question', models.TextField()),
+                ('options', models.JSONField(default=list)),
+                ('correct_answer', models.CharField(max_length=500)),
+                ('explanation', models.TextField(blank=True)),
+                ('times_served', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_pool', to='chatbot.document')),
+            ],
+            options={
+                'ordering': ['times_served', 'id'],
+                'indexes': [models.Index(fields=['document', 'section', 'times_served'], name='chatbot_poo_documen_2fb476_idx')],
+            },
+        ),
+    ]
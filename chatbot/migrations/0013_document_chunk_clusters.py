@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0012_pooledquestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='chunk_clusters',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
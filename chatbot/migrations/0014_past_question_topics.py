@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-19 05:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0013_document_chunk_clusters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='previouspaper',
+            name='mined_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PastTopic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=100)),
+                ('text', models.TextField()),
+                ('marks', models.IntegerField(blank=True, null=True)),
+                ('occurrences', models.IntegerField(default=0)),
+                ('years', models.JSONField(default=list)),
+                ('last_year', models.IntegerField(blank=True, null=True)),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-score', 'id'],
+                'indexes': [models.Index(fields=['subject', '-score'], name='chatbot_pas_subject_d72c61_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PastQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField()),
+                ('marks', models.IntegerField(blank=True, null=True)),
+                ('year', models.IntegerField(blank=True, null=True)),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mined_questions', to='chatbot.previouspaper')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='chatbot.pasttopic')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-19 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0014_past_question_topics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'created_at'], name='chatbot_mes_chat_id_cd3a0f_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-19 05:15
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_message_stats(apps, schema_editor):
+    Chat = apps.get_model('chatbot', 'Chat')
+    Message = apps.get_model('chatbot', 'Message')
+    stats = Message.objects.filter(chat_id=OuterRef('id')).order_by().values('chat_id')
+    Chat.objects.update(
+        message_count=Coalesce(Subquery(stats.annotate(count=Count('id')).values('count')), 0),
+        last_message_at=Subquery(stats.annotate(last=Max('created_at')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0015_message_chat_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['updated_at'], name='chatbot_cha_updated_523823_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['uploaded_at'], name='chatbot_doc_uploade_dd1eea_idx'),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0016_chat_message_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='index_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
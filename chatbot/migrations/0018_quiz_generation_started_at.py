@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0017_document_index_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='generation_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
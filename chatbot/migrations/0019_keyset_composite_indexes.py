@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-19 05:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0018_quiz_generation_started_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chat',
+            name='chatbot_cha_updated_523823_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='document',
+            name='chatbot_doc_uploade_dd1eea_idx',
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['-updated_at', '-id'], name='chatbot_cha_updated_5292e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='chatbot_doc_uploade_6de55e_idx'),
+        ),
+    ]
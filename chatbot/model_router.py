@@ -0,0 +1,246 @@
+"""
+Adaptive model routing from live latency and error telemetry
+Every provider call records its latency and outcome per model. Endpoints that
+do not pin a model ask the router for the fastest healthy model of the
+capability tier they need; the current choice is kept unless a challenger is
+clearly faster (hysteresis), so traffic does not flap between models.
+"""
+import threading
+import time
+from collections import deque
+from django.conf import settings
+
+from . import metrics
+
+TIER_BASIC = 1
+TIER_STANDARD = 2
+TIER_ADVANCED = 3
+
+# Used when the AIModel table is empty (fresh checkout before fixtures are loaded)
+DEFAULT_CATALOG = {
+    'llama-3.1-8b-instant': ('groq', TIER_BASIC),
+    'llama-3.3-70b-versatile': ('groq', TIER_ADVANCED),
+    'mixtral-8x7b-32768': ('groq', TIER_STANDARD),
+    'gemini-2.5-flash': ('gemini', TIER_ADVANCED),
+    'gemini-2.0-flash-exp': ('gemini', TIER_STANDARD),
+    'gemini-2.0-flash-lite': ('gemini', TIER_BASIC),
+}
+
+# Providers the router may send traffic to (local / wikipedia are not LLM APIs)
+ROUTABLE_PROVIDERS = ('groq', 'gemini')
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'WINDOW_SECONDS': 300,      # Telemetry older than this is ignored
+    'MAX_SAMPLES': 200,         # Per model
+    'MIN_SAMPLES': 5,           # Below this, PRIOR_LATENCY stands in for p95
+    'PRIOR_LATENCY': 3.0,       # Seconds
+    'MAX_ERROR_RATE': 0.5,      # Above this a model is unhealthy
+    'HYSTERESIS': 0.2,          # A challenger must be 20% faster to take over
+    'MIN_DWELL': 30,            # Seconds a choice is kept before it can change
+    'PREFERRED': {TIER_BASIC: 'llama-3.1-8b-instant', TIER_STANDARD: 'llama-3.3-70b-versatile'},
+    'CATALOG_TTL': 60,
+    'DECISION_LOG_SIZE': 100,
+}
+
+
+def get_config() -> dict:
+    """Merge MODEL_ROUTER settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'MODEL_ROUTER', {}))
+    return config
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class ModelRouter:
+    """Rolling per-model telemetry plus tier-based model selection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}     # model_id -> deque of (timestamp, latency, ok)
+        self._current = {}     # tier -> (model_id, chosen_at)
+        self._decisions = deque(maxlen=DEFAULT_CONFIG['DECISION_LOG_SIZE'])
+        self._catalog = None
+        self._catalog_loaded_at = 0.0
+
+    # ----- telemetry -----
+
+    def record(self, model_id: str, latency: float, ok: bool):
+        """Record one provider call (latency in seconds)"""
+        config = get_config()
+        with self._lock:
+            samples = self._samples.get(model_id)
+            if samples is None:
+                samples = self._samples[model_id] = deque(maxlen=config['MAX_SAMPLES'])
+            samples.append((time.monotonic(), latency, ok))
+        metrics.incr(f'router.calls.{model_id}')
+        if not ok:
+            metrics.incr(f'router.errors.{model_id}')
+
+    def model_stats(self, model_id: str) -> dict:
+        """Rolling p50/p95 latency (successful calls) and error rate for a model"""
+        config = get_config()
+        cutoff = time.monotonic() - config['WINDOW_SECONDS']
+        with self._lock:
+            recent = [s for s in self._samples.get(model_id, ()) if s[0] >= cutoff]
+        latencies = sorted(latency for _, latency, ok in recent if ok)
+        errors = sum(1 for _, _, ok in recent if not ok)
+        return {
+            'samples': len(recent),
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+            'error_rate': errors / len(recent) if recent else 0.0,
+        }
+
+    def latency_percentile(self, model_id: str, fraction: float):
+        """Latency percentile of recent successful calls, or None without enough samples"""
+        config = get_config()
+        cutoff = time.monotonic() - config['WINDOW_SECONDS']
+        with self._lock:
+            latencies = sorted(latency for t, latency, ok in self._samples.get(model_id, ()) if ok and t >= cutoff)
+        if len(latencies) < config['MIN_SAMPLES']:
+            return None
+        return _percentile(latencies, fraction)
+
+    # ----- catalog -----
+
+    def _get_catalog(self) -> dict:
+        """model_id -> (provider, tier) for active models, refreshed every CATALOG_TTL seconds"""
+        config = get_config()
+        now = time.monotonic()
+        if self._catalog is not None and now - self._catalog_loaded_at < config['CATALOG_TTL']:
+            return self._catalog
+        try:
+            from .models import AIModel
+            rows = AIModel.objects.filter(
+                is_active=True, provider__in=ROUTABLE_PROVIDERS
+            ).values_list('model_id', 'provider', 'capability_tier')
+            catalog = {model_id: (provider, tier) for model_id, provider, tier in rows}
+        except Exception as e:
+            print(f"[ROUTER] Could not load model catalog: {e}")
+            catalog = {}
+        self._catalog = catalog or dict(DEFAULT_CATALOG)
+        self._catalog_loaded_at = now
+        return self._catalog
+
+    def provider_for(self, model_id: str) -> str:
+        """Provider that serves model_id ('gemini' or 'groq')"""
+        entry = self._get_catalog().get(model_id) or DEFAULT_CATALOG.get(model_id)
+        if entry:
+            return entry[0]
+        return 'gemini' if model_id.startswith('gemini') else 'groq'
+
+    # ----- routing -----
+
+    def _score(self, model_id: str, stats: dict, config: dict):
+        """(unhealthy, expected latency) - lower sorts first"""
+        from .llm_scheduler import scheduler
+        unhealthy = (
+            (stats['samples'] >= config['MIN_SAMPLES'] and stats['error_rate'] > config['MAX_ERROR_RATE'])
+            or scheduler.blocked_for(model_id) > 0
+        )
+        latency = stats['p95'] if stats['samples'] >= config['MIN_SAMPLES'] and stats['p95'] is not None else config['PRIOR_LATENCY']
+        return (unhealthy, latency)
+
+    def candidates(self, tier: int = TIER_BASIC, reason: str = '') -> list:
+        """
+        Models that meet tier, best first
+
+        The first entry is the routed choice; the rest are fallbacks in
+        order (unhealthy models last, as a last resort).
+
+        Args:
+            tier: Minimum capability tier the request needs
+            reason: Caller label recorded in the decision log
+        """
+        config = get_config()
+        catalog = self._get_catalog()
+        eligible = [model_id for model_id, (_, model_tier) in catalog.items() if model_tier >= tier]
+        if not eligible:
+            eligible = [model_id for model_id, (_, model_tier) in DEFAULT_CATALOG.items() if model_tier >= tier]
+
+        stats = {model_id: self.model_stats(model_id) for model_id in eligible}
+        scores = {model_id: self._score(model_id, stats[model_id], config) for model_id in eligible}
+        ranked = sorted(eligible, key=lambda model_id: scores[model_id])
+        if not config['ENABLED']:
+            preferred = config['PREFERRED'].get(tier)
+            if preferred in ranked:
+                ranked.remove(preferred)
+                ranked.insert(0, preferred)
+            return ranked
+
+        now = time.monotonic()
+        best = ranked[0]
+        with self._lock:
+            current, chosen_at = self._current.get(tier, (config['PREFERRED'].get(tier), 0.0))
+            choice, why = best, 'fastest'
+            if current in scores:
+                current_unhealthy, current_latency = scores[current]
+                best_unhealthy, best_latency = scores[best]
+                if current == best:
+                    choice, why = current, 'kept'
+                elif current_unhealthy and not best_unhealthy:
+                    choice, why = best, f'{current} unhealthy'
+                elif now - chosen_at < config['MIN_DWELL']:
+                    choice, why = current, 'kept (dwell)'
+                elif best_latency < current_latency * (1 - config['HYSTERESIS']):
+                    choice, why = best, f'{best_latency:.2f}s beats {current_latency:.2f}s'
+                else:
+                    choice, why = current, 'kept (hysteresis)'
+            if choice != current or tier not in self._current:
+                self._current[tier] = (choice, now)
+            switched = current is not None and choice != current
+
+            decision = {
+                'at': time.time(),
+                'tier': tier,
+                'reason': reason,
+                'chosen': choice,
+                'previous': current,
+                'why': why,
+                'scores': {
+                    model_id: {'p95': round(latency, 3), 'unhealthy': unhealthy}
+                    for model_id, (unhealthy, latency) in scores.items()
+                },
+            }
+            self._decisions.append(decision)
+
+        if switched:
+            metrics.incr('router.switches')
+        print(f"[ROUTER] tier={tier} {reason or '-'} -> {choice} ({why})")
+        ranked.remove(choice)
+        return [choice] + ranked
+
+    def choose(self, tier: int = TIER_BASIC, reason: str = '') -> str:
+        """The routed model for a tier"""
+        return self.candidates(tier, reason)[0]
+
+    def get_stats(self) -> dict:
+        """Telemetry, current choices and recent decisions for the metrics endpoint"""
+        with self._lock:
+            model_ids = list(self._samples)
+            current = {tier: model_id for tier, (model_id, _) in self._current.items()}
+            decisions = list(self._decisions)[-20:]
+        return {
+            'models': {model_id: self.model_stats(model_id) for model_id in model_ids},
+            'current': current,
+            'decisions': decisions,
+        }
+
+    def reset(self):
+        """Forget telemetry and choices (used by tests and benchmarks)"""
+        with self._lock:
+            self._samples.clear()
+            self._current.clear()
+            self._decisions.clear()
+            self._catalog = None
+
+
+# Process-wide instance
+router = ModelRouter()
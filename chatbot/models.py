@@ -11,6 +11,11 @@ class AIModel(models.Model):
         ('local', 'Local Model'),
         ('wikipedia', 'Wikipedia'),
     ]
+    TIER_CHOICES = [
+        (1, 'Basic'),
+        (2, 'Standard'),
+        (3, 'Advanced'),
+    ]
     
     name = models.CharField(max_length=100)  # Display name
     model_id = models.CharField(max_length=100, unique=True)  # API model identifier
@@ -19,6 +24,9 @@ class AIModel(models.Model):
     use_cases = models.TextField(help_text="Comma-separated use cases")
     strength = models.CharField(max_length=200)
     is_active = models.BooleanField(default=True)
+    context_window = models.IntegerField(default=8192, help_text="Maximum prompt + completion tokens the model accepts")
+    input_token_budget = models.IntegerField(default=4000, help_text="Prompt tokens to spend per request (context, history, instructions)")
+    capability_tier = models.IntegerField(choices=TIER_CHOICES, default=2, help_text="Hardest task the router may send to this model")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -35,10 +43,16 @@ class Document(models.Model):
     file_type = models.CharField(max_length=10)  # pdf, docx, pptx
     uploaded_at = models.DateTimeField(auto_now_add=True)
     text_content = models.TextField(blank=True)  # Extracted text
+    # k-means clusters of the vector store chunks: {'chunks': n, 'clusters': [[chunk indices, closest first], ...]}
+    chunk_clusters = models.JSONField(default=dict, blank=True)
+    # Bumped on every re-index; keys the semantic answer cache so old answers are never served
+    index_version = models.PositiveIntegerField(default=0)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploaded_documents')
     
     class Meta:
         ordering = ['-uploaded_at']
+        # Keyset pages of the document list, newest first
+        indexes = [models.Index(fields=['-uploaded_at', '-id'])]
     
     def __str__(self):
         return self.title
@@ -50,11 +64,18 @@ class Chat(models.Model):
     document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
     selected_model = models.ForeignKey(AIModel, on_delete=models.SET_NULL, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='chats')
+    summary = models.TextField(blank=True, help_text="Rolling summary of messages older than the recent window")
+    summary_last_message_id = models.BigIntegerField(default=0, help_text="Last message folded into the summary")
+    # Denormalized so chat lists need no per-chat message query
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-updated_at']
+        # Keyset pages of the (unscoped) chat list, most recently active first
+        indexes = [models.Index(fields=['-updated_at', '-id'])]
     
     def __str__(self):
         return f"{self.name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
@@ -75,6 +96,8 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        # Recent-history windows and keyset pages of one chat
+        indexes = [models.Index(fields=['chat', 'created_at'])]
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
@@ -118,6 +141,14 @@ class Quiz(models.Model):
         ('document', 'Document'),
         ('prompt', 'Prompt'),
     ]
+    STATUS_GENERATING = 'generating'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_GENERATING, 'Generating'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+    ]
     
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, null=True, blank=True, related_name='quizzes')
     document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
@@ -128,6 +159,11 @@ class Quiz(models.Model):
     is_completed = models.BooleanField(default=False)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='quizzes')
     session_key = models.CharField(max_length=100, blank=True)
+    # Progressive quizzes are created first and filled in by a background generator
+    generation_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_COMPLETE)
+    generation_error = models.TextField(blank=True)
+    # When the generator last (re)started; quizzes still generating long after it are marked failed
+    generation_started_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -156,6 +192,26 @@ class QuizQuestion(models.Model):
         return f"Q{self.order}: {self.question[:50]}..."
 
 
+class PooledQuestion(models.Model):
+    """Pre-generated, validated quiz question served without an LLM call"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='question_pool')
+    section = models.CharField(max_length=20, blank=True)  # Heading id ('' = whole document)
+    section_title = models.CharField(max_length=255, blank=True)
+    question = models.TextField()
+    options = models.JSONField(default=list)
+    correct_answer = models.CharField(max_length=500)
+    explanation = models.TextField(blank=True)
+    times_served = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['times_served', 'id']
+        indexes = [models.Index(fields=['document', 'section', 'times_served'])]
+    
+    def __str__(self):
+        return f"Pool {self.document_id}/{self.section or 'doc'}: {self.question[:50]}..."
+
+
 class LearningItem(models.Model):
     """Learning track items from quiz mistakes or manual additions"""
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, null=True, blank=True, related_name='learning_items')
@@ -224,6 +280,7 @@ class PreviousPaper(models.Model):
     year = models.IntegerField(null=True, blank=True)
     text_content = models.TextField(blank=True)  # Extracted text
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    mined_at = models.DateTimeField(null=True, blank=True)  # Questions extracted into PastQuestion
     
     class Meta:
         ordering = ['-year', '-uploaded_at']
@@ -231,3 +288,34 @@ class PreviousPaper(models.Model):
     def __str__(self):
         return f"{self.subject} - {self.year or 'Unknown Year'}"
 
+
+class PastTopic(models.Model):
+    """Cluster of near-identical questions asked across previous papers of a subject"""
+    subject = models.CharField(max_length=100)
+    text = models.TextField()  # Representative question
+    marks = models.IntegerField(null=True, blank=True)  # Most common marks
+    occurrences = models.IntegerField(default=0)
+    years = models.JSONField(default=list)  # Distinct years asked, ascending
+    last_year = models.IntegerField(null=True, blank=True)
+    score = models.FloatField(default=0)  # Frequency weighted by recency
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-score', 'id']
+        indexes = [models.Index(fields=['subject', '-score'])]
+    
+    def __str__(self):
+        return f"{self.subject}: {self.text[:50]} (x{self.occurrences})"
+
+
+class PastQuestion(models.Model):
+    """Single question segmented from a previous paper"""
+    paper = models.ForeignKey(PreviousPaper, on_delete=models.CASCADE, related_name='mined_questions')
+    topic = models.ForeignKey(PastTopic, on_delete=models.CASCADE, related_name='questions')
+    text = models.TextField()
+    marks = models.IntegerField(null=True, blank=True)
+    year = models.IntegerField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.marks or '?'} marks: {self.text[:50]}..."
+
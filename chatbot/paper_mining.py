@@ -0,0 +1,278 @@
+"""
+Local frequency and pattern mining over previous exam papers
+Previous papers are segmented into individual questions, which are clustered
+with the near-duplicate index into per-subject topics (the same question
+asked in different years lands in one PastTopic). Topics are ranked by how
+often and how recently they were asked. Mining is incremental - only papers
+without mined_at are processed - and paper prediction sends the compact
+ranked topic table to the LLM instead of the raw text of every paper.
+"""
+import re
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .dedup import NearDuplicateIndex
+from .models import PreviousPaper, PastTopic, PastQuestion
+
+DEFAULT_CONFIG = {
+    'MATCH_THRESHOLD': 0.35,      # Shingle similarity at which two questions are the same topic
+    'LSH_BANDS': 48,              # 2-row bands (vs 3 for question dedup): rephrasings across years share fewer shingles
+    'HALF_LIFE_YEARS': 3,         # A question asked this many years before the latest paper counts half
+    'UNKNOWN_YEAR_WEIGHT': 0.5,
+    'MIN_WORDS': 2,               # Shorter segments are headers or noise
+    'TABLE_SIZE': 60,             # Topics listed in prediction prompts
+}
+
+# "Q1.", "Q.2", "Question 3", "4.", "5)", "(a)", "b)", "(ii)"
+_QUESTION_START = re.compile(
+    r'^\s*(?:Q(?:uestion)?\s*\.?\s*\d{1,2}\s*[.:)\-]?|\d{1,2}\s*[.)]|\(?(?:[a-h]|i{1,3}|iv|vi{0,3}|ix|x)\))\s+(?P<text>\S.*)$',
+    re.I
+)
+# "(5 marks)", "(2M)", "- 5 Marks" or a bracketed "[10]" at the end of a question
+_TRAILING_MARKS = [
+    re.compile(r'[\s\-]*[(\[]?\s*(?P<marks>\d{1,2})\s*(?:m|marks?)\s*[)\]]?\s*$', re.I),
+    re.compile(r'[\s\-]*[(\[]\s*(?P<marks>\d{1,2})\s*[)\]]\s*$'),
+]
+# "PART A (10 x 2 = 20 marks)", "Answer any five, 5 marks each"
+_PART_MARKS = [
+    re.compile(r'\d+\s*[x×X*]\s*(?P<marks>\d{1,2})\s*=\s*\d+'),
+    re.compile(r'(?P<marks>\d{1,2})\s*marks?\s+each', re.I),
+]
+_HEADER = re.compile(
+    r'^\s*(?:part|section|unit|module)\b|^\s*(?:or|time|max(?:imum)?\.?\s*marks|answer\s+(?:all|any))\b', re.I
+)
+# Sub-part marker left after the question number: "11. (a) Explain ..."
+_SUB_PART = re.compile(r'^\(?[a-h]\)\s+', re.I)
+# Course-outcome / Bloom-level annotations: "CO2", "BL3", "(K2)", "L4"
+_ANNOTATIONS = re.compile(r'[(\[]?\b(?:CO|BL|K|L)\s*\d\b[)\]]?', re.I)
+_YEAR = re.compile(r'\b(19[89]\d|20[0-4]\d)\b')
+
+# Concurrent requests for one subject must not mine the same paper twice
+_mining_lock = threading.Lock()
+
+
+def get_config() -> dict:
+    """Merge PAPER_MINING settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'PAPER_MINING', {}))
+    return config
+
+
+# ===== Segmentation =====
+
+def _clean_question(text: str, default_marks):
+    """Strip annotations and a trailing marks label; returns (text, marks)"""
+    text = _SUB_PART.sub('', text.strip())
+    text = _ANNOTATIONS.sub(' ', text)
+    text = re.sub(r'\s+', ' ', text).strip(' .-')
+    for pattern in _TRAILING_MARKS:
+        match = pattern.search(text)
+        if match:
+            return text[:match.start()].strip(' .-'), int(match.group('marks'))
+    return text, default_marks
+
+
+def segment_questions(text: str, min_words: int = 2) -> list:
+    """
+    Split the text of an exam paper into questions
+
+    Returns:
+        List of {'text': str, 'marks': int or None} in paper order
+    """
+    questions = []
+    default_marks = None
+    current = None
+
+    def flush():
+        if current is None:
+            return
+        question, marks = _clean_question(' '.join(current['lines']), current['marks'])
+        if len(question.split()) >= min_words:
+            questions.append({'text': question, 'marks': marks})
+
+    for line in (text or '').splitlines():
+        if not line.strip():
+            continue
+        if _HEADER.search(line):
+            for pattern in _PART_MARKS:
+                match = pattern.search(line)
+                if match:
+                    default_marks = int(match.group('marks'))
+                    break
+            flush()
+            current = None
+            continue
+        start = _QUESTION_START.match(line)
+        if start:
+            flush()
+            current = {'lines': [start.group('text')], 'marks': default_marks}
+        elif current is not None:
+            current['lines'].append(line.strip())
+    flush()
+    return questions
+
+
+def infer_year(paper: PreviousPaper):
+    """Exam year from the file name or the paper header, if one is given"""
+    for source in (paper.file.name if paper.file else '', (paper.text_content or '')[:2000]):
+        years = _YEAR.findall(source or '')
+        if years:
+            return int(Counter(years).most_common(1)[0][0])
+    return None
+
+
+# ===== Mining =====
+
+def _subject_index(subject: str, config: dict):
+    """Near-duplicate index over every mined question of a subject; returns (index, topic per position)"""
+    index = NearDuplicateIndex(threshold=config['MATCH_THRESHOLD'], bands=config['LSH_BANDS'])
+    topics = []
+    for text, topic_id in PastQuestion.objects.filter(topic__subject__iexact=subject).values_list('text', 'topic_id'):
+        index.add(text)
+        topics.append(PastTopic(id=topic_id))
+    return index, topics
+
+
+def mine_subject(subject: str) -> int:
+    """
+    Mine every previous paper of a subject that has not been mined yet
+
+    Returns:
+        Number of questions added
+    """
+    with _mining_lock:
+        return _mine_subject(subject)
+
+
+def _mine_subject(subject: str) -> int:
+    papers = list(PreviousPaper.objects.filter(subject__iexact=subject, mined_at__isnull=True).order_by('id'))
+    if not papers:
+        return 0
+
+    config = get_config()
+    new_topics = []
+    rows = []
+    with transaction.atomic():
+        index, topics = _subject_index(subject, config)
+        for paper in papers:
+            if paper.year is None:
+                paper.year = infer_year(paper)
+            questions = segment_questions(paper.text_content, config['MIN_WORDS'])
+            for question in questions:
+                position, score = index.best_match(question['text'])
+                if position is not None and score >= config['MATCH_THRESHOLD']:
+                    topic = topics[position]
+                else:
+                    topic = PastTopic(subject=paper.subject, text=question['text'], marks=question['marks'])
+                    new_topics.append(topic)
+                index.add(question['text'])
+                topics.append(topic)
+                rows.append(PastQuestion(
+                    paper=paper, topic=topic, text=question['text'],
+                    marks=question['marks'], year=paper.year
+                ))
+            paper.mined_at = timezone.now()
+            print(f"[PAPER MINING] {paper.subject} paper {paper.id} ({paper.year or 'unknown year'}): "
+                  f"{len(questions)} questions")
+        # New topics get their ids from bulk_create, which the question rows then pick up
+        PastTopic.objects.bulk_create(new_topics)
+        PastQuestion.objects.bulk_create(rows)
+        PreviousPaper.objects.bulk_update(papers, ['year', 'mined_at'])
+        rerank_subject(subject)
+
+    metrics.incr('paper_mining.papers', len(papers))
+    metrics.incr('paper_mining.questions', len(rows))
+    return len(rows)
+
+
+def _topic_stats(rows, config: dict) -> dict:
+    """Occurrences, years, marks and recency-weighted score per topic from (topic_id, year, marks) rows"""
+    known_years = [year for _, year, _ in rows if year]
+    latest = max(known_years) if known_years else None
+
+    stats = {}
+    for topic_id, year, marks in rows:
+        entry = stats.setdefault(topic_id, {'count': 0, 'years': set(), 'marks': Counter(), 'score': 0.0})
+        entry['count'] += 1
+        if year:
+            entry['years'].add(year)
+            entry['score'] += 0.5 ** ((latest - year) / config['HALF_LIFE_YEARS'])
+        else:
+            entry['score'] += config['UNKNOWN_YEAR_WEIGHT']
+        if marks:
+            entry['marks'][marks] += 1
+    return stats
+
+
+def _apply_stats(topic: PastTopic, entry: dict):
+    topic.occurrences = entry['count']
+    topic.years = sorted(entry['years'])
+    topic.last_year = max(entry['years']) if entry['years'] else None
+    topic.marks = entry['marks'].most_common(1)[0][0] if entry['marks'] else topic.marks
+    topic.score = round(entry['score'], 4)
+
+
+def rerank_subject(subject: str):
+    """Recompute occurrence counts, years and recency-weighted scores of a subject's topics"""
+    rows = list(PastQuestion.objects.filter(topic__subject__iexact=subject).values_list('topic_id', 'year', 'marks'))
+    stats = _topic_stats(rows, get_config())
+    topics = list(PastTopic.objects.filter(id__in=stats.keys()))
+    for topic in topics:
+        _apply_stats(topic, stats[topic.id])
+    PastTopic.objects.bulk_update(topics, ['occurrences', 'years', 'last_year', 'marks', 'score'])
+
+
+# ===== Prompt table =====
+
+def topic_table(subject: str, limit: int = None, paper_ids=None) -> str:
+    """
+    Ranked topic table for prediction prompts
+
+    Args:
+        subject: Subject whose stored ranking is used
+        limit: Topics listed (default TABLE_SIZE)
+        paper_ids: Rank only the questions of these papers instead (any subject)
+
+    Returns:
+        One line per topic, most frequent / recent first ("" if nothing was mined)
+    """
+    config = get_config()
+    limit = limit or config['TABLE_SIZE']
+    if paper_ids is None:
+        topics = PastTopic.objects.filter(subject__iexact=subject).only(
+            'text', 'marks', 'occurrences', 'years'
+        )[:limit]
+    else:
+        rows = list(PastQuestion.objects.filter(paper_id__in=paper_ids).values_list('topic_id', 'year', 'marks'))
+        stats = _topic_stats(rows, config)
+        topics = list(PastTopic.objects.filter(id__in=stats.keys()).only('text', 'marks'))
+        for topic in topics:
+            _apply_stats(topic, stats[topic.id])
+        topics = sorted(topics, key=lambda topic: (-topic.score, topic.id))[:limit]
+
+    lines = []
+    for rank, topic in enumerate(topics, 1):
+        marks = f"[{topic.marks} marks] " if topic.marks else ""
+        years = f" ({', '.join(str(year) for year in topic.years)})" if topic.years else ""
+        lines.append(f"{rank}. {marks}{topic.text} - asked {topic.occurrences}x{years}")
+    return '\n'.join(lines)
+
+
+def papers_without_questions(paper_ids) -> set:
+    """Ids among paper_ids that mining could not split into any question"""
+    mined = PastQuestion.objects.filter(paper_id__in=paper_ids).values_list('paper_id', flat=True).distinct()
+    return set(paper_ids) - set(mined)
+
+
+def get_subject_stats(subject: str) -> dict:
+    """Mined papers, questions and topics for a subject"""
+    return {
+        'subject': subject,
+        'papers': PreviousPaper.objects.filter(subject__iexact=subject, mined_at__isnull=False).count(),
+        'questions': PastQuestion.objects.filter(topic__subject__iexact=subject).count(),
+        'topics': PastTopic.objects.filter(subject__iexact=subject).count(),
+    }
@@ -0,0 +1,68 @@
+"""
+PDF export for generated question papers
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+from django.http import FileResponse
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.units import inch
+
+
+def export_question_paper_pdf(paper, questions_by_marks):
+    """
+    Render a question paper as a downloadable PDF
+    
+    Args:
+        paper: QuestionPaper instance
+        questions_by_marks: Dict of {marks: [{'question': ..., 'hint': ...}]}
+    
+    Returns:
+        FileResponse with the PDF attachment
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    
+    # Styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30
+    )
+    hint_style = ParagraphStyle(
+        'Hint',
+        parent=styles['Normal'],
+        textColor='#555555',
+        leftIndent=18
+    )
+    
+    # Build PDF content
+    story = []
+    story.append(Paragraph(escape(paper.title), title_style))
+    story.append(Paragraph(f"<b>Subject:</b> {escape(paper.subject)}", styles['Normal']))
+    story.append(Spacer(1, 0.3 * inch))
+    
+    number = 1
+    for marks in sorted(questions_by_marks, key=lambda m: int(m)):
+        questions = questions_by_marks[marks]
+        story.append(Paragraph(f"Section: {marks}-Mark Questions", styles['Heading2']))
+        story.append(Spacer(1, 0.1 * inch))
+        for q in questions:
+            story.append(Paragraph(f"<b>Q{number}.</b> {escape(q.get('question', ''))} <i>[{marks} marks]</i>", styles['Normal']))
+            if q.get('hint'):
+                story.append(Paragraph(f"Hint: {escape(q['hint'])}", hint_style))
+            story.append(Spacer(1, 0.15 * inch))
+            number += 1
+        story.append(Spacer(1, 0.2 * inch))
+    
+    # Generate PDF
+    doc.build(story)
+    buffer.seek(0)
+    
+    # Return as download
+    response = FileResponse(buffer, as_attachment=True, filename=f'{paper.title}.pdf')
+    response['Content-Type'] = 'application/pdf'
+    return response
@@ -0,0 +1,175 @@
+"""
+Progressive quiz delivery
+The Quiz row is created first and generated in the background: provider
+responses are streamed and every question is appended to QuizQuestion as soon
+as it parses, so the client can poll for new questions and the student can
+start answering after the first one instead of waiting for the whole quiz.
+A quiz whose generator died with its worker or process is marked failed once
+it has been generating for STALE_AFTER seconds.
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import metrics
+from .llm_scheduler import RateLimitExceeded
+from .models import Quiz, QuizQuestion
+from .dedup import NearDuplicateIndex
+from .quiz_utils import load_quiz_source, generate_in_batches, generate_fallback_questions
+
+DEFAULT_CONFIG = {
+    'MAX_WORKERS': 4,    # Quizzes generated concurrently per process
+    'STALE_AFTER': 300,  # Seconds after which a quiz still generating is given up on
+}
+
+
+def get_config() -> dict:
+    """Merge PROGRESSIVE_QUIZ settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'PROGRESSIVE_QUIZ', {}))
+    return config
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()['MAX_WORKERS'],
+                thread_name_prefix='quiz-progressive'
+            )
+        return _executor
+
+
+class QuestionSink:
+    """Appends unique questions to a quiz in arrival order, up to limit (thread-safe)"""
+
+    def __init__(self, quiz_id: int, limit: int):
+        self.quiz_id = quiz_id
+        self.limit = limit
+        self.count = 0
+        self._index = NearDuplicateIndex()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def add(self, question: dict, check_duplicates: bool = True) -> bool:
+        """Save a question; returns False for near-duplicates and anything past the limit"""
+        with self._lock:
+            if self.count >= self.limit:
+                return False
+            if check_duplicates and self._index.is_duplicate(question['question']):
+                return False
+            QuizQuestion.objects.create(
+                quiz_id=self.quiz_id,
+                question=question['question'],
+                options=question['options'],
+                correct_answer=question['correct_answer'],
+                explanation=question.get('explanation', ''),
+                order=self.count
+            )
+            self._index.add(question['question'])
+            self.count += 1
+            if self.count == 1:
+                elapsed = time.monotonic() - self._started
+                metrics.set_gauge('quiz.progressive.first_question_seconds', round(elapsed, 3))
+                print(f"[QUIZ GEN] Quiz {self.quiz_id}: first question ready after {elapsed:.2f}s")
+        return True
+
+
+def start_generation(quiz: Quiz, topic: str, num_questions: int, document_id=None, source_type='prompt'):
+    """Generate questions for an already created quiz in the background"""
+    metrics.incr('quiz.progressive.started')
+    _get_executor().submit(_run, quiz.id, topic, num_questions, document_id, source_type)
+
+
+def _run(quiz_id, topic, num_questions, document_id, source_type):
+    try:
+        generate_into_quiz(quiz_id, topic, num_questions, document_id, source_type)
+    finally:
+        # Pool threads must not hold on to database connections
+        connections.close_all()
+
+
+def generate_into_quiz(quiz_id, topic, num_questions, document_id=None, source_type='prompt'):
+    """
+    Stream generated questions into a quiz and record the outcome on the Quiz row
+
+    Partial quizzes are kept: total_questions is set to the number actually
+    generated. If nothing could be generated the sample fallback questions
+    are used, except when the providers are rate limited - then the quiz is
+    marked failed so the client can tell the student to retry.
+    """
+    # Time spent queued behind other quizzes does not count towards STALE_AFTER
+    if not Quiz.objects.filter(id=quiz_id, generation_status=Quiz.STATUS_GENERATING).update(
+            generation_started_at=timezone.now()):
+        print(f"[WARNING] Quiz {quiz_id}: no longer generating, not started")
+        return 0
+    sink = QuestionSink(quiz_id, num_questions)
+    topic_name = topic
+    status, error = Quiz.STATUS_COMPLETE, ''
+    try:
+        topic_name, source_text = load_quiz_source(topic, document_id, source_type)
+        generate_in_batches(topic_name, source_text, num_questions, 'quiz_progressive', on_question=sink.add)
+    except RateLimitExceeded as e:
+        print(f"[WARNING] Quiz {quiz_id}: rate limited after {sink.count} questions: {e}")
+        if not sink.count:
+            status = Quiz.STATUS_FAILED
+            error = f"The AI models are busy right now. Please try again in {int(e.retry_after) + 1} seconds."
+    except Exception as e:
+        print(f"[ERROR] Quiz {quiz_id}: generation failed after {sink.count} questions: {e}")
+        traceback.print_exc()
+
+    if not sink.count and status != Quiz.STATUS_FAILED:
+        print(f"[ERROR] Quiz {quiz_id}: all models failed - using fallback questions")
+        for question in generate_fallback_questions(topic_name, num_questions):
+            # Placeholders only differ by their number
+            sink.add(question, check_duplicates=False)
+
+    # A quiz fail_if_stale already reported as failed stays failed
+    updated = Quiz.objects.filter(id=quiz_id, generation_status=Quiz.STATUS_GENERATING).update(
+        generation_status=status,
+        generation_error=error,
+        total_questions=sink.count or num_questions
+    )
+    if not updated:
+        print(f"[WARNING] Quiz {quiz_id}: finished with {sink.count} questions after being marked stale")
+        return sink.count
+    metrics.incr(f'quiz.progressive.{status}')
+    return sink.count
+
+
+def fail_if_stale(quiz: Quiz) -> bool:
+    """
+    Mark a quiz failed if it is still generating STALE_AFTER seconds after its generator started
+
+    Questions saved before the generator stopped are kept. Returns True if
+    the quiz was marked failed (the instance is updated to match).
+    """
+    if quiz.generation_status != Quiz.STATUS_GENERATING:
+        return False
+    started = quiz.generation_started_at or quiz.created_at
+    if timezone.now() - started < timedelta(seconds=get_config()['STALE_AFTER']):
+        return False
+
+    count = quiz.questions.count()
+    error = '' if count else 'Quiz generation stopped unexpectedly. Please try again.'
+    # A generator that finishes at the same moment wins
+    updated = Quiz.objects.filter(id=quiz.id, generation_status=Quiz.STATUS_GENERATING).update(
+        generation_status=Quiz.STATUS_FAILED,
+        generation_error=error,
+        total_questions=count or quiz.total_questions
+    )
+    quiz.refresh_from_db(fields=['generation_status', 'generation_error', 'total_questions'])
+    if updated:
+        metrics.incr('quiz.progressive.stale')
+        print(f"[WARNING] Quiz {quiz.id}: generation stale since {started:%H:%M:%S}, marked failed with {count} questions")
+    return bool(updated)
@@ -3,12 +3,42 @@ Question Paper Generation Logic
 Generates important questions and predicts question papers using AI
 """
 import json
-from groq import Groq
-import google.generativeai as genai
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from .utils import extract_text_from_file
+from django.db import connections
+from .utils import extract_text_from_file, call_llm_api
+from .json_repair import salvage_questions_by_marks
+from .llm_scheduler import RateLimitExceeded, PRIORITY_BATCH
+from .single_flight import coalesced
+from .concept_map import condense_for_model, KIND_PAPERS
+from .token_budget import estimate_tokens
+from .model_router import router, TIER_STANDARD
+from .dedup import NearDuplicateIndex
+from .quiz_utils import split_into_slices
+from . import hedging, metrics
 
+# Paper JSON needs at least a standard-tier model; the router picks which one
+GENERATOR_TIER = TIER_STANDARD
+MAX_ATTEMPTS = 2
+# Follow-up calls asking only for questions a partial response is missing
+MAX_FOLLOWUPS = 1
+# Prompts are sized for the smallest input budget among generator-tier models
+BUDGET_MODEL = 'llama-3.3-70b-versatile'
 
+# Papers are generated as parallel parts: one per mark category, with
+# categories of more than PART_SIZE questions split into several parts
+PART_SIZE = 8
+MAX_PARALLEL_PARTS = 8
+# Parts alternate their primary between the best SPREAD_MODELS candidates to share TPM quota
+SPREAD_MODELS = 2
+# Completion budget: ~TOKENS_PER_QUESTION per question plus object framing
+TOKENS_PER_QUESTION = 120
+OUTPUT_OVERHEAD_TOKENS = 200
+MAX_OUTPUT_TOKENS = 3500
+
+
+@coalesced('paper_important')
 def generate_important_questions_ai(content, requirements, subject=""):
     """
     Generate important questions from content based on specified requirements
@@ -23,6 +53,26 @@ def generate_important_questions_ai(content, requirements, subject=""):
     """
     print(f"[QUESTION GEN] Generating questions for requirements: {requirements}")
     
+    # Long sources are condensed section by section so questions span all of them
+    content = condense_for_model(content, BUDGET_MODEL, 'paper_important', max_output_tokens=paper_max_tokens(requirements))
+    
+    questions = generate_paper(
+        lambda text, part: build_important_prompt(text, part, subject),
+        content,
+        "You are an expert question paper generator. You MUST generate EXACTLY the number of questions requested for each mark category. Return ONLY valid JSON, no markdown, no extra text. Follow the requirements PRECISELY.",
+        temperature=0.7,
+        label='paper_important',
+        requirements=requirements
+    )
+    if questions is not None:
+        return questions
+    
+    # Return fallback
+    return generate_fallback_questions(list(requirements.keys()))
+
+
+def build_important_prompt(content, requirements, subject=""):
+    """Prompt asking for exactly the questions in requirements from content"""
     # Build detailed prompt with specific counts
     requirements_text = ", ".join([f"{count} {marks}-mark questions" for marks, count in requirements.items()])
     
@@ -36,11 +86,11 @@ def generate_important_questions_ai(content, requirements, subject=""):
     
     json_example = json.dumps(json_structure, indent=2)
     
-    prompt = f"""Generate exam questions from the following content.
+    return f"""Generate exam questions from the following content.
 
 Subject: {subject or 'General'}
 Content:
-{content[:8000]}
+{content}
 
 STRICT REQUIREMENT - Generate EXACTLY these questions (no more, no less):
 {requirements_text}
@@ -60,84 +110,65 @@ CRITICAL:
 3. Do NOT add extra questions
 4. Do NOT generate questions for mark categories not requested
 """
-    
-    # Try Groq first
-    try:
-        print("[QUESTION GEN] Attempting Groq...")
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert question paper generator. You MUST generate EXACTLY the number of questions requested for each mark category. Return ONLY valid JSON, no markdown, no extra text. Follow the requirements PRECISELY."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=3000
-        )
-        
-        text = response.choices[0].message.content.strip()
-        text = clean_json_response(text)
-        questions = json.loads(text)
-        
-        print(f"[SUCCESS] Generated questions via Groq")
-        return questions
-        
-    except Exception as e:
-        print(f"[WARNING] Groq failed: {e}")
-    
-    # Try Gemini as fallback
-    try:
-        print("[QUESTION GEN] Attempting Gemini...")
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=3000,
-            )
-        )
-        
-        text = response.text.strip()
-        text = clean_json_response(text)
-        questions = json.loads(text)
-        
-        print(f"[SUCCESS] Generated questions via Gemini")
-        return questions
-        
-    except Exception as e:
-        print(f"[ERROR] Gemini failed: {e}")
-    
-    # Return fallback
-    return generate_fallback_questions(list(requirements.keys()))
 
 
-def predict_questions_from_papers(papers_content, subject, requirements):
+@coalesced('paper_predicted')
+def predict_questions_from_papers(papers_content, subject, requirements, ranked_topics=""):
     """
     Analyze previous papers and predict likely questions
     
     Args:
-        papers_content: List of text content from previous papers
+        papers_content: List of text content from previous papers (with ranked_topics: the papers
+            that could not be split into questions)
         subject: Subject name
         requirements: Dict of {marks: count} e.g., {2: 10, 5: 5}
+        ranked_topics: Ranked topic table mined from the chosen papers (see paper_mining)
         
     Returns:
         Dict with predicted questions organized by marks
     """
-    print(f"[PREDICTION] Analyzing {len(papers_content)} previous papers")
     print(f"[PREDICTION] Requirements: {requirements}")
     
-    # Combine all papers
-    combined_content = "\n\n---PAPER SEPARATOR---\n\n".join(papers_content[:5])  # Max 5 papers
+    if ranked_topics:
+        print(f"[PREDICTION] Using ranked topic table ({len(ranked_topics.splitlines())} topics)"
+              f" and {len(papers_content)} unsegmented papers")
+        content = ranked_topics
+        if papers_content:
+            content += "\n\nOther previous papers (not split into questions):\n" + condense_for_model(
+                "\n\n---PAPER SEPARATOR---\n\n".join(papers_content), BUDGET_MODEL, 'paper_predicted',
+                kind=KIND_PAPERS, max_output_tokens=paper_max_tokens(requirements),
+                reserved_tokens=500 + estimate_tokens(ranked_topics, BUDGET_MODEL)
+            )
+        build_prompt = lambda text, part: build_ranked_prediction_prompt(text, part, subject)
+    else:
+        print(f"[PREDICTION] Analyzing {len(papers_content)} previous papers")
+        # Combine all papers
+        combined_content = "\n\n---PAPER SEPARATOR---\n\n".join(papers_content)
+        
+        # Papers over the token budget are reduced to the questions and topics they ask
+        content = condense_for_model(
+            combined_content, BUDGET_MODEL, 'paper_predicted', kind=KIND_PAPERS,
+            max_output_tokens=paper_max_tokens(requirements)
+        )
+        build_prompt = lambda text, part: build_prediction_prompt(text, part, subject)
     
+    questions = generate_paper(
+        build_prompt,
+        content,
+        "You are an expert at analyzing exam patterns and predicting questions. Return ONLY valid JSON.",
+        temperature=0.6,
+        label='paper_predicted',
+        requirements=requirements
+    )
+    if questions is not None:
+        return questions
+    
+    # Return fallback
+    return generate_fallback_questions(list(requirements.keys()))
+
+
+def build_prediction_prompt(combined_content, requirements, subject):
+    """Prompt asking for exactly the predicted questions in requirements"""
     # Build requirements text
     requirements_text = ", ".join([f"{count} {marks}-mark questions" for marks, count in requirements.items()])
     
@@ -151,12 +182,12 @@ def predict_questions_from_papers(papers_content, subject, requirements):
     
     json_example = json.dumps(json_structure, indent=2)
     
-    prompt = f"""Analyze these previous year question papers and predict likely exam questions.
+    return f"""Analyze these previous year question papers and predict likely exam questions.
 
 Subject: {subject}
 
 Previous Papers:
-{combined_content[:10000]}
+{combined_content}
 
 Based on patterns in these papers, predict EXACTLY these questions (no more, no less):
 {requirements_text}
@@ -172,82 +203,324 @@ Return ONLY a JSON object in this exact format:
 
 IMPORTANT: Generate the EXACT number of questions specified for each mark category.
 """
+
+
+def build_ranked_prediction_prompt(topic_table, requirements, subject):
+    """Prompt asking for predicted questions from a ranked table of previously asked topics"""
+    requirements_text = ", ".join([f"{count} {marks}-mark questions" for marks, count in requirements.items()])
+    
+    json_structure = {}
+    for marks, count in requirements.items():
+        json_structure[str(marks)] = [
+            {"question": "Predicted question", "reasoning": "Why this is likely"}
+            for _ in range(min(count, 2))  # Show 2 examples
+        ]
+    
+    json_example = json.dumps(json_structure, indent=2)
+    
+    return f"""Predict likely exam questions from the topics asked in previous year question papers.
+
+Subject: {subject}
+
+Previously asked topics, ranked by how often and how recently they were asked
+(rank. [usual marks] representative question - times asked (years)):
+{topic_table}
+
+Predict EXACTLY these questions (no more, no less):
+{requirements_text}
+
+Consider:
+1. Higher ranked topics are more likely to appear again
+2. Keep each topic's usual marks where it fits the requested categories
+3. Topics not asked in the latest years may be due
+4. Phrase each prediction as a complete exam question
+
+Return ONLY a JSON object in this exact format:
+{json_example}
+
+IMPORTANT: Generate the EXACT number of questions specified for each mark category.
+"""
+
+
+def split_requirements(requirements):
+    """
+    Split paper requirements into parts generated by separate calls
+    
+    Every mark category is its own part; categories of more than PART_SIZE
+    questions are split into evenly sized parts.
     
-    # Try Groq first
+    Returns:
+        List of (requirements dict, slice index, slice count) tuples
+    """
+    parts = []
+    for marks, count in requirements.items():
+        count = int(count)
+        if count <= 0:
+            continue
+        chunks = -(-count // PART_SIZE)
+        for i in range(chunks):
+            size = count // chunks + (1 if i < count % chunks else 0)
+            parts.append(({str(marks): size}, i, chunks))
+    return parts
+
+
+def paper_max_tokens(requirements):
+    """Completion budget for a paper part (smaller budgets admit sooner under TPM limits)"""
+    total = sum(int(count) for count in requirements.values())
+    return min(MAX_OUTPUT_TOKENS, OUTPUT_OVERHEAD_TOKENS + total * TOKENS_PER_QUESTION)
+
+
+_part_executor = None
+_part_executor_lock = threading.Lock()
+
+
+def _get_part_executor():
+    global _part_executor
+    with _part_executor_lock:
+        if _part_executor is None:
+            _part_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_PARTS, thread_name_prefix='paper-part')
+        return _part_executor
+
+
+def _run_part(prompt, system_prompt, temperature, label, requirements, index):
     try:
-        print("[PREDICTION] Attempting Groq...")
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert at analyzing exam patterns and predicting questions. Return ONLY valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.6,
-            max_tokens=3500
+        return generate_json_with_fallback(
+            prompt, system_prompt, temperature, paper_max_tokens(requirements), label, requirements, spread=index
         )
-        
-        text = response.choices[0].message.content.strip()
-        text = clean_json_response(text)
-        questions = json.loads(text)
-        
-        print(f"[SUCCESS] Predicted questions via Groq")
-        return questions
-        
-    except Exception as e:
-        print(f"[WARNING] Groq failed: {e}")
+    finally:
+        # Pool threads must not hold on to database connections
+        connections.close_all()
+
+
+def generate_paper(build_prompt, content, system_prompt, temperature, label, requirements):
+    """
+    Generate a question paper as concurrent per-category parts
     
-    # Try Gemini as fallback
-    try:
-        print("[PREDICTION] Attempting Gemini...")
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.6,
-                max_output_tokens=3500,
-            )
+    One completion for every category is slow (output tokens are generated
+    serially) and gets truncated on big papers. Each mark category - or each
+    PART_SIZE chunk of a large category, with its own slice of the content -
+    is requested separately and in parallel, validated against its exact
+    count and topped up on its own. Categories still short after merging
+    (failed parts, cross-part duplicates) get one final request for only the
+    missing questions.
+    
+    Args:
+        build_prompt: Callable(content, requirements) returning the prompt for a part
+        content: Source text, already fitted to the token budget
+        system_prompt: System prompt for every call
+        temperature: Sampling temperature
+        label: Caller label for logs
+        requirements: Dict of {marks: count} the paper must contain
+    
+    Returns:
+        Dict of {marks (str): [questions]}, or None if every part failed
+    
+    Raises:
+        RateLimitExceeded: if every part was rate limited
+    """
+    parts = split_requirements(requirements)
+    if len(parts) <= 1:
+        return generate_json_with_fallback(
+            build_prompt(content, requirements), system_prompt, temperature,
+            paper_max_tokens(requirements), label, requirements
         )
-        
-        text = response.text.strip()
-        text = clean_json_response(text)
-        questions = json.loads(text)
-        
-        print(f"[SUCCESS] Predicted questions via Gemini")
+    
+    print(f"[QUESTION GEN] Fanning out {sum(int(c) for c in requirements.values())} questions as {len(parts)} parallel parts")
+    metrics.incr('paper.parts', len(parts))
+    executor = _get_part_executor()
+    futures = []
+    for i, (part, slice_index, slices) in enumerate(parts):
+        text = split_into_slices(content, slices)[slice_index] if slices > 1 else content
+        marks = next(iter(part))
+        part_label = f"{label} {marks}-mark" + (f" {slice_index + 1}/{slices}" if slices > 1 else "")
+        futures.append(executor.submit(
+            _run_part, build_prompt(text, part), system_prompt, temperature, part_label, part, i
+        ))
+    
+    questions = {}
+    shed = []
+    # Parts never see each other's questions, so repeats are dropped here
+    index = NearDuplicateIndex()
+    for future in futures:
+        try:
+            result = future.result()
+        except RateLimitExceeded as e:
+            shed.append(e)
+            continue
+        for marks, items in (result or {}).items():
+            questions.setdefault(marks, []).extend(q for q in items if index.add_if_new(q['question']))
+    
+    if shed and len(shed) == len(futures):
+        raise min(shed, key=lambda error: error.retry_after)
+    if not questions:
+        return None
+    
+    missing = missing_counts(questions, requirements)
+    if missing:
+        missing_text = ", ".join([f"{count} {marks}-mark questions" for marks, count in missing.items()])
+        print(f"[QUESTION GEN] {label}: requesting only the missing {missing_text} after merging parts")
+        metrics.incr('paper.followups')
+        already = {marks: [q['question'] for q in items] for marks, items in questions.items()}
+        prompt = f"""{build_prompt(content, missing)}
+These questions were already written - do NOT repeat them:
+{json.dumps(already, indent=2)}"""
+        try:
+            extra = generate_json_with_fallback(
+                prompt, system_prompt, temperature, paper_max_tokens(missing), label, missing
+            ) or {}
+        except RateLimitExceeded as e:
+            # Keep the partial paper rather than failing the whole request
+            print(f"[WARNING] {label}: final top-up rate limited: {e}")
+            extra = {}
+        for marks, items in extra.items():
+            questions.setdefault(marks, []).extend(q for q in items if index.add_if_new(q['question']))
+    
+    return {
+        str(marks): questions[str(marks)][:int(count)]
+        for marks, count in requirements.items()
+        if questions.get(str(marks))
+    }
+
+
+def generate_json_with_fallback(prompt, system_prompt, temperature, max_tokens, label, requirements, spread=0):
+    """
+    Try the routed generator models in order until one returns marks-keyed questions
+    
+    Every complete question is salvaged from truncated or malformed responses;
+    categories left short are topped up by asking the same model for only
+    the missing questions.
+    
+    Args:
+        requirements: Dict of {marks: count} the paper must contain
+        spread: Part index; parts rotate their primary among the best SPREAD_MODELS
+    
+    Returns:
+        Dict of {marks (str): [questions]}, or None if every model failed
+    
+    Raises:
+        RateLimitExceeded: if every model was rate limited
+    """
+    models = router.candidates(GENERATOR_TIER, reason=label)
+    if spread and len(models) > 1:
+        shift = spread % min(SPREAD_MODELS, len(models))
+        models = models[shift:SPREAD_MODELS] + models[:shift] + models[SPREAD_MODELS:]
+    models = models[:MAX_ATTEMPTS]
+    
+    def generate(model_id, user_prompt=prompt):
+        text = call_llm_api(
+            model_id,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            cache_policy='paper',
+            priority=PRIORITY_BATCH
+        )
+        questions = salvage_questions_by_marks(text)
+        if not questions:
+            raise ValueError("Response contains no marks-keyed questions")
         return questions
-        
-    except Exception as e:
-        print(f"[ERROR] Gemini failed: {e}")
     
-    # Return fallback
-    return generate_fallback_questions(mark_types)
+    if hedging.is_enabled() and len(models) > 1:
+        # Race the next model against a slow primary instead of waiting it out
+        try:
+            questions, model_id = hedging.hedged_call(generate, models, label)
+            print(f"[SUCCESS] Generated questions via {model_id}")
+            return top_up_questions(generate, prompt, questions, requirements, model_id, label)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"[ERROR] All models failed: {type(e).__name__}: {str(e)}")
+            return None
+    
+    shed = []
+    for model_id in models:
+        try:
+            print(f"[QUESTION GEN] Attempting {model_id}...")
+            questions = generate(model_id)
+            print(f"[SUCCESS] Generated questions via {model_id}")
+            return top_up_questions(generate, prompt, questions, requirements, model_id, label)
+        except RateLimitExceeded as e:
+            shed.append(e)
+            print(f"[WARNING] {model_id} rate limited: {e}")
+        except Exception as e:
+            print(f"[WARNING] {model_id} failed: {e}")
+    
+    if shed and len(shed) == len(models):
+        # Every model is saturated - let the view answer 429 instead of serving placeholders
+        raise min(shed, key=lambda error: error.retry_after)
+    return None
 
 
-def clean_json_response(text):
-    """Clean JSON response from AI models"""
-    # Remove markdown code blocks
-    if '```json' in text:
-        text = text.split('```json')[1]
-    if '```' in text:
-        text = text.split('```')[0]
+def missing_counts(questions, requirements):
+    """Dict of {marks (str): count} still missing from questions"""
+    missing = {}
+    for marks, count in requirements.items():
+        short = int(count) - len(questions.get(str(marks), []))
+        if short > 0:
+            missing[str(marks)] = short
+    return missing
+
+
+def top_up_questions(generate, prompt, questions, requirements, model_id, label):
+    """
+    Request only the questions missing from a partial paper
     
-    # Find JSON object
-    start = text.find('{')
-    end = text.rfind('}') + 1
+    Args:
+        generate: Callable(model_id, user_prompt) returning marks-keyed questions
+        prompt: The original generation prompt
+        questions: Marks-keyed questions salvaged so far
+        requirements: Dict of {marks: count}
+        model_id: Model that produced the partial response
+        label: Caller label for logs
+        
+    Returns:
+        Dict of {marks (str): [questions]} trimmed to the requested categories and counts
+    """
+    # Near-duplicates count as missing, across mark categories as well as within them
+    index = NearDuplicateIndex()
+    questions = {
+        marks: [q for q in items if index.add_if_new(q['question'])]
+        for marks, items in questions.items()
+    }
     
-    if start != -1 and end > start:
-        text = text[start:end]
+    for _ in range(MAX_FOLLOWUPS):
+        missing = missing_counts(questions, requirements)
+        if not missing:
+            break
+        
+        missing_text = ", ".join([f"{count} {marks}-mark questions" for marks, count in missing.items()])
+        print(f"[QUESTION GEN] {label}: requesting only the missing {missing_text} from {model_id}")
+        metrics.incr('paper.followups')
+        already = {marks: [q['question'] for q in items] for marks, items in questions.items()}
+        followup = f"""{prompt}
+
+These questions were already written - do NOT repeat them:
+{json.dumps(already, indent=2)}
+
+Now generate ONLY these additional questions: {missing_text}
+Return ONLY a JSON object keyed by marks in the same format."""
+        try:
+            extra = generate(model_id, followup)
+        except Exception as e:
+            # Keep the partial paper rather than failing the whole request
+            print(f"[WARNING] {label}: follow-up on {model_id} failed: {type(e).__name__}: {e}")
+            break
+        
+        for marks, items in extra.items():
+            if marks not in missing:
+                continue
+            for q in items:
+                if index.add_if_new(q['question']):
+                    questions.setdefault(marks, []).append(q)
     
-    return text.strip()
+    return {
+        str(marks): questions[str(marks)][:int(count)]
+        for marks, count in requirements.items()
+        if questions.get(str(marks))
+    }
 
 
 def generate_fallback_questions(marks_list):
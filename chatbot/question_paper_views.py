@@ -5,10 +5,13 @@ from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.db import transaction
 from .models import QuestionPaper, GeneratedQuestion, PreviousPaper, Document
 from .question_generator import generate_important_questions_ai, predict_questions_from_papers
 from .pdf_export import export_question_paper_pdf
-from .utils import extract_text_from_file
+from .utils import extract_text_from_file, chunk_text, create_vector_store
+from .llm_scheduler import RateLimitExceeded, rate_limited_response
+from . import paper_mining
 import json
 
 
@@ -20,10 +23,62 @@ def question_paper_home(request):
     })
 
 
+def _id_list(request, *names):
+    """
+    Integer ids posted as repeated fields or comma-separated values
+
+    Raises:
+        ValueError: If a value is not an integer
+    """
+    ids = []
+    for name in names:
+        for value in request.POST.getlist(name):
+            ids.extend(int(part) for part in value.split(',') if part.strip())
+    return list(dict.fromkeys(ids))
+
+
+def _save_paper(questions_by_marks, hint_key, **paper_fields):
+    """Create a question paper and all its questions in one transaction"""
+    with transaction.atomic():
+        paper = QuestionPaper.objects.create(**paper_fields)
+        GeneratedQuestion.objects.bulk_create([
+            GeneratedQuestion(
+                paper=paper,
+                question_text=q['question'],
+                marks=int(marks),
+                answer_hint=q.get(hint_key, ''),
+                order=idx
+            )
+            for marks, questions in questions_by_marks.items()
+            for idx, q in enumerate(questions)
+        ])
+    return paper
+
+
+def _ingest_document(file):
+    """Save, extract and index an uploaded document so later papers can reuse it by id"""
+    doc = Document.objects.create(
+        title=file.name,
+        file=file,
+        file_type=file.name.split('.')[-1].lower()
+    )
+    doc.text_content = extract_text_from_file(doc.file.path, doc.file_type)
+    doc.save(update_fields=['text_content'])
+    create_vector_store(doc.id, chunk_text(doc.text_content))
+    return doc
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def generate_important_questions(request):
-    """Generate important questions from topic or document"""
+    """
+    Generate important questions from topic or document
+
+    Document sources are either a new upload ('document') or documents that
+    were uploaded before ('document_id', one or more): their stored text is
+    reused, optionally narrowed to outline sections ('heading_ids'), so no
+    file is extracted again.
+    """
     try:
         print("[VIEW] Generating important questions...")
         
@@ -58,29 +113,46 @@ def generate_important_questions(request):
             content = topic
             title = f"Important Questions - {topic[:50]}"
         else:  # document
+            try:
+                document_ids = _id_list(request, 'document_id', 'document_ids')
+            except ValueError:
+                return JsonResponse({'status': 'error', 'message': 'Invalid document id'}, status=400)
             file = request.FILES.get('document')
-            if not file:
-                return JsonResponse({'status': 'error', 'message': 'No document uploaded'}, status=400)
-            
-            # Save document
-            doc = Document.objects.create(
-                title=file.name,
-                file=file,
-                file_type=file.name.split('.')[-1].lower()
-            )
-            
-            # Extract text
-            content = extract_text_from_file(doc.file.path, doc.file_type)
-            doc.text_content = content
-            doc.save()
             
-            title = f"Important Questions - {file.name}"
+            if document_ids:
+                # Reuse stored text - no upload, no extraction
+                docs = {doc.id: doc for doc in Document.objects.filter(id__in=document_ids).only('id', 'title', 'text_content')}
+                missing = [doc_id for doc_id in document_ids if doc_id not in docs]
+                if missing:
+                    return JsonResponse({'status': 'error', 'message': f'Unknown document ids: {missing}'}, status=404)
+                docs = [docs[doc_id] for doc_id in document_ids]
+                heading_ids = request.POST.getlist('heading_ids')
+                if heading_ids and len(docs) == 1:
+                    from .rag_service import get_heading_content
+                    content = get_heading_content(docs[0].id, heading_ids)
+                else:
+                    content = '\n\n'.join(
+                        f"# {doc.title}\n{doc.text_content}" if len(docs) > 1 else doc.text_content
+                        for doc in docs
+                    )
+                if not content.strip():
+                    return JsonResponse({'status': 'error', 'message': 'Selected documents have no text'}, status=400)
+                doc = docs[0]
+                title = f"Important Questions - {', '.join(d.title for d in docs)}"[:255]
+                print(f"[VIEW] Reusing stored text of documents {document_ids} ({len(content)} chars)")
+            elif file:
+                doc = _ingest_document(file)
+                content = doc.text_content
+                title = f"Important Questions - {file.name}"
+            else:
+                return JsonResponse({'status': 'error', 'message': 'No document uploaded'}, status=400)
         
         # Generate questions using AI with specific counts
         questions_by_marks = generate_important_questions_ai(content, requirements, subject)
         
         # Save to database
-        paper = QuestionPaper.objects.create(
+        paper = _save_paper(
+            questions_by_marks, 'hint',
             title=title,
             subject=subject,
             paper_type='important',
@@ -88,25 +160,18 @@ def generate_important_questions(request):
             source_document=doc if source_type == 'document' else None
         )
         
-        # Save questions
-        for marks, questions in questions_by_marks.items():
-            for idx, q in enumerate(questions):
-                GeneratedQuestion.objects.create(
-                    paper=paper,
-                    question_text=q['question'],
-                    marks=int(marks),
-                    answer_hint=q.get('hint', ''),
-                    order=idx
-                )
-        
         print(f"[SUCCESS] Generated paper ID: {paper.id}")
         
         return JsonResponse({
             'status': 'success',
             'paper_id': paper.id,
+            'document_id': doc.id if source_type == 'document' else None,
             'questions': questions_by_marks
         })
         
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
     except Exception as e:
         import traceback
         print(f"[ERROR] {e}")
@@ -117,7 +182,12 @@ def generate_important_questions(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def predict_questions(request):
-    """Predict questions from previous papers"""
+    """
+    Predict questions from previous papers
+
+    Papers come from new uploads ('previous_papers') and/or earlier uploads
+    ('previous_paper_id', one or more), which are already extracted and mined.
+    """
     try:
         print("[VIEW] Predicting questions from previous papers...")
         
@@ -139,15 +209,26 @@ def predict_questions(request):
         
         marks_list = list(requirements.keys())
         
-        # Get uploaded files
+        # Previously uploaded papers are reused by id; new uploads are extracted once
+        try:
+            paper_ids = _id_list(request, 'previous_paper_id', 'previous_paper_ids')
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid previous paper id'}, status=400)
         files = request.FILES.getlist('previous_papers')
-        if not files:
+        if not files and not paper_ids:
             return JsonResponse({'status': 'error', 'message': 'No files uploaded'}, status=400)
         
-        print(f"[VIEW] Processing {len(files)} previous papers...")
+        stored = list(PreviousPaper.objects.filter(id__in=paper_ids).only('id', 'subject', 'text_content', 'mined_at'))
+        missing = sorted(set(paper_ids) - {prev_paper.id for prev_paper in stored})
+        if missing:
+            return JsonResponse({'status': 'error', 'message': f'Unknown previous paper ids: {missing}'}, status=404)
+        if stored and not request.POST.get('subject'):
+            subject = stored[0].subject
+        
+        print(f"[VIEW] Processing {len(files)} uploaded and {len(stored)} stored previous papers...")
         
         # Save and extract text from papers
-        papers_content = []
+        texts = {prev_paper.id: prev_paper.text_content for prev_paper in stored}
         for file in files:
             prev_paper = PreviousPaper.objects.create(
                 subject=subject,
@@ -158,39 +239,42 @@ def predict_questions(request):
             file_type = file.name.split('.')[-1].lower()
             text = extract_text_from_file(prev_paper.file.path, file_type)
             prev_paper.text_content = text
-            prev_paper.save()
+            prev_paper.save(update_fields=['text_content'])
             
-            papers_content.append(text)
+            texts[prev_paper.id] = text
+            paper_ids.append(prev_paper.id)
+        
+        # Mine the new papers (earlier uploads are already mined) and rank only the chosen papers' questions
+        for paper_subject in {subject, *(prev_paper.subject for prev_paper in stored)}:
+            paper_mining.mine_subject(paper_subject)
+        ranked_topics = paper_mining.topic_table(subject, paper_ids=paper_ids)
+        # Papers that could not be split into questions are sent as text instead
+        unsegmented = paper_mining.papers_without_questions(paper_ids)
+        papers_content = [text for paper_id, text in texts.items() if paper_id in unsegmented and text]
         
         # Predict questions using AI with exact requirements
-        questions_by_marks = predict_questions_from_papers(papers_content, subject, requirements)
+        questions_by_marks = predict_questions_from_papers(papers_content, subject, requirements, ranked_topics)
         
         # Save to database
-        paper = QuestionPaper.objects.create(
+        paper = _save_paper(
+            questions_by_marks, 'reasoning',
             title=f"Predicted Paper - {subject}",
             subject=subject,
             paper_type='predicted'
         )
         
-        # Save questions
-        for marks, questions in questions_by_marks.items():
-            for idx, q in enumerate(questions):
-                GeneratedQuestion.objects.create(
-                    paper=paper,
-                    question_text=q['question'],
-                    marks=int(marks),
-                    answer_hint=q.get('reasoning', ''),
-                    order=idx
-                )
-        
         print(f"[SUCCESS] Predicted paper ID: {paper.id}")
         
         return JsonResponse({
             'status': 'success',
             'paper_id': paper.id,
+            'previous_paper_ids': paper_ids,
             'questions': questions_by_marks
         })
         
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
     except Exception as e:
         import traceback
         print(f"[ERROR] {e}")
@@ -198,6 +282,29 @@ def predict_questions(request):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
+@require_http_methods(["GET"])
+def list_previous_papers(request):
+    """Previously uploaded papers (optionally of one subject) that predictions can reuse by id"""
+    from django.db.models import Count
+    papers = PreviousPaper.objects.annotate(questions=Count('mined_questions'))
+    subject = request.GET.get('subject', '').strip()
+    if subject:
+        papers = papers.filter(subject__iexact=subject)
+    return JsonResponse({
+        'papers': [
+            {
+                'id': paper.id,
+                'subject': paper.subject,
+                'year': paper.year,
+                'file_name': paper.file.name.rsplit('/', 1)[-1] if paper.file else '',
+                'questions': paper.questions,
+                'uploaded_at': paper.uploaded_at.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for paper in papers.only('id', 'subject', 'year', 'file', 'uploaded_at')
+        ]
+    })
+
+
 def export_pdf(request, paper_id):
     """Export question paper as PDF"""
     try:
@@ -0,0 +1,343 @@
+"""
+Pre-generated question pools per document and heading section
+Documents never change after upload, so quiz questions are generated once in
+the background (after ingestion or on demand), validated and stored as
+PooledQuestion rows. Document quizzes are then served by sampling the least
+served questions from the pool - a database read instead of an LLM call - and
+a pool that runs low is topped up asynchronously.
+"""
+import random
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+from . import metrics
+from .models import Document, PooledQuestion
+from .dedup import NearDuplicateIndex
+from .quiz_utils import generate_in_batches, document_quiz_text
+
+DOCUMENT_SECTION = ''
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'BUILD_ON_UPLOAD': True,
+    'DOCUMENT_TARGET': 30,       # Questions pooled for whole-document quizzes
+    'SECTION_TARGET': 10,        # Questions pooled per heading section
+    'MAX_SECTIONS': 12,          # Largest sections pooled per document
+    'MIN_SECTION_WORDS': 80,     # Shorter sections are not worth their own pool
+    'MAX_SERVES': 3,             # A question served this often no longer counts as fresh
+    'LOW_WATERMARK': 10,         # Top up when fewer fresh questions than this remain
+    'TOP_UP': 10,                # Questions added per top-up
+    'MAX_POOL_SIZE': 100,        # Per document / section
+    'MAX_AVOID': 30,             # Existing questions listed in top-up prompts
+    'MAX_WORKERS': 2,
+}
+
+
+def get_config() -> dict:
+    """Merge QUESTION_POOL settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'QUESTION_POOL', {}))
+    return config
+
+
+def is_enabled() -> bool:
+    return get_config()['ENABLED']
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# (document_id, section) pairs with a build or top-up in flight
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()['MAX_WORKERS'],
+                thread_name_prefix='question-pool'
+            )
+        return _executor
+
+
+def _submit(key, fn, *args):
+    """Run fn in the background unless a job for key is already running"""
+    with _in_flight_lock:
+        if key in _in_flight:
+            return False
+        _in_flight.add(key)
+
+    def run():
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"[QUESTION POOL] Job {key} failed: {type(e).__name__}: {e}")
+            traceback.print_exc()
+        finally:
+            with _in_flight_lock:
+                _in_flight.discard(key)
+            # Pool threads must not hold on to database connections
+            connections.close_all()
+
+    _get_executor().submit(run)
+    return True
+
+
+# ===== Validation =====
+
+def validate_question(question):
+    """
+    Check a generated MCQ and normalise its correct answer
+
+    A pooled question needs text, exactly four distinct options and a correct
+    answer that matches one of them (exactly or by its "A)" letter prefix).
+
+    Returns:
+        Cleaned question dict, or None if it is not usable
+    """
+    text = str(question.get('question') or '').strip()
+    options = question.get('options')
+    answer = str(question.get('correct_answer') or '').strip()
+    if not text or not isinstance(options, list) or len(options) != 4:
+        return None
+    options = [str(option).strip() for option in options]
+    if len(set(option.lower() for option in options)) != 4 or not answer:
+        return None
+
+    matches = [option for option in options if option == answer]
+    if not matches:
+        letter = answer[0].upper()
+        matches = [option for option in options if option[:1].upper() == letter and option[1:2] in (')', '.', ':')]
+    if len(matches) != 1:
+        return None
+
+    return {
+        'question': text,
+        'options': options,
+        'correct_answer': matches[0],
+        'explanation': str(question.get('explanation') or '').strip(),
+    }
+
+
+# ===== Building =====
+
+def pool_sections(document, config=None):
+    """Heading sections that get their own pool, largest first"""
+    from .rag_service import extract_document_headings
+    config = config or get_config()
+    headings = [h for h in extract_document_headings(document.id) if h['word_count'] >= config['MIN_SECTION_WORDS']]
+    headings.sort(key=lambda h: h['word_count'], reverse=True)
+    return headings[:config['MAX_SECTIONS']]
+
+
+def add_questions(document_id, section, section_title, topic_name, source_text, count, label):
+    """
+    Generate count questions and add the valid, new ones to a pool
+
+    Returns:
+        Number of questions added
+    """
+    config = get_config()
+    existing = list(
+        PooledQuestion.objects.filter(document_id=document_id, section=section).values_list('question', flat=True)
+    )
+    room = config['MAX_POOL_SIZE'] - len(existing)
+    if room <= 0:
+        return 0
+
+    avoid = existing[-config['MAX_AVOID']:]
+    generated = generate_in_batches(topic_name, source_text, min(count, room), label, avoid=avoid or None)
+
+    # Top-ups must not reword questions the pool already holds
+    index = NearDuplicateIndex()
+    for text in existing:
+        index.add(text)
+    rows = []
+    for question in generated:
+        cleaned = validate_question(question)
+        if cleaned is None:
+            metrics.incr('question_pool.rejected')
+            continue
+        if not index.add_if_new(cleaned['question']):
+            metrics.incr('question_pool.duplicates')
+            continue
+        rows.append(PooledQuestion(document_id=document_id, section=section, section_title=section_title, **cleaned))
+
+    PooledQuestion.objects.bulk_create(rows[:room])
+    metrics.incr('question_pool.added', len(rows[:room]))
+    print(f"[QUESTION POOL] Document {document_id} section '{section or 'document'}': "
+          f"added {len(rows[:room])} of {len(generated)} generated questions")
+    return len(rows[:room])
+
+
+def build_pool(document_id, sections=None):
+    """
+    Fill the document pool and its section pools up to their targets
+
+    Args:
+        document_id: Document to build pools for
+        sections: Optional heading ids to limit the build to (None = document pool plus largest sections)
+    """
+    config = get_config()
+    document = Document.objects.get(id=document_id)
+    if not document.text_content or len(document.text_content.strip()) < 50:
+        print(f"[QUESTION POOL] Document {document_id} has no usable content - skipping")
+        return
+
+    if sections is None:
+        short = config['DOCUMENT_TARGET'] - pool_size(document_id)
+        if short > 0:
+            add_questions(document_id, DOCUMENT_SECTION, '', document.title, document_quiz_text(document), short, 'pool')
+        headings = pool_sections(document, config)
+    else:
+        from .rag_service import extract_document_headings
+        headings = [h for h in extract_document_headings(document_id) if h['id'] in sections]
+
+    text = document.text_content
+    for heading in headings:
+        short = config['SECTION_TARGET'] - pool_size(document_id, heading['id'])
+        if short <= 0:
+            continue
+        section_text = f"## {heading['text']}\n{text[heading['start_pos']:heading['end_pos']]}"
+        add_questions(
+            document_id, heading['id'], heading['text'][:255],
+            f"{document.title} - {heading['text']}", section_text, short, 'pool_section'
+        )
+
+
+def schedule_build(document_id, sections=None):
+    """Build pools for a document in the background"""
+    if not is_enabled():
+        return False
+    key = (document_id, tuple(sections) if sections else None)
+    return _submit(key, build_pool, document_id, sections)
+
+
+def _top_up(document_id, section):
+    config = get_config()
+    document = Document.objects.get(id=document_id)
+    if section == DOCUMENT_SECTION:
+        add_questions(document_id, section, '', document.title, document_quiz_text(document), config['TOP_UP'], 'pool_top_up')
+        return
+    from .rag_service import extract_document_headings
+    for heading in extract_document_headings(document_id):
+        if heading['id'] == section:
+            section_text = f"## {heading['text']}\n{document.text_content[heading['start_pos']:heading['end_pos']]}"
+            add_questions(
+                document_id, section, heading['text'][:255],
+                f"{document.title} - {heading['text']}", section_text, config['TOP_UP'], 'pool_top_up'
+            )
+            return
+
+
+def schedule_top_up(document_id, section=DOCUMENT_SECTION):
+    """Add TOP_UP questions to a pool in the background"""
+    if not is_enabled():
+        return False
+    metrics.incr('question_pool.top_ups')
+    return _submit((document_id, section, 'top_up'), _top_up, document_id, section)
+
+
+# ===== Serving =====
+
+def pool_size(document_id, section=DOCUMENT_SECTION) -> int:
+    return PooledQuestion.objects.filter(document_id=document_id, section=section).count()
+
+
+def sample_questions(document_id, num_questions, sections=None):
+    """
+    Draw a quiz from the pool without calling an LLM
+
+    The least served questions are preferred (random among equals) and are
+    spread evenly across the requested sections. Pools left with few fresh
+    questions are topped up in the background.
+
+    Args:
+        document_id: Document the quiz is about
+        num_questions: Number of questions wanted
+        sections: Heading ids to draw from (None = whole-document pool)
+
+    Returns:
+        List of question dicts, or None if the pool cannot cover the request
+    """
+    if not is_enabled():
+        return None
+    config = get_config()
+    sections = list(sections) if sections else [DOCUMENT_SECTION]
+
+    by_section = {}
+    for row in PooledQuestion.objects.filter(document_id=document_id, section__in=sections).only(
+        'id', 'section', 'question', 'options', 'correct_answer', 'explanation', 'times_served'
+    ):
+        by_section.setdefault(row.section, []).append(row)
+
+    missing = [section for section in sections if section not in by_section]
+    if missing or sum(len(rows) for rows in by_section.values()) < num_questions:
+        metrics.incr('question_pool.misses')
+        if missing:
+            schedule_build(document_id, None if missing == [DOCUMENT_SECTION] else [s for s in missing if s])
+        else:
+            for section in sections:
+                schedule_top_up(document_id, section)
+        return None
+
+    # Least served first, shuffled within each serve count
+    for rows in by_section.values():
+        random.shuffle(rows)
+        rows.sort(key=lambda row: row.times_served)
+
+    picked = []
+    queues = [list(by_section[section]) for section in sections]
+    while len(picked) < num_questions:
+        for queue in queues:
+            if queue and len(picked) < num_questions:
+                picked.append(queue.pop(0))
+
+    PooledQuestion.objects.filter(id__in=[row.id for row in picked]).update(times_served=F('times_served') + 1)
+    metrics.incr('question_pool.hits')
+
+    for section, rows in by_section.items():
+        served = {row.id for row in picked}
+        fresh = sum(1 for row in rows if row.times_served + (row.id in served) < config['MAX_SERVES'])
+        if fresh < config['LOW_WATERMARK'] and len(rows) < config['MAX_POOL_SIZE']:
+            schedule_top_up(document_id, section)
+
+    random.shuffle(picked)
+    return [
+        {
+            'question': row.question,
+            'options': row.options,
+            'correct_answer': row.correct_answer,
+            'explanation': row.explanation,
+        }
+        for row in picked
+    ]
+
+
+def get_pool_stats(document_id) -> dict:
+    """Pool sizes per section for a document"""
+    from django.db.models import Count, Sum
+    sections = PooledQuestion.objects.filter(document_id=document_id).values('section', 'section_title').annotate(
+        questions=Count('id'), served=Sum('times_served')
+    ).order_by('section')
+    with _in_flight_lock:
+        building = any(key[0] == document_id for key in _in_flight)
+    return {
+        'document_id': document_id,
+        'building': building,
+        'sections': [
+            {
+                'section': row['section'] or 'document',
+                'title': row['section_title'],
+                'questions': row['questions'],
+                'times_served': row['served'] or 0,
+            }
+            for row in sections
+        ],
+    }
@@ -1,15 +1,55 @@
 """
-Quiz generation utilities using AI (Groq primary, Gemini fallback)
+Quiz generation utilities using AI (routed across Groq and Gemini models)
 """
 import json
-import google.generativeai as genai
-from groq import Groq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import connections
 from .models import Quiz, QuizQuestion, LearningItem, Document
-from .utils import retrieve_relevant_chunks
+from .utils import retrieve_relevant_chunks, call_llm_api, stream_llm_api
+from .json_repair import IncrementalJSONParser, is_valid_quiz_question, salvage_quiz_questions
+from .llm_scheduler import RateLimitExceeded, PRIORITY_BATCH
+from .single_flight import coalesced
+from .token_budget import estimate_tokens, truncate_to_tokens, TokenBudget
+from .model_router import router, TIER_STANDARD
+from .concept_map import condense, condense_for_model
+from .context_selector import representative_context
+from .dedup import NearDuplicateIndex, dedupe
+from . import hedging, metrics
 
+# Quiz JSON needs at least a standard-tier model; the router picks which one
+GENERATOR_TIER = TIER_STANDARD
+MAX_ATTEMPTS = 2
+# Follow-up calls asking only for questions a partial response is missing
+MAX_FOLLOWUPS = 1
+# Prompts are sized for the smallest input budget among generator-tier models
+BUDGET_MODEL = 'llama-3.3-70b-versatile'
+
+# Large quizzes are generated as parallel batches of BATCH_SIZE questions
+BATCH_SIZE = 5
+MAX_PARALLEL_BATCHES = 6
+# Batches alternate their primary between the best SPREAD_MODELS candidates to share TPM quota
+SPREAD_MODELS = 2
+MIN_SLICE_TOKENS = 1200
+PROMPT_RESERVED_TOKENS = 500
+# Completion budget: ~TOKENS_PER_QUESTION per question plus array framing
+TOKENS_PER_QUESTION = 250
+OUTPUT_OVERHEAD_TOKENS = 250
+MAX_OUTPUT_TOKENS = 3000
+# Topic-only quizzes give each batch a different angle on the topic
+FOCUS_AREAS = [
+    "core definitions and terminology",
+    "how it works - mechanisms and processes",
+    "applications and real-world examples",
+    "comparisons, advantages and trade-offs",
+    "common misconceptions and pitfalls",
+    "problem solving and analysis",
+]
+
+@coalesced('quiz')
 def generate_quiz_questions(topic, num_questions=10, document_id=None, source_type='prompt'):
-    """Generate quiz questions using Groq (primary) with Gemini fallback"""
+    """Generate quiz questions with the routed generator models"""
     
     print(f"\n{'='*60}")
     print(f"[QUIZ GEN] Starting quiz generation")
@@ -19,41 +59,92 @@ def generate_quiz_questions(topic, num_questions=10, document_id=None, source_ty
     print(f"[QUIZ GEN] Num questions: {num_questions}")
     print(f"{'='*60}\n")
     
-    # Build prompt based on source type
-    if source_type == 'document' and document_id:
-        try:
-            print(f"[QUIZ GEN] Fetching document with ID: {document_id}")
-            document = Document.objects.get(id=document_id)
-            print(f"[QUIZ GEN] Document found: {document.title}")
-            print(f"[QUIZ GEN] Document content length: {len(document.text_content)} characters")
-            
-            if not document.text_content or len(document.text_content.strip()) < 50:
-                print(f"[ERROR] Document has no content or too short!")
-                return generate_fallback_questions(topic, num_questions)
-            
-            # Use direct document content (first 10k chars for better context)
-            context = document.text_content[:10000]
-            print(f"[QUIZ GEN] Using document content: {len(context)} chars")
-            
-            topic_name = document.title
-            
-        except Exception as e:
-            print(f"[ERROR] Error retrieving document: {e}")
-            return generate_fallback_questions(topic, num_questions)
-    else:
-        context = ""
-        topic_name = topic
+    try:
+        topic_name, source_text = load_quiz_source(topic, document_id, source_type)
+    except Exception as e:
+        print(f"[ERROR] Error retrieving document: {e}")
+        return generate_fallback_questions(topic, num_questions)
+    
+    questions = generate_in_batches(topic_name, source_text, num_questions, 'quiz')
+    if questions:
+        return questions
+    
+    # All models failed - return fallback
+    print(f"[ERROR] All models failed - using fallback questions")
+    return generate_fallback_questions(topic_name, num_questions)
+
+
+def load_quiz_source(topic, document_id=None, source_type='prompt'):
+    """
+    Resolve the topic name and source material for a quiz
+    
+    Returns:
+        Tuple of (topic_name, source_text); source_text is "" for topic quizzes
+    
+    Raises:
+        Document.DoesNotExist: if the document is missing
+        ValueError: if the document has no usable content
+    """
+    if source_type != 'document' or not document_id:
+        return topic, ""
+    
+    print(f"[QUIZ GEN] Fetching document with ID: {document_id}")
+    document = Document.objects.get(id=document_id)
+    print(f"[QUIZ GEN] Document found: {document.title}")
+    print(f"[QUIZ GEN] Document content length: {len(document.text_content)} characters")
+    
+    if not document.text_content or len(document.text_content.strip()) < 50:
+        raise ValueError(f"Document {document_id} has no content or is too short")
+    
+    return document.title, document_quiz_text(document)
+
+
+def document_quiz_text(document):
+    """
+    Source text for a whole-document quiz
+    
+    Documents over the generator's input budget are represented by one chunk
+    per topic cluster (see context_selector) rather than their first pages;
+    unindexed documents are passed on whole and condensed downstream.
+    """
+    budget = TokenBudget.for_model(BUDGET_MODEL, max_output_tokens=MAX_OUTPUT_TOKENS)
+    limit = budget.limit - PROMPT_RESERVED_TOKENS
+    if estimate_tokens(document.text_content, BUDGET_MODEL) <= limit:
+        return document.text_content
+    selected = representative_context(document.id, limit, BUDGET_MODEL)
+    if selected:
+        print(f"[QUIZ GEN] Using representative chunks: {len(selected)} of {len(document.text_content)} chars")
+        return selected
+    return document.text_content
+
+
+def build_quiz_prompt(num_questions, topic_name, context="", focus=None, avoid=None):
+    """
+    Build the quiz generation prompt
+    
+    Args:
+        num_questions: Number of questions to ask for
+        topic_name: Topic or document title
+        context: Document excerpt ("" for topic-only quizzes)
+        focus: Optional aspect or document part this batch should cover
+        avoid: Optional topics / questions other batches already cover
+    """
+    scope = ""
+    if focus:
+        scope += f"\nFocus on: {focus}\n"
+    if avoid:
+        listing = "\n".join(f"- {item}" for item in avoid)
+        scope += f"\nAlready covered elsewhere - do NOT ask about these again:\n{listing}\n"
     
-    # Build the prompt
     if context:
-        prompt = f"""Create {num_questions} multiple choice quiz questions about this document.
+        return f"""Create {num_questions} multiple choice quiz questions about this document.
 
 Document: {topic_name}
 Content:
 {context}
 
 Create educational questions that test understanding of the key concepts in this document.
-
+{scope}
 Return ONLY a JSON array (no markdown, no code blocks):
 [
   {{
@@ -63,11 +154,10 @@ Return ONLY a JSON array (no markdown, no code blocks):
     "explanation": "This is correct because..."
   }}
 ]"""
-    else:
-        prompt = f"""Create {num_questions} multiple choice quiz questions about: {topic_name}
+    return f"""Create {num_questions} multiple choice quiz questions about: {topic_name}
 
 Make the questions educational and test real understanding.
-
+{scope}
 Return ONLY a JSON array (no markdown, no code blocks):
 [
   {{
@@ -77,146 +167,315 @@ Return ONLY a JSON array (no markdown, no code blocks):
     "explanation": "This is correct because..."
   }}
 ]"""
+
+
+def split_into_slices(text, count):
+    """Split text into count contiguous slices of similar size, cutting at line breaks"""
+    slices = []
+    start = 0
+    for i in range(1, count):
+        target = len(text) * i // count
+        cut = text.find('\n', target, target + 2000)
+        if cut == -1:
+            cut = target
+        slices.append(text[start:cut].strip())
+        start = max(cut, start)
+    slices.append(text[start:].strip())
+    return slices
+
+
+def generate_in_batches(topic_name, source_text, num_questions, label, on_question=None, avoid=None):
+    """
+    Generate a quiz as concurrent batches of BATCH_SIZE questions
     
-    print(f"[QUIZ GEN] Prompt created ({len(prompt)} chars)")
+    Output tokens are generated serially, so one large completion is slow and
+    prone to truncation. Each batch gets its own document slice (or, for
+    topic-only quizzes, its own focus area plus the areas the other batches
+    cover), batches run in parallel and their questions are merged and
+    de-duplicated. A shortfall left by duplicates or failed batches is filled
+    by one final request that lists the questions already written.
     
-    # Try Groq FIRST (more reliable)
-    try:
-        print(f"[QUIZ GEN] Attempting Groq API...")
-        print(f"[DEBUG] Groq API Key present: {bool(settings.GROQ_API_KEY)}")
-        questions = generate_with_groq_direct(prompt, num_questions, topic_name)
-        if questions and len(questions) > 0:
-            print(f"[SUCCESS] Groq generated {len(questions)} questions!")
-            return questions
-    except Exception as e:
-        import traceback
-        print(f"[ERROR] Groq failed with error: {type(e).__name__}: {str(e)}")
-        print(f"[ERROR] Groq traceback:")
-        traceback.print_exc()
-
+    Args:
+        on_question: Optional callback; when given, responses are streamed and
+            each question is passed to it as soon as it parses (from any batch)
+        avoid: Optional existing questions the new ones must not repeat
     
-    # Try Gemini as fallback
-    try:
-        print(f"[QUIZ GEN] Attempting Gemini API...")
-        questions = generate_with_gemini_direct(prompt, num_questions, topic_name)
-        if questions and len(questions) > 0:
-            print(f"[SUCCESS] Gemini generated {len(questions)} questions!")
-            return questions
-    except Exception as e:
-        print(f"[WARNING] Gemini failed: {e}")
+    Returns:
+        List of at most num_questions questions (empty if every batch failed)
     
-    # Both failed - return fallback
-    print(f"[ERROR] Both APIs failed - using fallback questions")
-    return generate_fallback_questions(topic_name, num_questions)
+    Raises:
+        RateLimitExceeded: if every batch was rate limited
+    """
+    sizes = [BATCH_SIZE] * (num_questions // BATCH_SIZE)
+    if num_questions % BATCH_SIZE:
+        sizes.append(num_questions % BATCH_SIZE)
+    
+    if len(sizes) == 1:
+        # Long documents are condensed section by section so the quiz spans all of them
+        context = condense_for_model(source_text, BUDGET_MODEL, label, max_output_tokens=3000) if source_text else ""
+        if context:
+            print(f"[QUIZ GEN] Using document content: {len(context)} chars")
+        prompt = build_quiz_prompt(num_questions, topic_name, context, avoid=avoid)
+        print(f"[QUIZ GEN] Prompt created ({len(prompt)} chars)")
+        return generate_with_fallback(prompt, label, num_questions, on_question=on_question)
+    
+    prompts = []
+    if source_text:
+        # Split the whole input budget across the slices so parallel batches cost no more tokens than one call
+        budget = TokenBudget.for_model(BUDGET_MODEL, max_output_tokens=batch_max_tokens(BATCH_SIZE))
+        slice_tokens = max((budget.limit - PROMPT_RESERVED_TOKENS) // len(sizes), MIN_SLICE_TOKENS)
+        source_text = condense(source_text, budget.limit - PROMPT_RESERVED_TOKENS, label)
+        slices = split_into_slices(source_text, len(sizes))
+        for i, (size, part) in enumerate(zip(sizes, slices)):
+            context = truncate_to_tokens(part, slice_tokens, BUDGET_MODEL)
+            focus = f"part {i + 1} of {len(sizes)} of the document (the excerpt above); other parts are covered separately"
+            prompts.append(build_quiz_prompt(size, topic_name, context, focus=focus, avoid=avoid))
+    else:
+        for i, size in enumerate(sizes):
+            areas = [FOCUS_AREAS[j % len(FOCUS_AREAS)] for j in range(len(sizes))]
+            others = [area for j, area in enumerate(areas) if j != i and area != areas[i]]
+            prompts.append(build_quiz_prompt(size, topic_name, focus=areas[i], avoid=others + list(avoid or [])))
+    
+    print(f"[QUIZ GEN] Fanning out {num_questions} questions as {len(sizes)} parallel batches")
+    metrics.incr('quiz.batches', len(sizes))
+    executor = _get_batch_executor()
+    futures = [
+        executor.submit(_run_batch, prompt, f"{label} batch {i + 1}/{len(sizes)}", size, i, on_question)
+        for i, (prompt, size) in enumerate(zip(prompts, sizes))
+    ]
+    
+    questions = []
+    shed = []
+    # Batches on neighbouring slices / focus areas often reword the same question
+    index = NearDuplicateIndex()
+    for future in futures:
+        try:
+            batch = future.result()
+        except RateLimitExceeded as e:
+            shed.append(e)
+            continue
+        questions.extend(q for q in batch if index.add_if_new(q['question']))
+    
+    if shed and len(shed) == len(futures):
+        raise min(shed, key=lambda error: error.retry_after)
+    
+    missing = num_questions - len(questions)
+    if missing > 0 and questions:
+        print(f"[QUIZ GEN] {label}: {len(questions)}/{num_questions} after merging batches, requesting {missing} more")
+        context = truncate_to_tokens(source_text, MIN_SLICE_TOKENS, BUDGET_MODEL) if source_text else ""
+        prompt = build_quiz_prompt(missing, topic_name, context, avoid=list(avoid or []) + [q['question'] for q in questions])
+        try:
+            extra = generate_with_fallback(prompt, label, missing, on_question=on_question)
+            questions.extend(q for q in extra if index.add_if_new(q['question']))
+        except RateLimitExceeded as e:
+            # Keep the partial quiz rather than failing the whole request
+            print(f"[WARNING] {label}: final top-up rate limited: {e}")
+    
+    print(f"[QUIZ GEN] Merged {len(questions)} unique questions from {len(sizes)} batches")
+    return questions[:num_questions]
 
 
-def generate_with_groq_direct(prompt, num_questions, topic):
-    """Generate quiz using Groq API"""
-    print(f"[GROQ] Starting Groq generation...")
-    print(f"[GROQ] API Key present: {bool(settings.GROQ_API_KEY)}")
-    try:
-        print(f"[GROQ] Initializing client...")
-        # Initialize Groq client (no proxies parameter)
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        print(f"[GROQ] Client initialized!")
-        
-        print(f"[GROQ] Calling API...")
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a quiz generator. Return ONLY a valid JSON array. No markdown, no explanations, just the JSON."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=3000
-        )
-        print(f"[GROQ] API call successful!")
-        
-        text = response.choices[0].message.content.strip()
-        print(f"[GROQ] Response length: {len(text)} chars")
-        print(f"[GROQ] Response preview: {text[:200]}...")
-        
-        # Clean and parse
-        print(f"[GROQ] Cleaning JSON...")
-        text = clean_json_response(text)
-        print(f"[GROQ] Parsing JSON...")
-        questions = json.loads(text)
-        print(f"[GROQ] Parsed {len(questions) if isinstance(questions, list) else 0} items")
-        
-        # Validate
-        if not isinstance(questions, list):
-            raise ValueError("Response is not a list")
-        
-        valid_questions = []
-        for q in questions:
-            if all(k in q for k in ['question', 'options', 'correct_answer', 'explanation']):
-                valid_questions.append(q)
-        
-        return valid_questions
-    except Exception as e:
-        print(f"[ERROR] Groq error details: {type(e).__name__}: {str(e)}")
-        raise
+def batch_max_tokens(num_questions):
+    """Completion budget for a quiz of num_questions (smaller budgets admit sooner under TPM limits)"""
+    return min(MAX_OUTPUT_TOKENS, OUTPUT_OVERHEAD_TOKENS + num_questions * TOKENS_PER_QUESTION)
+
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
 
 
-def generate_with_gemini_direct(prompt, num_questions, topic):
-    """Generate quiz using Gemini API"""
+def _get_batch_executor():
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_BATCHES, thread_name_prefix='quiz-batch')
+        return _batch_executor
+
+
+def _run_batch(prompt, label, num_questions, index, on_question):
     try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Use gemini-2.0-flash-exp (available model)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=3000,
+        return generate_with_fallback(prompt, label, num_questions, spread=index, on_question=on_question)
+    finally:
+        # Pool threads must not hold on to database connections
+        connections.close_all()
+
+
+def generate_with_fallback(prompt, label, num_questions=None, spread=0, on_question=None):
+    """
+    Try the routed generator models in order until one returns valid questions
+    
+    A response that salvages fewer than num_questions is topped up by asking
+    the same model for only the missing questions.
+    
+    Args:
+        prompt: Generation prompt
+        label: Caller label for logs
+        num_questions: Number of questions wanted (also sizes max_tokens)
+        spread: Batch index; batches rotate their primary among the best SPREAD_MODELS
+        on_question: Optional callback; streams the response and passes each
+            question to it as soon as it parses (disables hedging)
+    
+    Returns:
+        List of valid question dicts (empty if every model failed)
+    
+    Raises:
+        RateLimitExceeded: if every model was rate limited
+    """
+    models = router.candidates(GENERATOR_TIER, reason=label)
+    if spread and len(models) > 1:
+        shift = spread % min(SPREAD_MODELS, len(models))
+        models = models[shift:SPREAD_MODELS] + models[:shift] + models[SPREAD_MODELS:]
+    models = models[:MAX_ATTEMPTS]
+    max_tokens = batch_max_tokens(num_questions) if num_questions else MAX_OUTPUT_TOKENS
+    
+    if hedging.is_enabled() and len(models) > 1 and on_question is None:
+        # Race the next model against a slow primary instead of waiting it out
+        try:
+            questions, model_id = hedging.hedged_call(
+                lambda model_id: generate_with_model(prompt, model_id, max_tokens), models, label
             )
-        )
-        
-        text = response.text.strip()
-        print(f"[DEBUG] Gemini response length: {len(text)} chars")
-        
-        # Clean and parse
-        text = clean_json_response(text)
-        questions = json.loads(text)
-        
-        # Validate
-        if not isinstance(questions, list):
-            raise ValueError("Response is not a list")
-        
-        valid_questions = []
-        for q in questions:
-            if all(k in q for k in ['question', 'options', 'correct_answer', 'explanation']):
-                valid_questions.append(q)
-        
-        return valid_questions
-    except Exception as e:
-        print(f"[ERROR] Gemini error details: {type(e).__name__}: {str(e)}")
-        raise
+            print(f"[SUCCESS] {model_id} generated {len(questions)} questions!")
+            return top_up_questions(prompt, questions, num_questions, model_id, label)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"[ERROR] All models failed: {type(e).__name__}: {str(e)}")
+            return []
+    
+    shed = []
+    for model_id in models:
+        try:
+            print(f"[QUIZ GEN] Attempting {model_id}...")
+            questions = generate_with_model(prompt, model_id, max_tokens, on_question)
+            if questions:
+                print(f"[SUCCESS] {model_id} generated {len(questions)} questions!")
+                return top_up_questions(prompt, questions, num_questions, model_id, label, on_question)
+        except RateLimitExceeded as e:
+            shed.append(e)
+            print(f"[WARNING] {model_id} rate limited: {e}")
+        except Exception as e:
+            import traceback
+            print(f"[ERROR] {model_id} failed with error: {type(e).__name__}: {str(e)}")
+            traceback.print_exc()
+    
+    if shed and len(shed) == len(models):
+        # Every model is saturated - let the view answer 429 instead of serving placeholders
+        raise min(shed, key=lambda error: error.retry_after)
+    return []
+
+
+def generate_with_model(prompt, model_id, max_tokens=MAX_OUTPUT_TOKENS, on_question=None):
+    """
+    Generate quiz questions with one model
+    
+    Every complete, valid question is kept even if the response is truncated
+    or has malformed items.
+    
+    Args:
+        on_question: Optional callback; when given, the response is streamed
+            and each question is passed to it as soon as it parses
+    
+    Raises:
+        ValueError: if the response contains no valid questions
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": "You are a quiz generator. Return ONLY a valid JSON array. No markdown, no explanations, just the JSON."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+    if on_question is not None:
+        return stream_with_model(messages, model_id, max_tokens, on_question)
+    
+    text = call_llm_api(
+        model_id,
+        messages,
+        temperature=0.7,
+        max_tokens=max_tokens,
+        cache_policy='quiz',
+        priority=PRIORITY_BATCH
+    )
+    
+    print(f"[QUIZ GEN] {model_id} response length: {len(text.strip())} chars")
+    
+    valid_questions = salvage_quiz_questions(text)
+    if not valid_questions:
+        raise ValueError("Response contains no valid questions")
+    
+    return valid_questions
 
 
-def clean_json_response(text):
-    """Clean JSON response from AI models"""
-    # Remove markdown code blocks
-    if '```json' in text:
-        text = text.split('```json')[1]
-    if '```' in text:
-        text = text.split('```')[0]
+def stream_with_model(messages, model_id, max_tokens, on_question):
+    """
+    Stream one model's response, passing each valid question to on_question as it parses
+    
+    Questions already handed over stay delivered if the stream fails midway.
+    
+    Raises:
+        ValueError: if the response contains no valid questions
+    """
+    parser = IncrementalJSONParser()
+    questions = []
+    for chunk in stream_llm_api(model_id, messages, temperature=0.7, max_tokens=max_tokens, priority=PRIORITY_BATCH):
+        for _, item in parser.feed(chunk):
+            if is_valid_quiz_question(item):
+                questions.append(item)
+                on_question(item)
     
-    # Find JSON array
-    start = text.find('[')
-    end = text.rfind(']') + 1
+    print(f"[QUIZ GEN] {model_id} streamed {len(questions)} questions")
+    if not questions:
+        raise ValueError("Response contains no valid questions")
+    return questions
+
+
+def top_up_questions(prompt, questions, num_questions, model_id, label, on_question=None):
+    """
+    Request only the questions missing from a partial response
+    
+    Args:
+        prompt: The original generation prompt
+        questions: Questions salvaged so far
+        num_questions: Number of questions wanted (None to skip the top-up)
+        model_id: Model that produced the partial response
+        label: Caller label for logs
+        on_question: Optional callback for streamed questions
+        
+    Returns:
+        Merged list of at most num_questions questions
+    """
+    if not num_questions:
+        return questions
     
-    if start != -1 and end > start:
-        text = text[start:end]
+    for _ in range(MAX_FOLLOWUPS):
+        missing = num_questions - len(questions)
+        if missing <= 0:
+            break
+        
+        print(f"[QUIZ GEN] {label}: {len(questions)}/{num_questions} questions, requesting {missing} more from {model_id}")
+        metrics.incr('quiz.followups')
+        followup = f"""{prompt}
+
+These questions were already written - do NOT repeat them:
+{json.dumps([q['question'] for q in questions], indent=2)}
+
+Return ONLY a JSON array with exactly {missing} NEW questions in the same format."""
+        try:
+            extra = generate_with_model(followup, model_id, batch_max_tokens(missing), on_question)
+        except Exception as e:
+            # Keep the partial quiz rather than failing the whole request
+            print(f"[WARNING] {label}: follow-up on {model_id} failed: {type(e).__name__}: {e}")
+            break
+        
+        index = NearDuplicateIndex()
+        for q in questions:
+            index.add(q['question'])
+        questions.extend(q for q in extra if index.add_if_new(q['question']))
     
-    return text.strip()
+    return questions[:num_questions]
 
 
 def generate_fallback_questions(topic, num_questions):
@@ -250,6 +509,7 @@ def evaluate_answer(question_text, user_answer, correct_answer):
     return is_correct, explanation
 
 
+@coalesced('quiz_headings')
 def generate_quiz_from_headings(document_id, selected_headings, num_questions=10):
     """
     Generate unique quiz questions from selected document headings using Groq
@@ -280,12 +540,13 @@ def generate_quiz_from_headings(document_id, selected_headings, num_questions=10
             return generate_fallback_questions("Selected sections", num_questions)
         
         print(f"[QUIZ FROM HEADINGS] Content length: {len(heading_content)} chars")
+        heading_content = condense_for_model(heading_content, BUDGET_MODEL, 'quiz_headings', max_output_tokens=3000)
         
         # Build enhanced prompt for Groq
         prompt = f"""Generate {num_questions} COMPLETELY UNIQUE multiple choice questions from these document sections.
 
 Document Content:
-{heading_content[:8000]}
+{heading_content}
 
 CRITICAL REQUIREMENTS:
 1. Each question must be COMPLETELY DIFFERENT - no similar variations
@@ -306,36 +567,19 @@ Return ONLY a valid JSON array (no markdown, no code blocks):
 ]
 """
         
-        # Try Groq first (primary)
-        try:
-            print("[QUIZ FROM HEADINGS] Attempting Groq API...")
-            questions = generate_with_groq_direct(prompt, num_questions, "document headings")
-            
-            if questions and len(questions) > 0:
-                # Validate uniqueness
-                unique_questions = ensure_unique_questions(questions)
-                print(f"[SUCCESS] Generated {len(unique_questions)} unique questions from headings!")
-                return unique_questions
-                
-        except Exception as e:
-            print(f"[WARNING] Groq failed: {e}")
+        questions = generate_with_fallback(prompt, 'quiz_headings', num_questions)
+        if questions:
+            # Validate uniqueness
+            unique_questions = ensure_unique_questions(questions)
+            print(f"[SUCCESS] Generated {len(unique_questions)} unique questions from headings!")
+            return unique_questions
         
-        # Try Gemini as fallback
-        try:
-            print("[QUIZ FROM HEADINGS] Attempting Gemini API...")
-            questions = generate_with_gemini_direct(prompt, num_questions, "document headings")
-            
-            if questions and len(questions) > 0:
-                unique_questions = ensure_unique_questions(questions)
-                print(f"[SUCCESS] Generated {len(unique_questions)} unique questions from headings!")
-                return unique_questions
-                
-        except Exception as e:
-            print(f"[WARNING] Gemini failed: {e}")
-        
-        # Both failed
-        print("[ERROR] Both APIs failed for heading-based quiz")
+        # All models failed
+        print("[ERROR] All models failed for heading-based quiz")
         return generate_fallback_questions("Selected sections", num_questions)
+    
+    except RateLimitExceeded:
+        raise
         
     except Exception as e:
         print(f"[ERROR] Failed to generate quiz from headings: {e}")
@@ -348,6 +592,9 @@ def ensure_unique_questions(questions):
     """
     Ensure all questions are unique by removing duplicates and very similar questions
     
+    Reworded and reordered variants are caught with MinHash/LSH over stemmed
+    word shingles (see dedup.py), in roughly linear time.
+    
     Args:
         questions: List of question dictionaries
         
@@ -357,25 +604,7 @@ def ensure_unique_questions(questions):
     if not questions:
         return []
     
-    unique = []
-    seen_keywords = set()
-    
-    for q in questions:
-        # Extract key terms from question (simple keyword extraction)
-        question_text = q.get('question', '').lower()
-        words = question_text.split()
-        
-        # Get significant words (>4 chars, not common words)
-        keywords = {w for w in words if len(w) > 4 and w not in ['what', 'which', 'where', 'when', 'following', 'describe', 'explain']}
-        
-        # Check if this question is too similar to existing ones
-        overlap = keywords.intersection(seen_keywords)
-        similarity_ratio = len(overlap) / len(keywords) if keywords else 0
-        
-        # Only add if less than 50% keyword overlap
-        if similarity_ratio < 0.5:
-            unique.append(q)
-            seen_keywords.update(keywords)
+    unique = dedupe(questions, text_of=lambda q: q.get('question', ''))
     
     print(f"[UNIQUENESS] Filtered {len(questions)} → {len(unique)} unique questions")
     return unique
@@ -5,6 +5,10 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
@@ -14,12 +18,38 @@ import json
 
 from .models import Quiz, QuizQuestion, LearningItem, Document
 from .quiz_utils import generate_quiz_questions, evaluate_answer, generate_quiz_from_headings
+from .progressive_quiz import start_generation, fail_if_stale
+from . import question_pool
 from .utils import generate_answer
 from .rag_service import extract_document_headings, get_heading_content
+from .llm_scheduler import RateLimitExceeded, rate_limited_response
 
 # ===== Quiz API Endpoints =====
 
 
+def _create_quiz(questions_data, **quiz_fields):
+    """
+    Create a quiz and its questions in one transaction
+
+    Returns:
+        (quiz, questions) - the questions come back from bulk_create with their ids set
+    """
+    with transaction.atomic():
+        quiz = Quiz.objects.create(**quiz_fields)
+        questions = QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                quiz=quiz,
+                question=q_data['question'],
+                options=q_data['options'],
+                correct_answer=q_data['correct_answer'],
+                explanation=q_data.get('explanation', ''),
+                order=idx
+            )
+            for idx, q_data in enumerate(questions_data or [])
+        ])
+    return quiz, questions
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def generate_quiz(request):
@@ -31,13 +61,19 @@ def generate_quiz(request):
         num_questions = int(data.get('num_questions', 10))
         document_id = data.get('document_id')
         
-        # Generate questions using AI
-        questions_data = generate_quiz_questions(
-            topic=topic,
-            num_questions=num_questions,
-            document_id=document_id,
-            source_type=source_type
-        )
+        # Serve document quizzes from the pre-generated pool when it can cover them
+        questions_data = None
+        if source_type == 'document' and document_id:
+            questions_data = question_pool.sample_questions(document_id, num_questions)
+        
+        if questions_data is None:
+            # Generate questions using AI
+            questions_data = generate_quiz_questions(
+                topic=topic,
+                num_questions=num_questions,
+                document_id=document_id,
+                source_type=source_type
+            )
         
         # Create quiz in database
         session_key = request.session.session_key or 'default'
@@ -45,7 +81,8 @@ def generate_quiz(request):
         if document_id:
             doc = Document.objects.get(id=document_id)
             
-        quiz = Quiz.objects.create(
+        quiz, questions = _create_quiz(
+            questions_data,
             topic=topic,
             source_type=source_type,
             total_questions=num_questions,
@@ -53,19 +90,7 @@ def generate_quiz(request):
             session_key=session_key
         )
         
-        # Create quiz questions
-        for idx, q_data in enumerate(questions_data):
-            QuizQuestion.objects.create(
-                quiz=quiz,
-                question=q_data['question'],
-                options=q_data['options'],
-                correct_answer=q_data['correct_answer'],
-                explanation=q_data.get('explanation', ''),
-                order=idx
-            )
-        
         # Return quiz data
-        questions = quiz.questions.all()
         return JsonResponse({
             'status': 'success',
             'quiz': {
@@ -85,6 +110,78 @@ def generate_quiz(request):
             ]
         })
         
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def start_quiz(request):
+    """
+    Create a quiz and generate its questions in the background
+    
+    Returns immediately; the client polls get_quiz_questions for questions
+    as they are generated.
+    """
+    try:
+        data = json.loads(request.body)
+        source_type = data.get('source_type', 'prompt')
+        topic = data.get('topic', '')
+        num_questions = int(data.get('num_questions', 10))
+        document_id = data.get('document_id')
+        
+        session_key = request.session.session_key or 'default'
+        doc = None
+        if document_id:
+            doc = Document.objects.get(id=document_id)
+        
+        pooled = None
+        if source_type == 'document' and document_id:
+            pooled = question_pool.sample_questions(document_id, num_questions)
+        
+        # On a pool hit the whole quiz is ready now
+        quiz, questions = _create_quiz(
+            pooled,
+            topic=topic,
+            source_type=source_type,
+            total_questions=num_questions,
+            document=doc,
+            session_key=session_key,
+            generation_status=Quiz.STATUS_GENERATING if pooled is None else Quiz.STATUS_COMPLETE,
+            generation_started_at=timezone.now() if pooled is None else None
+        )
+        
+        if pooled is None:
+            start_generation(quiz, topic, num_questions, document_id, source_type)
+        
+        return JsonResponse({
+            'status': 'success',
+            'quiz': {
+                'id': quiz.id,
+                'topic': quiz.topic,
+                'total_questions': quiz.total_questions,
+                'generation_status': quiz.generation_status
+            },
+            'questions': [
+                {
+                    'id': q.id,
+                    'question': q.question,
+                    'options': q.options,
+                    'correct_answer': q.correct_answer,
+                    'order': q.order
+                }
+                for q in questions
+            ]
+        })
+        
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -94,6 +191,40 @@ def generate_quiz(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+def get_quiz_questions(request, quiz_id):
+    """Questions generated so far for a quiz (only those with order > ?after= when given)"""
+    try:
+        quiz = get_object_or_404(Quiz, id=quiz_id)
+        # The generator may have died with its worker - stop the client polling forever
+        fail_if_stale(quiz)
+        after = int(request.GET.get('after', -1))
+        questions = quiz.questions.filter(order__gt=after)
+        
+        return JsonResponse({
+            'status': 'success',
+            'generation_status': quiz.generation_status,
+            'message': quiz.generation_error,
+            'total_questions': quiz.total_questions,
+            'questions': [
+                {
+                    'id': q.id,
+                    'question': q.question,
+                    'options': q.options,
+                    'correct_answer': q.correct_answer,
+                    'order': q.order
+                }
+                for q in questions
+            ]
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def submit_quiz_answer(request, quiz_id):
@@ -132,6 +263,101 @@ def submit_quiz_answer(request, quiz_id):
         }, status=500)
 
 
+def _score_quiz(quiz_id, answers):
+    """
+    Score a whole quiz in one pass
+
+    Answers (question id -> answer) are evaluated in Python, written back with
+    one bulk_update, and the quiz score is counted by the database in the same
+    UPDATE that completes the quiz. Questions without an answer in the batch
+    keep any result submitted earlier.
+
+    Returns:
+        Result dict, or None if the quiz has no questions
+    """
+    questions = list(
+        QuizQuestion.objects.filter(quiz_id=quiz_id).select_related('quiz').only(
+            'id', 'question', 'correct_answer', 'user_answer', 'is_correct', 'explanation', 'order',
+            'quiz__total_questions'
+        )
+    )
+    if not questions:
+        return None
+    
+    answered = []
+    for question in questions:
+        user_answer = answers.get(str(question.id))
+        if user_answer is None:
+            continue
+        user_answer = str(user_answer)
+        question.is_correct, explanation = evaluate_answer(question.question, user_answer, question.correct_answer)
+        question.user_answer = user_answer
+        if not question.explanation:
+            question.explanation = explanation
+        answered.append(question)
+    
+    correct = QuizQuestion.objects.filter(quiz_id=OuterRef('id'), is_correct=True).order_by().values('quiz_id').annotate(
+        count=Count('id')
+    ).values('count')
+    with transaction.atomic():
+        QuizQuestion.objects.bulk_update(answered, ['user_answer', 'is_correct', 'explanation'])
+        Quiz.objects.filter(id=quiz_id).update(
+            score=Coalesce(Subquery(correct), 0), is_completed=True, updated_at=timezone.now()
+        )
+    
+    return {
+        'score': sum(1 for question in questions if question.is_correct),
+        'total_questions': questions[0].quiz.total_questions,
+        'results': [
+            {'id': question.id, 'is_correct': question.is_correct, 'explanation': question.explanation}
+            for question in questions
+        ],
+        'wrong_answers': [
+            {
+                'question_number': question.order + 1,
+                'question': question.question,
+                'user_answer': question.user_answer,
+                'correct_answer': question.correct_answer,
+                'explanation': question.explanation
+            }
+            for question in questions if not question.is_correct
+        ]
+    }
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def submit_quiz_answers(request, quiz_id):
+    """
+    Submit every answer of a quiz at once, score it and mark it complete
+
+    Body: {"answers": {"<question id>": "<answer>", ...}}
+    """
+    try:
+        data = json.loads(request.body)
+        answers = data.get('answers')
+        if not isinstance(answers, dict):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'answers must map question ids to answers'
+            }, status=400)
+        
+        result = _score_quiz(quiz_id, answers)
+        if result is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Quiz not found or has no questions'
+            }, status=404)
+        
+        return JsonResponse({'status': 'success', **result})
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def complete_quiz(request, quiz_id):
@@ -202,7 +428,12 @@ def get_learning_items(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def add_to_learning(request):
-    """Add item to learning track"""
+    """
+    Add item to learning track
+
+    Accepts one item, or {"quiz_id": ..., "items": [...]} to add several
+    (e.g. every wrong answer of a quiz) in a single transaction.
+    """
     try:
         data = json.loads(request.body)
         session_key = request.session.session_key or 'default'
@@ -210,19 +441,29 @@ def add_to_learning(request):
         quiz_id = data.get('quiz_id')
         quiz = Quiz.objects.get(id=quiz_id) if quiz_id else None
         
-        learning_item = LearningItem.objects.create(
-            session_key=session_key,
-            topic=data.get('topic', ''),
-            question=data.get('question', ''),
-            correct_answer=data.get('correct_answer', ''),
-            explanation=data.get('explanation', ''),
-            user_wrong_answer=data.get('user_wrong_answer', ''),
-            quiz=quiz
-        )
-        
+        entries = data.get('items')
+        if entries is not None and not isinstance(entries, list):
+            return JsonResponse({'status': 'error', 'message': 'items must be a list'}, status=400)
+        
+        with transaction.atomic():
+            learning_items = LearningItem.objects.bulk_create([
+                LearningItem(
+                    session_key=session_key,
+                    topic=entry.get('topic', data.get('topic', '')),
+                    question=entry.get('question', ''),
+                    correct_answer=entry.get('correct_answer', ''),
+                    explanation=entry.get('explanation', ''),
+                    user_wrong_answer=entry.get('user_wrong_answer', ''),
+                    quiz=quiz
+                )
+                for entry in (entries if entries is not None else [data])
+            ])
+        
+        item_ids = [item.id for item in learning_items]
         return JsonResponse({
             'status': 'success',
-            'item_id': learning_item.id
+            'item_id': item_ids[0] if len(item_ids) == 1 else None,
+            'item_ids': item_ids
         })
         
     except Exception as e:
@@ -355,7 +596,8 @@ def teach_topic(request):
         teaching_content = generate_answer(
             query=f"Teach me about: {topic}. Provide a comprehensive explanation suitable for learning.",
             context="",
-            model_id='gemini-2.5-flash'
+            model_id='gemini-2.5-flash',
+            cache_policy='teach'
         )
         
         # Save to learning track
@@ -374,6 +616,9 @@ def teach_topic(request):
             'learning_item_id': learning_item.id
         })
         
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -433,18 +678,23 @@ def generate_quiz_from_headings_api(request):
                 'message': 'Document ID and selected headings required'
             }, status=400)
         
-        # Generate quiz using selected headings
-        questions_data = generate_quiz_from_headings(
-            document_id=document_id,
-            selected_headings=selected_headings,
-            num_questions=num_questions
-        )
+        # Serve from the section pools when they can cover the request
+        questions_data = question_pool.sample_questions(document_id, num_questions, sections=selected_headings)
+        
+        if questions_data is None:
+            # Generate quiz using selected headings
+            questions_data = generate_quiz_from_headings(
+                document_id=document_id,
+                selected_headings=selected_headings,
+                num_questions=num_questions
+            )
         
         # Create quiz in database
         session_key = request.session.session_key or 'default'
         document = Document.objects.get(id=document_id)
         
-        quiz = Quiz.objects.create(
+        quiz, _ = _create_quiz(
+            questions_data,
             topic=f"Quiz on: {document.title}",
             source_type='document',
             total_questions=len(questions_data),
@@ -452,23 +702,15 @@ def generate_quiz_from_headings_api(request):
             document=document
         )
         
-        # Create questions
-        for idx, q_data in enumerate(questions_data):
-            QuizQuestion.objects.create(
-                quiz=quiz,
-                question_text=q_data['question'],
-                options=json.dumps(q_data['options']),
-                correct_answer=q_data['correct_answer'],
-                explanation=q_data.get('explanation', ''),
-                question_number=idx + 1
-            )
-        
         return JsonResponse({
             'status': 'success',
             'quiz_id': quiz.id,
             'questions': questions_data
         })
         
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -478,6 +720,29 @@ def generate_quiz_from_headings_api(request):
         }, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def document_question_pool(request, document_id):
+    """Pool status for a document (GET) or build / top up its pools in the background (POST)"""
+    try:
+        document = get_object_or_404(Document, id=document_id)
+        
+        if request.method == 'POST':
+            data = json.loads(request.body or '{}')
+            scheduled = question_pool.schedule_build(document.id, data.get('sections') or None)
+            stats = question_pool.get_pool_stats(document.id)
+            stats['scheduled'] = scheduled
+            return JsonResponse({'status': 'success', 'pool': stats}, status=202)
+        
+        return JsonResponse({'status': 'success', 'pool': question_pool.get_pool_stats(document.id)})
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def submit_quiz_instant(request):
@@ -493,42 +758,31 @@ def submit_quiz_instant(request):
                 'message': 'Quiz ID required'
             }, status=400)
         
-        quiz = Quiz.objects.get(id=quiz_id)
-        questions = QuizQuestion.objects.filter(quiz=quiz).order_by('question_number')
-        
-        correct_count = 0
-        wrong_answers = []
+        result = _score_quiz(quiz_id, answers)
+        if result is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Quiz not found or has no questions'
+            }, status=404)
         
-        for question in questions:
-            user_answer = answers.get(str(question.id), '')
-            is_correct = user_answer.strip() == question.correct_answer.strip()
-            
-            if is_correct:
-                correct_count += 1
-            else:
-                # Add to wrong answers with concise explanation
-                wrong_answers.append({
-                    'question_number': question.question_number,
-                    'question': question.question_text,
-                    'your_answer': user_answer,
-                    'correct_answer': question.correct_answer,
-                    'explanation': question.explanation  # Already concise (1 sentence)
-                })
-        
-        total_questions = questions.count()
-        percentage = round((correct_count / total_questions) * 100, 1) if total_questions > 0 else 0
-        
-        # Update quiz with results
-        quiz.score = correct_count
-        quiz.is_completed = True
-        quiz.save()
+        total_questions = len(result['results'])
+        percentage = round((result['score'] / total_questions) * 100, 1) if total_questions > 0 else 0
         
         return JsonResponse({
             'status': 'success',
-            'score': correct_count,
+            'score': result['score'],
             'total': total_questions,
             'percentage': percentage,
-            'wrong_answers': wrong_answers,
+            'wrong_answers': [
+                {
+                    'question_number': wrong['question_number'],
+                    'question': wrong['question'],
+                    'your_answer': wrong['user_answer'],
+                    'correct_answer': wrong['correct_answer'],
+                    'explanation': wrong['explanation']  # Already concise (1 sentence)
+                }
+                for wrong in result['wrong_answers']
+            ],
             'passed': percentage >= 60
         })
         
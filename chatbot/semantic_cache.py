@@ -0,0 +1,215 @@
+"""
+Per-document semantic answer cache for RAG chat
+Incoming queries are embedded with the document's own fitted TF-IDF vectorizer;
+a query whose cosine similarity to a cached query (same document and model)
+clears the threshold is answered from the cache instead of calling the LLM.
+Queries with content words outside the vectorizer's vocabulary are never
+cached or matched: the vectorizer drops those words, so "disadvantages of X"
+and "what is X" would otherwise embed to the same vector.
+"""
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from . import metrics
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'ALIAS': 'llm',
+    'THRESHOLD': 0.9,
+    'MAX_ENTRIES_PER_DOCUMENT': 200,
+    'MIN_QUERY_WORDS': 2,
+    'TTL': 60 * 60 * 24 * 7,
+}
+
+# Answers generate_answer returns when the provider failed - never cache these
+ERROR_PREFIXES = ("I'm sorry",)
+
+# Phrasing words that change how a question is asked but not what it is about
+QUESTION_WORDS = {
+    'explain', 'describe', 'define', 'definition', 'meaning', 'mean', 'tell',
+    'briefly', 'please', 'give', 'example', 'examples', 'understand', 'does', 'did',
+}
+
+
+@lru_cache(maxsize=1)
+def _ignored_words():
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    return frozenset(ENGLISH_STOP_WORDS | QUESTION_WORDS)
+
+
+def get_config() -> dict:
+    """Merge SEMANTIC_CACHE settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'SEMANTIC_CACHE', {}))
+    return config
+
+
+def _cache():
+    return caches[get_config()['ALIAS']]
+
+
+def get_document_version(document_id):
+    """
+    Current index version for a document (None if the document is gone)
+
+    Kept on the Document row rather than in the cache: a culled version key
+    would fall back to 0 and revive answers cached before a re-index.
+    """
+    from .models import Document
+    return Document.objects.filter(id=document_id).values_list('index_version', flat=True).first()
+
+
+def _entries_key(document_id, model_id, version) -> str:
+    return f'semantic:{document_id}:{version}:{model_id}'
+
+
+def invalidate_document(document_id):
+    """
+    Drop every cached answer for a document
+
+    Bumping the version makes all existing entry keys unreachable; they
+    expire through the normal TTL / cull cycle of the cache backend.
+    """
+    from .models import Document
+    Document.objects.filter(id=document_id).update(index_version=F('index_version') + 1)
+    print(f"[SEMANTIC CACHE] Invalidated answers for document {document_id}")
+
+
+@lru_cache(maxsize=32)
+def _get_vectorizer(document_id, version):
+    """
+    Load the document's fitted vectorizer (cached per index version)
+
+    Returns:
+        Tuple of (vectorizer, content mask, vocabulary). The mask zeroes
+        features made only of stop words / question phrasing so "what is X"
+        and "explain X" land on the same vector; vocabulary holds the
+        single-word features.
+    """
+    from .utils import load_vectorizer
+    
+    vectorizer = load_vectorizer(document_id)
+    if vectorizer is None:
+        return None, None, None
+    
+    ignored = _ignored_words()
+    features = vectorizer.get_feature_names_out()
+    mask = np.array([
+        0.0 if all(token in ignored for token in feature.split()) else 1.0
+        for feature in features
+    ], dtype='float32')
+    vocabulary = {feature for feature in features if ' ' not in feature}
+    return vectorizer, mask, vocabulary
+
+
+def unknown_terms(query: str, vectorizer, vocabulary) -> list:
+    """Content words of a query that the vectorizer cannot represent"""
+    tokens = vectorizer.build_tokenizer()(vectorizer.build_preprocessor()(query))
+    ignored = _ignored_words()
+    return [token for token in tokens if token not in ignored and token not in vocabulary]
+
+
+def embed_query(query: str, document_id: int, version: int):
+    """
+    Embed a query in the document's vector space
+
+    Returns:
+        L2-normalised float32 vector, or None if the query shares no
+        vocabulary with the document or has content words outside it
+        (nothing meaningful to compare)
+    """
+    vectorizer, mask, vocabulary = _get_vectorizer(document_id, version)
+    if vectorizer is None:
+        return None
+    unknown = unknown_terms(query, vectorizer, vocabulary)
+    if unknown:
+        metrics.incr('semantic_cache.out_of_vocabulary')
+        print(f"[SEMANTIC CACHE] Skipped '{query[:50]}': {', '.join(unknown[:5])} not in the document vocabulary")
+        return None
+    vector = vectorizer.transform([query]).toarray()[0].astype('float32') * mask
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+
+def lookup_answer(query: str, document_id: int, model_id: str):
+    """
+    Find a cached answer for a near-identical query
+
+    Only for questions asked without earlier turns: answers depend on the
+    chat history and summary, which are not part of the key.
+
+    Returns:
+        Tuple of (answer or None, query vector or None). Pass the vector to
+        store_answer so the query is not embedded twice.
+    """
+    config = get_config()
+    if not config['ENABLED'] or len(query.split()) < config['MIN_QUERY_WORDS']:
+        return None, None
+
+    metrics.set_gauge('semantic_cache.threshold', config['THRESHOLD'])
+    version = get_document_version(document_id)
+    if version is None:
+        return None, None
+    vector = embed_query(query, document_id, version)
+    if vector is None:
+        return None, None
+
+    entries = _cache().get(_entries_key(document_id, model_id, version), [])
+    if entries:
+        matrix = np.vstack([entry['vector'] for entry in entries])
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= config['THRESHOLD']:
+            metrics.incr('semantic_cache.hits')
+            metrics.set_gauge('semantic_cache.last_hit_similarity', round(float(similarities[best]), 4))
+            print(f"[SEMANTIC CACHE] Hit ({similarities[best]:.3f}) for '{query[:50]}' ~ '{entries[best]['query'][:50]}'")
+            return entries[best]['answer'], vector
+
+    metrics.incr('semantic_cache.misses')
+    return None, vector
+
+
+def store_answer(query: str, document_id: int, model_id: str, answer: str, vector=None):
+    """
+    Remember an answer for future near-identical queries
+
+    The entry list is read-modify-written; under heavy concurrency an entry
+    may occasionally be lost, which only costs a future cache miss.
+    """
+    config = get_config()
+    if not config['ENABLED'] or not answer or answer.startswith(ERROR_PREFIXES):
+        return
+
+    version = get_document_version(document_id)
+    if version is None:
+        return
+    if vector is None:
+        vector = embed_query(query, document_id, version)
+        if vector is None:
+            return
+
+    cache = _cache()
+    key = _entries_key(document_id, model_id, version)
+    entries = cache.get(key, [])
+    entries.append({'query': query, 'vector': vector, 'answer': answer})
+    # Keep the most recent entries only
+    entries = entries[-config['MAX_ENTRIES_PER_DOCUMENT']:]
+    cache.set(key, entries, timeout=config['TTL'])
+
+
+def get_cache_stats() -> dict:
+    """Hit-rate summary for the metrics endpoint"""
+    config = get_config()
+    return {
+        'enabled': config['ENABLED'],
+        'threshold': config['THRESHOLD'],
+        'hits': metrics.get_counter('semantic_cache.hits'),
+        'misses': metrics.get_counter('semantic_cache.misses'),
+        'out_of_vocabulary': metrics.get_counter('semantic_cache.out_of_vocabulary'),
+        'hit_rate': metrics.hit_rate('semantic_cache'),
+    }
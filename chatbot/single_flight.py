@@ -0,0 +1,170 @@
+"""
+Single-flight coalescing of identical concurrent requests
+Concurrent callers with the same key wait on one in-flight call and share its result.
+Within a worker this uses threading primitives; with SINGLE_FLIGHT['CROSS_WORKER']
+enabled, a lock in the Django cache coordinates callers across worker processes.
+"""
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'CROSS_WORKER': False,
+    'ALIAS': 'llm',
+    'LOCK_TIMEOUT': 120,    # Seconds before a crashed leader's lock expires
+    'WAIT_TIMEOUT': 120,    # Seconds a follower waits before calling upstream itself
+    'POLL_INTERVAL': 0.1,
+    'RESULT_TTL': 15,       # Seconds a shared result stays available to late followers
+}
+
+
+def get_config() -> dict:
+    """Merge SINGLE_FLIGHT settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'SINGLE_FLIGHT', {}))
+    return config
+
+
+class _Call:
+    """One in-flight call that followers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn, timeout: float = None):
+        """
+        Run fn once for all concurrent callers of key
+
+        Args:
+            key: Request key - callers with equal keys share one upstream call
+            fn: Zero-argument callable performing the real work
+            timeout: Seconds a follower waits for the leader before calling
+                fn itself (defaults to WAIT_TIMEOUT)
+
+        Returns:
+            The result of fn. Followers receive a deep copy so they can
+            mutate it freely. If fn raises, every waiting caller gets the error.
+        """
+        config = get_config()
+        if not config['ENABLED']:
+            return fn()
+        if timeout is None:
+            timeout = config['WAIT_TIMEOUT']
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            metrics.incr('single_flight.shared')
+            if not call.done.wait(timeout):
+                metrics.incr('single_flight.wait_timeouts')
+                print(f"[SINGLE FLIGHT] Leader still running after {timeout:.1f}s, calling upstream directly")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        metrics.incr('single_flight.leaders')
+        try:
+            if config['CROSS_WORKER']:
+                call.result = _run_cross_worker(key, fn, config, timeout)
+            else:
+                call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+def _run_cross_worker(key: str, fn, config: dict, timeout: float):
+    """
+    Coordinate with other worker processes through the cache
+
+    cache.add() acts as the lock: the worker that adds it calls upstream and
+    publishes the result; the others poll for it. Use a shared backend
+    (database, Redis, Memcached) for the lock to be meaningful across hosts.
+    """
+    cache = caches[config['ALIAS']]
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    lock_key = f'singleflight:lock:{digest}'
+    result_key = f'singleflight:result:{digest}'
+
+    if cache.add(lock_key, 1, timeout=config['LOCK_TIMEOUT']):
+        try:
+            result = fn()
+            cache.set(result_key, result, timeout=config['RESULT_TTL'])
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    metrics.incr('single_flight.cross_worker_waits')
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = cache.get(result_key)
+        if result is not None:
+            metrics.incr('single_flight.cross_worker_shared')
+            return result
+        if cache.get(lock_key) is None:
+            # Leader finished without publishing (it failed) - re-check once, then go ourselves
+            result = cache.get(result_key)
+            if result is not None:
+                return result
+            break
+        time.sleep(config['POLL_INTERVAL'])
+
+    print(f"[SINGLE FLIGHT] No shared result for {digest[:12]}, calling upstream directly")
+    return fn()
+
+
+# Process-wide instance
+single_flight = SingleFlight()
+
+
+def make_call_key(name: str, args, kwargs) -> str:
+    """Build a stable key from a function name and its arguments"""
+    payload = json.dumps([args, kwargs], sort_keys=True, default=str, ensure_ascii=False)
+    return f'{name}:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def coalesced(name: str):
+    """
+    Decorator: coalesce concurrent calls with identical arguments
+
+    Usage:
+        @coalesced('quiz')
+        def generate_quiz_questions(topic, num_questions=10, ...):
+            ...
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = make_call_key(name, args, kwargs)
+            return single_flight.do(key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded', function () {
     setupVoiceInput();
     setupDropdownClose();
     setupTTSEventDelegation();
+    setupHistoryScroll();
 });
 
 // Setup event delegation for TTS read buttons
@@ -316,6 +317,11 @@ function addMessage(role, content) {
     const welcome = container.querySelector('.welcome-screen');
     if (welcome) welcome.style.display = 'none';
 
+    container.appendChild(createMessageElement(role, content));
+    container.scrollTop = container.scrollHeight;
+}
+
+function createMessageElement(role, content) {
     const div = document.createElement('div');
     div.className = `message ${role}`;
 
@@ -346,41 +352,65 @@ function addMessage(role, content) {
         </div>
     `;
 
-    container.appendChild(div);
-    container.scrollTop = container.scrollHeight;
+    return div;
 }
 
 // ===== 5. Chat History =====
-async function loadChats() {
+function renderChatItem(chat) {
+    return `
+        <div class="chat-item ${chat.id === currentChatId ? 'active' : ''}" onclick="loadChat(${chat.id})">
+            <div class="chat-item-content">
+                <h4>${chat.name}</h4>
+                <p>${chat.updated_at}</p>
+            </div>
+            <div class="chat-actions">
+                <button onclick="event.stopPropagation(); renameChat(${chat.id})" title="Rename"><i class="fas fa-pen"></i></button>
+                <button onclick="event.stopPropagation(); downloadChatAsPDF(${chat.id})" title="Download PDF"><i class="fas fa-file-pdf"></i></button>
+                <button onclick="event.stopPropagation(); deleteChat(${chat.id})" title="Delete"><i class="fas fa-trash"></i></button>
+            </div>
+        </div>
+    `;
+}
+
+// The sidebar shows the newest page of chats; "Load more" appends the next page
+async function loadChats(before = null) {
     try {
-        const res = await fetch('/api/chats/');
+        const res = await fetch('/api/chats/' + (before ? `?before=${before}` : ''));
         const data = await res.json();
         const list = document.getElementById('chatList');
+        const chats = data.chats || [];
 
-        if (data.chats && data.chats.length) {
-            list.innerHTML = data.chats.map(chat => `
-                <div class="chat-item ${chat.id === currentChatId ? 'active' : ''}" onclick="loadChat(${chat.id})">
-                    <div class="chat-item-content">
-                        <h4>${chat.name}</h4>
-                        <p>${chat.updated_at}</p>
-                    </div>
-                    <div class="chat-actions">
-                        <button onclick="event.stopPropagation(); renameChat(${chat.id})" title="Rename"><i class="fas fa-pen"></i></button>
-                        <button onclick="event.stopPropagation(); downloadChatAsPDF(${chat.id})" title="Download PDF"><i class="fas fa-file-pdf"></i></button>
-                        <button onclick="event.stopPropagation(); deleteChat(${chat.id})" title="Delete"><i class="fas fa-trash"></i></button>
-                    </div>
-                </div>
-            `).join('');
-        } else {
+        const moreButton = list.querySelector('.load-more-chats');
+        if (moreButton) moreButton.remove();
+
+        if (!before && chats.length === 0) {
             list.innerHTML = '<div class="empty-history"><p>No chats</p></div>';
+            return;
+        }
+
+        const html = chats.map(renderChatItem).join('');
+        if (before) {
+            list.insertAdjacentHTML('beforeend', html);
+        } else {
+            list.innerHTML = html;
+        }
+        if (data.has_more) {
+            list.insertAdjacentHTML('beforeend', `
+                <button class="btn-secondary load-more-chats" onclick="loadChats(${data.next_cursor})">Load more</button>
+            `);
         }
     } catch (error) {
         console.error('Error loading chats:', error);
     }
 }
 
+// Chat history is loaded a page at a time; older pages load on scrolling to the top
+let olderMessagesCursor = null;
+let loadingOlderMessages = false;
+
 async function loadChat(chatId) {
     currentChatId = chatId;
+    olderMessagesCursor = null;
     const res = await fetch(`/api/chat/${chatId}/messages/`);
     const data = await res.json();
 
@@ -393,13 +423,49 @@ async function loadChat(chatId) {
             addMessage(msg.role, msg.content);
         });
     }
+    olderMessagesCursor = data.has_more ? data.next_cursor : null;
 
     // Update active state in sidebar
     loadChats();
 }
 
+async function loadOlderMessages() {
+    if (!currentChatId || !olderMessagesCursor || loadingOlderMessages) return;
+    loadingOlderMessages = true;
+    const chatId = currentChatId;
+
+    try {
+        const res = await fetch(`/api/chat/${chatId}/messages/?before=${olderMessagesCursor}`);
+        const data = await res.json();
+        if (chatId !== currentChatId) return;
+
+        // Prepend without moving the messages the user is looking at
+        const container = document.getElementById('chatMessages');
+        const previousHeight = container.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        (data.messages || []).forEach(msg => fragment.appendChild(createMessageElement(msg.role, msg.content)));
+        container.insertBefore(fragment, container.firstChild);
+        container.scrollTop += container.scrollHeight - previousHeight;
+
+        olderMessagesCursor = data.has_more ? data.next_cursor : null;
+    } catch (error) {
+        console.error('Error loading older messages:', error);
+    } finally {
+        loadingOlderMessages = false;
+    }
+}
+
+function setupHistoryScroll() {
+    const container = document.getElementById('chatMessages');
+    if (!container) return;
+    container.addEventListener('scroll', () => {
+        if (container.scrollTop < 80) loadOlderMessages();
+    });
+}
+
 function createNewChat() {
     currentChatId = null;
+    olderMessagesCursor = null;
     document.getElementById('chatMessages').innerHTML = `
         <div class="welcome-screen">
             <div class="welcome-icon"><i class="fas fa-graduation-cap"></i></div>
@@ -499,10 +565,19 @@ async function deleteChat(chatId) {
 
 async function downloadChatAsPDF(chatId) {
     try {
-        const res = await fetch(`/api/chat/${chatId}/messages/`);
-        const data = await res.json();
-
-        if (!data.messages || data.messages.length === 0) {
+        // Page back through the whole history
+        const messages = [];
+        let cursor = null;
+        do {
+            const query = cursor ? `?limit=200&before=${cursor}` : '?limit=200';
+            const res = await fetch(`/api/chat/${chatId}/messages/${query}`);
+            const page = await res.json();
+            messages.unshift(...(page.messages || []));
+            cursor = page.has_more ? page.next_cursor : null;
+        } while (cursor);
+        const data = { messages: messages };
+
+        if (data.messages.length === 0) {
             alert('No messages to download');
             return;
         }
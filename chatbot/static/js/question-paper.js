@@ -51,6 +51,41 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     });
 
+    // Previously uploaded documents and papers can be reused without uploading again
+    const existingDocument = document.getElementById('existing-document');
+    const existingPapers = document.getElementById('existing-papers');
+
+    function loadDocuments(before) {
+        fetch('/api/documents/?limit=200' + (before ? `&before=${before}` : ''))
+            .then(response => response.json())
+            .then(data => {
+                (data.documents || []).forEach(doc => {
+                    existingDocument.add(new Option(doc.title, doc.id));
+                });
+                if (data.has_more) loadDocuments(data.next_cursor);
+            })
+            .catch(error => console.error('Failed to load documents:', error));
+    }
+
+    loadDocuments(null);
+
+    function loadPreviousPapers() {
+        const subject = document.getElementById('prev-subject').value.trim();
+        fetch('/api/question-paper/previous-papers/?subject=' + encodeURIComponent(subject))
+            .then(response => response.json())
+            .then(data => {
+                existingPapers.innerHTML = '';
+                (data.papers || []).forEach(paper => {
+                    const label = `${paper.subject} ${paper.year || ''} - ${paper.file_name} (${paper.questions} questions)`;
+                    existingPapers.add(new Option(label, paper.id));
+                });
+            })
+            .catch(error => console.error('Failed to load previous papers:', error));
+    }
+
+    loadPreviousPapers();
+    document.getElementById('prev-subject').addEventListener('change', loadPreviousPapers);
+
     // File upload display
     const previousPapersInput = document.getElementById('previous-papers');
     const fileList = document.getElementById('file-list');
@@ -88,11 +123,14 @@ document.addEventListener('DOMContentLoaded', function () {
             formData.append('topic', topic);
         } else {
             const docFile = document.getElementById('document').files[0];
-            if (!docFile) {
-                alert('Please upload a document');
+            if (existingDocument.value) {
+                formData.append('document_id', existingDocument.value);
+            } else if (docFile) {
+                formData.append('document', docFile);
+            } else {
+                alert('Please upload or select a document');
                 return;
             }
-            formData.append('document', docFile);
         }
 
         // Get and parse requirements
@@ -150,11 +188,14 @@ document.addEventListener('DOMContentLoaded', function () {
         formData.append('subject', subject);
 
         const files = previousPapersInput.files;
-        if (files.length === 0) {
-            alert('Please upload at least one previous paper');
+        const paperIds = Array.from(existingPapers.selectedOptions).map(option => option.value);
+        if (files.length === 0 && paperIds.length === 0) {
+            alert('Please upload or select at least one previous paper');
             return;
         }
 
+        paperIds.forEach(id => formData.append('previous_paper_id', id));
+
         Array.from(files).forEach(file => {
             formData.append('previous_papers', file);
         });
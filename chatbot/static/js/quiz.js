@@ -72,6 +72,8 @@ function showQuizStep(stepId) {
 }
 
 function resetQuiz() {
+    clearTimeout(quizPollTimer);
+    waitingForQuestion = false;
     currentQuiz = null;
     currentQuestionIndex = 0;
     quizData = [];
@@ -99,8 +101,15 @@ async function showExistingDocuments() {
 
     // Fetch existing documents
     try {
-        const response = await fetch('/api/documents/');
-        const data = await response.json();
+        // Page through the document list
+        const data = { documents: [] };
+        let cursor = null;
+        do {
+            const response = await fetch('/api/documents/?limit=200' + (cursor ? `&before=${cursor}` : ''));
+            const page = await response.json();
+            data.documents.push(...(page.documents || []));
+            cursor = page.has_more ? page.next_cursor : null;
+        } while (cursor);
 
         const container = document.getElementById('existingDocsContainer');
 
@@ -145,34 +154,16 @@ function selectDocumentForQuiz(documentId, title) {
     showQuizStep('quizLoading');
     document.querySelector('#quizLoading p').textContent = `Generating ${numQuestions} questions from document...`;
 
-    fetch('/api/quiz/generate/', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-            source_type: 'document',
-            topic: title,
-            num_questions: parseInt(numQuestions),
-            document_id: documentId
-        })
-    })
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === 'success') {
-                currentQuiz = data.quiz;
-                quizData = data.questions;
-                currentQuestionIndex = 0;
-                userAnswers = new Array(quizData.length).fill(null);
-                showQuestion();
-            } else {
-                alert('Error generating quiz: ' + data.message);
-                closeQuizModal();
-            }
-        })
-        .catch(error => {
-            console.error('Error:', error);
-            alert('Failed to generate quiz');
-            closeQuizModal();
-        });
+    startProgressiveQuiz({
+        source_type: 'document',
+        topic: title,
+        num_questions: parseInt(numQuestions),
+        document_id: documentId
+    }).catch(error => {
+        console.error('Error:', error);
+        alert('Error generating quiz: ' + error.message);
+        closeQuizModal();
+    });
 }
 
 function showNewDocumentUpload() {
@@ -230,34 +221,16 @@ function generateQuizFromUploadedDocs() {
     showQuizStep('quizLoading');
     document.querySelector('#quizLoading p').textContent = 'Generating quiz from uploaded documents...';
 
-    fetch('/api/quiz/generate/', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-            source_type: 'document',
-            topic: 'Quiz from uploaded documents',
-            num_questions: 10,
-            document_id: documentId
-        })
-    })
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === 'success') {
-                currentQuiz = data.quiz;
-                quizData = data.questions;
-                currentQuestionIndex = 0;
-                userAnswers = new Array(quizData.length).fill(null);
-                showQuestion();
-            } else {
-                alert('Error generating quiz: ' + data.message);
-                closeQuizModal();
-            }
-        })
-        .catch(error => {
-            console.error('Error:', error);
-            alert('Failed to generate quiz');
-            closeQuizModal();
-        });
+    startProgressiveQuiz({
+        source_type: 'document',
+        topic: 'Quiz from uploaded documents',
+        num_questions: 10,
+        document_id: documentId
+    }).catch(error => {
+        console.error('Error:', error);
+        alert('Error generating quiz: ' + error.message);
+        closeQuizModal();
+    });
 }
 
 
@@ -366,51 +339,142 @@ async function generateQuiz() {
     try {
         const documentId = quizSource === 'document' ? document.getElementById('documentSelect').value : null;
 
-        const response = await fetch('/api/quiz/generate/', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                source_type: quizSource,
-                topic: topic,
-                num_questions: numQuestions,
-                document_id: documentId
-            })
+        await startProgressiveQuiz({
+            source_type: quizSource,
+            topic: topic,
+            num_questions: numQuestions,
+            document_id: documentId
         });
+    } catch (error) {
+        console.error('Error:', error);
+        alert('Error generating quiz: ' + error.message);
+        closeQuizModal();
+    }
+}
 
+// ===== Progressive Generation =====
+// The quiz is generated in the background; questions are polled as they appear
+const QUIZ_POLL_INTERVAL = 1000;
+// Give up after 6 minutes; the server marks a stalled quiz failed after 5 (PROGRESSIVE_QUIZ STALE_AFTER)
+const QUIZ_MAX_POLLS = 360;
+let quizPollTimer = null;
+let quizPollCount = 0;
+let waitingForQuestion = false;
+
+async function startProgressiveQuiz(body) {
+    const response = await fetch('/api/quiz/start/', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+
+    const data = await response.json();
+    if (data.status !== 'success') {
+        throw new Error(data.message || 'Failed to start quiz');
+    }
+
+    currentQuiz = data.quiz;
+    quizData = data.questions || [];
+    currentQuestionIndex = 0;
+    userAnswers = new Array(quizData.length).fill(null);
+
+    if (currentQuiz.generation_status !== 'generating') {
+        // Served from the pre-generated question pool - nothing to wait for
+        showQuestion();
+        return;
+    }
+    waitingForQuestion = true;
+    quizPollCount = 0;
+    pollQuizQuestions();
+}
+
+async function pollQuizQuestions() {
+    if (!currentQuiz) return;
+    const quiz = currentQuiz;
+
+    try {
+        const response = await fetch(`/api/quiz/${quiz.id}/questions/?after=${quizData.length - 1}`);
         const data = await response.json();
 
+        // The quiz was closed or replaced while the request was in flight
+        if (currentQuiz !== quiz) return;
+
         if (data.status === 'success') {
-            currentQuiz = data.quiz;
-            quizData = data.questions;
-            currentQuestionIndex = 0;
-            userAnswers = new Array(quizData.length).fill(null);
-            showQuestion();
-        } else {
-            alert('Error generating quiz: ' + data.message);
-            closeQuizModal();
+            quizData.push(...data.questions);
+            while (userAnswers.length < quizData.length) userAnswers.push(null);
+            quiz.generation_status = data.generation_status;
+            quiz.total_questions = data.total_questions;
+
+            if (data.generation_status === 'failed' && quizData.length === 0) {
+                alert('Error generating quiz: ' + data.message);
+                closeQuizModal();
+                return;
+            }
+
+            if (waitingForQuestion && (currentQuestionIndex < quizData.length || data.generation_status !== 'generating')) {
+                waitingForQuestion = false;
+                showQuestion();
+            } else if (!waitingForQuestion) {
+                updateQuizProgress();
+            }
         }
     } catch (error) {
-        console.error('Error:', error);
-        alert('Failed to generate quiz');
+        console.error('Error polling quiz questions:', error);
+    }
+
+    if (currentQuiz !== quiz || quiz.generation_status !== 'generating') return;
+
+    quizPollCount++;
+    if (quizPollCount < QUIZ_MAX_POLLS) {
+        quizPollTimer = setTimeout(pollQuizQuestions, QUIZ_POLL_INTERVAL);
+        return;
+    }
+
+    // Generation never finished - let the student finish what arrived
+    quiz.generation_status = 'failed';
+    if (quizData.length === 0) {
+        alert('Quiz generation is taking too long. Please try again.');
         closeQuizModal();
+    } else if (waitingForQuestion) {
+        waitingForQuestion = false;
+        showQuestion();
+    } else {
+        updateQuizProgress();
     }
 }
 
+function quizTotal() {
+    // While generating, show the requested count rather than what has arrived so far
+    if (currentQuiz && currentQuiz.generation_status === 'generating') {
+        return Math.max(currentQuiz.total_questions, quizData.length);
+    }
+    return quizData.length;
+}
+
+function updateQuizProgress() {
+    const progress = (currentQuestionIndex / quizTotal()) * 100;
+    document.getElementById('quizProgressBar').style.width = progress + '%';
+    document.getElementById('currentQuestionNum').textContent = currentQuestionIndex + 1;
+    document.getElementById('totalQuestions').textContent = quizTotal();
+}
+
 function showQuestion() {
     if (currentQuestionIndex >= quizData.length) {
+        if (currentQuiz && currentQuiz.generation_status === 'generating') {
+            // Answered everything generated so far - wait for the next question
+            waitingForQuestion = true;
+            document.querySelector('#quizLoading p').textContent = 'Generating the next question...';
+            showQuizStep('quizLoading');
+            return;
+        }
         completeQuiz();
         return;
     }
 
     const question = quizData[currentQuestionIndex];
 
-    // Update progress
-    const progress = ((currentQuestionIndex) / quizData.length) * 100;
-    document.getElementById('quizProgressBar').style.width = progress + '%';
-
-    // Update counter
-    document.getElementById('currentQuestionNum').textContent = currentQuestionIndex + 1;
-    document.getElementById('totalQuestions').textContent = quizData.length;
+    // Update progress and counter
+    updateQuizProgress();
 
     // Show question
     document.getElementById('quizQuestionText').textContent = question.question;
@@ -444,46 +508,40 @@ function selectOption(optionIndex) {
     document.getElementById('quizNextBtn').disabled = false;
 }
 
-async function nextQuestion() {
-    // Submit current answer
-    const question = quizData[currentQuestionIndex];
-    const userAnswer = userAnswers[currentQuestionIndex];
-
-    try {
-        const response = await fetch(`/api/quiz/${currentQuiz.id}/submit/`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                question_id: question.id,
-                answer: userAnswer
-            })
-        });
-
-        const data = await response.json();
-
-        if (data.status === 'success') {
-            // Store evaluation result
-            quizData[currentQuestionIndex].is_correct = data.is_correct;
-            quizData[currentQuestionIndex].explanation = data.explanation;
-        }
-    } catch (error) {
-        console.error('Error submitting answer:', error);
-    }
-
+function nextQuestion() {
+    // Answers are kept client-side and scored together when the quiz ends
     currentQuestionIndex++;
     showQuestion();
 }
 
 async function completeQuiz() {
+    const answers = {};
+    quizData.forEach((question, index) => {
+        if (userAnswers[index] !== undefined) {
+            answers[question.id] = userAnswers[index];
+        }
+    });
+
     try {
-        const response = await fetch(`/api/quiz/${currentQuiz.id}/complete/`, {
+        const response = await fetch(`/api/quiz/${currentQuiz.id}/submit-all/`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ answers: answers })
         });
 
         const data = await response.json();
 
         if (data.status === 'success') {
+            // Store evaluation results
+            const results = {};
+            data.results.forEach(result => { results[result.id] = result; });
+            quizData.forEach(question => {
+                const result = results[question.id];
+                if (result) {
+                    question.is_correct = result.is_correct;
+                    question.explanation = result.explanation;
+                }
+            });
             showResults(data);
         }
     } catch (error) {
@@ -505,7 +563,11 @@ function showResults(data) {
     if (wrongAnswers.length === 0) {
         wrongContainer.innerHTML = '<p style="text-align: center; color: var(--success);">Perfect score! 🎉</p>';
     } else {
-        wrongContainer.innerHTML = wrongAnswers.map((q, index) => `
+        wrongContainer.innerHTML = (wrongAnswers.length > 1 ? `
+            <button class="btn-learn" onclick="addAllToLearning()">
+                <i class="fas fa-layer-group"></i> Add All to Learning Track
+            </button>
+        ` : '') + wrongAnswers.map((q, index) => `
             <div class="quiz-wrong-answer-item">
                 <h4>Question ${quizData.indexOf(q) + 1}</h4>
                 <p style="margin-bottom: 1rem;">${q.question}</p>
@@ -675,6 +737,39 @@ async function addToLearning(questionIndex) {
     }
 }
 
+async function addAllToLearning() {
+    const items = quizData
+        .map((q, index) => ({ q, index }))
+        .filter(({ q }) => !q.is_correct)
+        .map(({ q, index }) => ({
+            question: q.question,
+            correct_answer: q.correct_answer,
+            user_wrong_answer: userAnswers[index],
+            explanation: q.explanation
+        }));
+
+    try {
+        // One request (and one database transaction) for every wrong answer
+        const response = await fetch('/api/learning/add/', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                quiz_id: currentQuiz.id,
+                topic: currentQuiz.topic,
+                items: items
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.status === 'success') {
+            alert(`Added ${data.item_ids.length} questions to learning track!`);
+        }
+    } catch (error) {
+        console.error('Error adding to learning:', error);
+    }
+}
+
 async function markAsLearned(itemId) {
     try {
         const response = await fetch(`/api/learning/${itemId}/learned/`, {
@@ -0,0 +1,216 @@
+"""
+Token budgeting for prompt assembly
+Estimates token counts per model family and packs instructions, context and
+history into the per-model input budget declared on AIModel.
+"""
+from functools import lru_cache
+
+# Calibrated characters-per-token for English course material, per model family
+CHARS_PER_TOKEN = {
+    'llama': 4.0,      # Llama 3 (128k vocabulary)
+    'gemini': 4.0,
+    'mixtral': 3.5,    # 32k vocabulary splits words more often
+    'gemma': 3.8,
+    'distilgpt2': 3.8,
+    'default': 3.6,    # Unknown family - err on the side of more tokens
+}
+
+# Fallback limits for models missing from the database: (context_window, input_token_budget)
+DEFAULT_LIMITS = {
+    'llama-3.1-8b-instant': (131072, 6000),
+    'llama-3.3-70b-versatile': (131072, 8000),
+    'mixtral-8x7b-32768': (32768, 8000),
+    'gemini-2.5-flash': (1048576, 16000),
+    'gemini-2.0-flash-exp': (1048576, 16000),
+    'gemini-2.0-flash-lite': (1048576, 12000),
+    'distilgpt2': (1024, 512),
+}
+FALLBACK_LIMITS = (8192, 4000)
+
+# Per-message framing tokens added by chat templates
+MESSAGE_OVERHEAD = 4
+# Headroom for estimation error
+SAFETY_MARGIN = 64
+
+_tiktoken_encoding = None
+_tiktoken_checked = False
+
+
+def model_family(model_id: str) -> str:
+    """Map a model id onto a tokenizer family"""
+    model_id = (model_id or '').lower()
+    for family in ('llama', 'gemini', 'mixtral', 'gemma', 'distilgpt2'):
+        if family in model_id:
+            return family
+    return 'default'
+
+
+def _get_tiktoken():
+    """Optional exact tokenizer - used only if tiktoken is installed"""
+    global _tiktoken_encoding, _tiktoken_checked
+    if not _tiktoken_checked:
+        _tiktoken_checked = True
+        try:
+            import tiktoken
+            _tiktoken_encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _tiktoken_encoding = None
+    return _tiktoken_encoding
+
+
+@lru_cache(maxsize=8192)
+def _estimate_cached(text: str, family: str) -> int:
+    return _estimate(text, family)
+
+
+def _estimate(text: str, family: str) -> int:
+    encoding = _get_tiktoken()
+    if encoding is not None and family in ('llama', 'default'):
+        return len(encoding.encode(text, disallowed_special=()))
+    by_chars = len(text) / CHARS_PER_TOKEN[family]
+    by_words = len(text.split()) * 1.3
+    return int(max(by_chars, by_words)) + 1
+
+
+def estimate_tokens(text: str, model_id: str = '') -> int:
+    """
+    Estimate the number of tokens text occupies for a model
+
+    Short strings (chunks, history messages) are memoised since the same
+    pieces are counted on every chat turn.
+    """
+    if not text:
+        return 0
+    family = model_family(model_id)
+    if len(text) <= 4000:
+        return _estimate_cached(text, family)
+    return _estimate(text, family)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model_id: str = '') -> str:
+    """Cut text to roughly max_tokens, preferring a whitespace boundary"""
+    if max_tokens <= 0:
+        return ''
+    if estimate_tokens(text, model_id) <= max_tokens:
+        return text
+    cut = int(max_tokens * CHARS_PER_TOKEN[model_family(model_id)])
+    # Shrink until the estimate fits (word-heavy text can need a second pass)
+    while cut > 0:
+        candidate = text[:cut]
+        boundary = candidate.rfind(' ')
+        if boundary > cut * 0.8:
+            candidate = candidate[:boundary]
+        if estimate_tokens(candidate, model_id) <= max_tokens:
+            return candidate
+        cut = int(cut * 0.9)
+    return ''
+
+
+def get_model_limits(model_id: str, ai_model=None):
+    """
+    Look up (context_window, input_token_budget) for a model
+
+    Args:
+        model_id: API model identifier
+        ai_model: Optional AIModel instance the caller already loaded
+    """
+    if ai_model is None:
+        from .models import AIModel
+        ai_model = AIModel.objects.filter(model_id=model_id).only(
+            'context_window', 'input_token_budget'
+        ).first()
+    if ai_model is not None:
+        return ai_model.context_window, ai_model.input_token_budget
+    return DEFAULT_LIMITS.get(model_id, FALLBACK_LIMITS)
+
+
+class TokenBudget:
+    """
+    Greedy packer for prompt sections
+
+    Required sections are reserved first, then optional ones are taken in
+    priority order until the budget runs out.
+
+    Usage:
+        budget = TokenBudget.for_model('llama-3.1-8b-instant', max_output_tokens=1024)
+        budget.reserve(instructions)
+        chunks = budget.take(chunks)
+    """
+
+    def __init__(self, model_id: str, limit: int):
+        self.model_id = model_id
+        self.limit = max(limit, 0)
+        self.used = 0
+
+    @classmethod
+    def for_model(cls, model_id: str, max_output_tokens: int = 1024, ai_model=None):
+        context_window, input_budget = get_model_limits(model_id, ai_model)
+        limit = min(input_budget, context_window - max_output_tokens - SAFETY_MARGIN)
+        return cls(model_id, limit)
+
+    @property
+    def remaining(self) -> int:
+        return max(self.limit - self.used, 0)
+
+    def count(self, text: str) -> int:
+        return estimate_tokens(text, self.model_id) + MESSAGE_OVERHEAD
+
+    def reserve(self, text: str) -> int:
+        """Account for a section that must be sent regardless of size"""
+        tokens = self.count(text)
+        self.used += tokens
+        return tokens
+
+    def take(self, items, text_of=lambda item: item):
+        """
+        Take items in the given (priority) order while they fit
+
+        Items that do not fit are skipped so a smaller one later in the
+        list can still use the remaining space (retrieved chunks).
+        """
+        taken = []
+        for item in items:
+            tokens = self.count(text_of(item))
+            if tokens <= self.remaining:
+                taken.append(item)
+                self.used += tokens
+        return taken
+
+    def take_while_fits(self, items, text_of=lambda item: item):
+        """
+        Take items in the given order up to the first one that does not fit
+
+        For chat history taken newest first: skipping a long message and
+        sending older ones would leave a hole in the conversation.
+        """
+        taken = []
+        for item in items:
+            tokens = self.count(text_of(item))
+            if tokens > self.remaining:
+                break
+            taken.append(item)
+            self.used += tokens
+        return taken
+
+    def fit(self, text: str) -> str:
+        """Truncate text to the remaining budget and account for it"""
+        fitted = truncate_to_tokens(text, self.remaining - MESSAGE_OVERHEAD, self.model_id)
+        self.used += self.count(fitted) if fitted else 0
+        return fitted
+
+
+def fit_text_for_model(text: str, model_id: str, max_output_tokens: int = 1024, reserved_tokens: int = 500) -> str:
+    """
+    Truncate source material to the model's input budget
+
+    Replaces fixed character slices like content[:8000].
+
+    Args:
+        text: Source material to embed in a prompt
+        model_id: Model that will receive the prompt
+        max_output_tokens: Completion tokens requested from the model
+        reserved_tokens: Tokens kept free for the surrounding instructions
+    """
+    budget = TokenBudget.for_model(model_id, max_output_tokens=max_output_tokens)
+    budget.used += reserved_tokens
+    return budget.fit(text)
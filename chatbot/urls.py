@@ -27,6 +27,9 @@ urlpatterns = [
     # Wikipedia API
     path('api/wikipedia/', views.wikipedia_api, name='wikipedia_api'),
     
+    # LLM layer metrics
+    path('api/metrics/', views.metrics_api, name='metrics_api'),
+    
     # Document deletion
     path('api/documents/<int:document_id>/delete/', views.delete_document, name='delete_document'),
     
@@ -34,7 +37,10 @@ urlpatterns = [
     path('quiz-analytics/', quiz_views.quiz_analytics_page, name='quiz_analytics'),
     path('api/quiz/analytics/', quiz_views.get_quiz_analytics, name='get_quiz_analytics'),
     path('api/quiz/generate/', quiz_views.generate_quiz, name='generate_quiz'),
+    path('api/quiz/start/', quiz_views.start_quiz, name='start_quiz'),
+    path('api/quiz/<int:quiz_id>/questions/', quiz_views.get_quiz_questions, name='get_quiz_questions'),
     path('api/quiz/<int:quiz_id>/submit/', quiz_views.submit_quiz_answer, name='submit_quiz_answer'),
+    path('api/quiz/<int:quiz_id>/submit-all/', quiz_views.submit_quiz_answers, name='submit_quiz_answers'),
     path('api/quiz/<int:quiz_id>/complete/', quiz_views.complete_quiz, name='complete_quiz'),
     
     # Learning Track endpoints
@@ -51,11 +57,13 @@ urlpatterns = [
     path('api/quiz/extract-headings/', quiz_views.extract_headings, name='extract_headings'),
     path('api/quiz/generate-from-headings/', quiz_views.generate_quiz_from_headings_api, name='generate_quiz_from_headings'),
     path('api/quiz/submit-instant/', quiz_views.submit_quiz_instant, name='submit_quiz_instant'),
+    path('api/documents/<int:document_id>/question-pool/', quiz_views.document_question_pool, name='document_question_pool'),
     
     # Question Paper endpoints
     path('question-paper/', question_paper_views.question_paper_home, name='question_paper'),
     path('api/question-paper/generate/', question_paper_views.generate_important_questions, name='generate_important_questions'),
     path('api/question-paper/predict/', question_paper_views.predict_questions, name='predict_questions'),
+    path('api/question-paper/previous-papers/', question_paper_views.list_previous_papers, name='list_previous_papers'),
     path('api/question-paper/<int:paper_id>/export/', question_paper_views.export_pdf, name='export_question_paper'),
     path('question-paper/<int:paper_id>/', question_paper_views.view_paper, name='view_paper'),
     path('question-paper/<int:paper_id>/learn/', question_paper_views.learn_mode, name='learn_mode'),
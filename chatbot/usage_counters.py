@@ -0,0 +1,171 @@
+"""
+Write-coalesced ModelUsage prompt counters
+Every chat message used to read, increment and save its ModelUsage row -
+racy under concurrency, and with anonymous users sharing the 'default'
+session key every request wrote the same row. Increments are now buffered
+in-process and flushed in one transaction with F() expressions (so counts
+from several workers add up), either every FLUSH_EVERY prompts, by a timer
+FLUSH_INTERVAL seconds after the first unflushed prompt, or at exit. The feedback check reads the buffered
+count, so it stays exact for this process without a write per prompt.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import ModelUsage
+
+DEFAULT_CONFIG = {
+    'BUFFERED': True,         # False writes every increment straight through with F()
+    'FLUSH_EVERY': 50,        # Buffered prompts that trigger a flush
+    'FLUSH_INTERVAL': 10,     # Seconds after which pending prompts are flushed, even without new traffic
+    'FEEDBACK_EVERY': 10,     # Prompts between feedback requests
+}
+
+_lock = threading.Lock()
+# Flushes and row reads are serialised so a read never misses a flush in progress
+_flush_lock = threading.Lock()
+_pending = Counter()          # (session_key, model pk) -> prompts not yet written
+_known = {}                   # (session_key, model pk) -> [prompt_count, last_feedback_at] as last written
+_last_flush = time.monotonic()
+_generation = 0               # Bumped by every flush
+_timer = None                 # Pending FLUSH_INTERVAL flush, if any
+
+
+def get_config() -> dict:
+    """Merge USAGE_COUNTERS settings over defaults"""
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'USAGE_COUNTERS', {}))
+    return config
+
+
+def _load(key):
+    """Stored [prompt_count, last_feedback_at] for a key ([0, 0] if it has no row yet)"""
+    session_key, model_pk = key
+    with _flush_lock:
+        row = ModelUsage.objects.filter(session_key=session_key, model_id=model_pk).values_list(
+            'prompt_count', 'last_feedback_at'
+        ).first()
+    return list(row) if row else [0, 0]
+
+
+def record_prompt(session_key: str, ai_model):
+    """
+    Count one prompt for a session and model
+
+    Returns:
+        (prompt_count, need_feedback)
+    """
+    config = get_config()
+    key = (session_key, ai_model.pk)
+    if not config['BUFFERED']:
+        _write({key: 1})
+        prompt_count, last_feedback_at = _load(key)
+        return prompt_count, prompt_count - last_feedback_at >= config['FEEDBACK_EVERY']
+
+    while True:
+        with _lock:
+            stored = _known.get(key)
+            if stored is not None:
+                _pending[key] += 1
+                prompt_count = stored[0] + _pending[key]
+                last_feedback_at = stored[1]
+                due = (sum(_pending.values()) >= config['FLUSH_EVERY']
+                       or time.monotonic() - _last_flush >= config['FLUSH_INTERVAL'])
+                if not due:
+                    _schedule_flush(config['FLUSH_INTERVAL'])
+                break
+            generation = _generation
+        loaded = _load(key)
+        with _lock:
+            # A row read while a flush was writing is stale - read it again
+            if generation == _generation:
+                _known.setdefault(key, loaded)
+    metrics.incr('usage_counters.buffered')
+
+    if due:
+        flush()
+    return prompt_count, prompt_count - last_feedback_at >= config['FEEDBACK_EVERY']
+
+
+def _schedule_flush(interval):
+    """Start the flush timer unless one is pending (call with _lock held)"""
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(interval, _timed_flush)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _timed_flush():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    finally:
+        # The timer thread must not hold on to database connections
+        connections.close_all()
+
+
+def _write(increments: dict):
+    """Add increments to their rows in one transaction, creating missing rows"""
+    now = timezone.now()
+    with transaction.atomic():
+        ModelUsage.objects.bulk_create(
+            [ModelUsage(session_key=session_key, model_id=model_pk) for session_key, model_pk in increments],
+            ignore_conflicts=True
+        )
+        for (session_key, model_pk), amount in increments.items():
+            ModelUsage.objects.filter(session_key=session_key, model_id=model_pk).update(
+                prompt_count=F('prompt_count') + amount, updated_at=now
+            )
+
+
+def flush():
+    """Write buffered prompt counts to the database"""
+    global _last_flush, _generation, _timer
+    with _flush_lock:
+        with _lock:
+            if _timer is not None:
+                _timer.cancel()
+                _timer = None
+            increments = dict(_pending)
+            _pending.clear()
+            # Rows are re-read after the write, picking up other workers' prompts
+            _known.clear()
+            _generation += 1
+            _last_flush = time.monotonic()
+        if not increments:
+            return 0
+        try:
+            _write(increments)
+        except Exception as e:
+            # Keep the counts for the next flush rather than losing them
+            with _lock:
+                _pending.update(increments)
+            print(f"[USAGE] Flush of {len(increments)} counters failed: {type(e).__name__}: {e}")
+            return 0
+    metrics.incr('usage_counters.flushes')
+    metrics.incr('usage_counters.flushed', sum(increments.values()))
+    return sum(increments.values())
+
+
+def mark_feedback(session_key: str, ai_model):
+    """Reset the feedback countdown of a session and model after feedback was given"""
+    global _generation
+    flush()
+    ModelUsage.objects.filter(session_key=session_key, model=ai_model).update(last_feedback_at=F('prompt_count'))
+    with _lock:
+        _known.pop((session_key, ai_model.pk), None)
+        _generation += 1
+
+
+@atexit.register
+def _flush_on_exit():
+    flush()
@@ -1,6 +1,7 @@
 """
 Utility functions for RAG (Retrieval-Augmented Generation) system
 """
+import json
 import os
 import pickle
 from pathlib import Path
@@ -11,6 +12,7 @@ from pptx import Presentation
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import numpy as np
 from django.conf import settings
+from .llm_scheduler import RateLimitExceeded
 
 # API clients - initialized lazily to avoid import-time errors
 _groq_client = None
@@ -22,7 +24,7 @@ VECTOR_STORE_DIR = Path(settings.MEDIA_ROOT) / 'vector_stores'
 VECTOR_STORE_DIR.mkdir(exist_ok=True, parents=True)
 
 
-def call_llm_api(model_id, messages, temperature=0.7, max_tokens=1024):
+def call_llm_api(model_id, messages, temperature=0.7, max_tokens=1024, cache_policy=None, priority=None, deadline=None):
     """
     Call LLM API for chat completions - supports both Gemini and Groq providers
     
@@ -31,31 +33,100 @@ def call_llm_api(model_id, messages, temperature=0.7, max_tokens=1024):
         messages: List of message dicts with 'role' and 'content'
         temperature: Temperature for generation
         max_tokens: Maximum tokens to generate
+        cache_policy: Optional endpoint name from settings.LLM_CACHE['POLICIES'];
+            when given, identical requests may be served from the response cache
+        priority: Scheduler priority - PRIORITY_INTERACTIVE (default) or PRIORITY_BATCH
+        deadline: Seconds the request may wait for a rate-limit slot
     
     Returns:
         Generated text response
-    """
-    # Determine provider based on model_id
-    gemini_models = ['gemini-2.5-flash', 'gemini-2.0-flash-exp', 'gemini-2.0-flash-lite']
     
-    if model_id in gemini_models:
-        return _call_gemini(model_id, messages, temperature, max_tokens)
-    else:
-        return _call_groq(model_id, messages, temperature, max_tokens)
+    Raises:
+        RateLimitExceeded: if the scheduler sheds the request
+    """
+    compute = lambda: _call_provider_coalesced(model_id, messages, temperature, max_tokens, priority, deadline)
+    if cache_policy:
+        from .llm_cache import cached_completion
+        return cached_completion(cache_policy, model_id, messages, temperature, max_tokens, compute)
+    return compute()
 
 
-def _call_gemini(model_id, messages, temperature, max_tokens):
-    """Call Gemini API"""
-    import google.generativeai as genai
-    
-    # Configure Gemini
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+def _call_provider_coalesced(model_id, messages, temperature, max_tokens, priority=None, deadline=None):
+    """
+    Share one upstream call between concurrent identical requests
+
+    Only requests of the same priority class share a call, and a follower
+    waits no longer than its own deadline before calling upstream itself, so
+    interactive chat never queues behind a batch leader.
+    """
+    from .llm_cache import make_request_key
+    from .llm_scheduler import get_config as get_scheduler_config, PRIORITY_INTERACTIVE
+    from .single_flight import single_flight
+    
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE
+    if deadline is None:
+        deadline = get_scheduler_config()['DEADLINES'].get(priority, 30)
+    key = f'llm:{priority}:' + make_request_key(model_id, messages, temperature, max_tokens)
+    return single_flight.do(
+        key, lambda: _call_provider(model_id, messages, temperature, max_tokens, priority, deadline),
+        timeout=deadline
+    )
+
+
+def _call_provider(model_id, messages, temperature, max_tokens, priority=None, deadline=None):
+    """Wait for a rate-limit slot, then dispatch to the provider that serves model_id"""
+    import time
+    from . import llm_cassette
+    from .llm_scheduler import scheduler, PRIORITY_INTERACTIVE
+    from .model_router import router
+    from .token_budget import estimate_tokens
+    
+    cassette_mode = llm_cassette.cassette_mode()
+    if cassette_mode == 'replay':
+        # Recorded responses need no rate-limit slot
+        hit = llm_cassette.replay(model_id, messages, temperature, max_tokens)
+        if hit is not None:
+            answer, latency = hit
+            router.record(model_id, latency, ok=True)
+            return answer
+    
+    estimated = sum(estimate_tokens(msg.get('content', ''), model_id) for msg in messages) + max_tokens
+    scheduler.acquire(
+        model_id, estimated,
+        priority=PRIORITY_INTERACTIVE if priority is None else priority,
+        deadline=deadline
+    )
     
+    # Latency is measured from admission so queueing time does not count against the model
+    started = time.monotonic()
+    try:
+        if getattr(settings, 'LLM_BACKEND', 'live') == 'fake':
+            answer = _call_fake(model_id, messages, temperature, max_tokens)
+        elif router.provider_for(model_id) == 'gemini':
+            answer = _call_gemini(model_id, messages, temperature, max_tokens)
+        else:
+            answer = _call_groq(model_id, messages, temperature, max_tokens)
+    except Exception:
+        router.record(model_id, time.monotonic() - started, ok=False)
+        raise
+    elapsed = time.monotonic() - started
+    router.record(model_id, elapsed, ok=True)
+    if cassette_mode == 'record':
+        llm_cassette.record(model_id, messages, temperature, max_tokens, answer, elapsed)
+    return answer
+
+
+def _gemini_api_model(model_id):
+    """Model name sent to the Gemini API"""
     # Use Gemini 2.5 Flash if the default model is specified
     if model_id in ['gemini-2.0-flash-exp', 'gemini-2.0-flash-lite']:
-        model_id = 'gemini-2.5-flash'
-    
-    # Convert messages to Gemini format
+        return 'gemini-2.5-flash'
+    return model_id
+
+
+def _gemini_prompt(messages):
+    """Convert chat messages to a single Gemini prompt"""
     prompt_parts = []
     for msg in messages:
         role = msg.get("role", "")
@@ -67,27 +138,74 @@ def _call_gemini(model_id, messages, temperature, max_tokens):
         elif role == "assistant":
             prompt_parts.append(f"Assistant: {content}\n")
     
-    prompt = "\n".join(prompt_parts)
-    
-    # Create model instance
-    model = genai.GenerativeModel(model_id)
+    return "\n".join(prompt_parts)
+
+
+def _observe_gemini_error(model_id, error):
+    """Hold a Gemini model back after a quota error"""
+    if type(error).__name__ == 'ResourceExhausted' or 'resource has been exhausted' in str(error).lower():
+        # Gemini sends no rate-limit headers - hold this model back for a while
+        from .llm_scheduler import scheduler, get_config
+        scheduler.observe_headers(model_id, {'retry-after': get_config()['GEMINI_BACKOFF']})
+
+
+def _call_gemini(model_id, messages, temperature, max_tokens):
+    """Call Gemini API (or the local stand-in's REST shim)"""
+    api_model = _gemini_api_model(model_id)
+    prompt = _gemini_prompt(messages)
     
-    response = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            temperature=temperature,
-            max_output_tokens=max_tokens,
+    try:
+        if getattr(settings, 'LLM_BACKEND', 'live') == 'standin':
+            return _call_gemini_rest(settings.LLM_STANDIN_URL, api_model, prompt, temperature, max_tokens)
+        
+        import google.generativeai as genai
+        
+        # Configure Gemini
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        
+        # Create model instance
+        model = genai.GenerativeModel(api_model)
+        
+        response = model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+            )
         )
-    )
+    except Exception as e:
+        _observe_gemini_error(model_id, e)
+        raise
     
     return response.text
 
 
+def _call_gemini_rest(base_url, model_id, prompt, temperature, max_tokens):
+    """Call a Gemini generateContent REST endpoint (used for the local stand-in)"""
+    import requests
+    
+    url = f"{base_url.rstrip('/')}/v1beta/models/{model_id}:generateContent"
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": temperature, "maxOutputTokens": max_tokens}
+    }
+    response = requests.post(url, params={"key": settings.GEMINI_API_KEY or ""}, json=payload)
+    
+    if response.status_code != 200:
+        message = response.json().get("error", {}).get("message", response.text)
+        print(f"[ERROR] Gemini API returned {response.status_code}: {message}")
+        raise Exception(f"Gemini API error {response.status_code}: {message}")
+    
+    return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+
 def _call_groq(model_id, messages, temperature, max_tokens):
     """Call Groq API"""
     import requests
     
     url = "https://api.groq.com/openai/v1/chat/completions"
+    if getattr(settings, 'LLM_BACKEND', 'live') == 'standin':
+        url = f"{settings.LLM_STANDIN_URL.rstrip('/')}/openai/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {settings.GROQ_API_KEY}",
         "Content-Type": "application/json"
@@ -102,6 +220,14 @@ def _call_groq(model_id, messages, temperature, max_tokens):
     
     response = requests.post(url, headers=headers, json=payload)
     
+    from .llm_scheduler import scheduler, RateLimitExceeded, parse_duration
+    scheduler.observe_headers(model_id, response.headers)
+    
+    if response.status_code == 429:
+        retry_after = parse_duration(response.headers.get('retry-after')) or 1.0
+        print(f"[ERROR] Groq rate limit hit for {model_id}, retry after {retry_after:.1f}s")
+        raise RateLimitExceeded(f"Groq rate limit for {model_id}", retry_after=retry_after)
+    
     if response.status_code != 200:
         print(f"[ERROR] Groq API returned {response.status_code}")
         print(f"[ERROR] Response: {response.text}")
@@ -110,6 +236,184 @@ def _call_groq(model_id, messages, temperature, max_tokens):
     return response.json()["choices"][0]["message"]["content"]
 
 
+def _call_fake(model_id, messages, temperature, max_tokens):
+    """Call the in-process offline provider (settings.LLM_BACKEND = 'fake')"""
+    from .fake_provider import get_fake_provider, FakeRateLimitError
+    from .llm_scheduler import scheduler, RateLimitExceeded, parse_duration
+    
+    try:
+        text, headers = get_fake_provider().complete(model_id, messages, temperature, max_tokens)
+    except FakeRateLimitError as e:
+        scheduler.observe_headers(model_id, e.headers)
+        raise RateLimitExceeded(str(e), retry_after=parse_duration(e.headers.get('retry-after')) or 1.0)
+    scheduler.observe_headers(model_id, headers)
+    return text
+
+
+def stream_llm_api(model_id, messages, temperature=0.7, max_tokens=1024, priority=None, deadline=None):
+    """
+    Stream a chat completion as text chunks
+    
+    Goes through the same rate-limit scheduler, routing telemetry and
+    cassettes as call_llm_api, but is not served from or stored in the
+    response cache (callers stream to show partial output early).
+    
+    Args:
+        model_id, messages, temperature, max_tokens, priority, deadline: As for call_llm_api
+    
+    Yields:
+        Text chunks in order
+    
+    Raises:
+        RateLimitExceeded: if the scheduler sheds the request or the provider rate limits it
+    """
+    import time
+    from . import llm_cassette
+    from .llm_scheduler import scheduler, PRIORITY_INTERACTIVE
+    from .model_router import router
+    from .token_budget import estimate_tokens
+    
+    cassette_mode = llm_cassette.cassette_mode()
+    if cassette_mode == 'replay':
+        hit = llm_cassette.replay(model_id, messages, temperature, max_tokens)
+        if hit is not None:
+            answer, latency = hit
+            router.record(model_id, latency, ok=True)
+            yield answer
+            return
+    
+    estimated = sum(estimate_tokens(msg.get('content', ''), model_id) for msg in messages) + max_tokens
+    scheduler.acquire(
+        model_id, estimated,
+        priority=PRIORITY_INTERACTIVE if priority is None else priority,
+        deadline=deadline
+    )
+    
+    started = time.monotonic()
+    pieces = []
+    try:
+        if getattr(settings, 'LLM_BACKEND', 'live') == 'fake':
+            stream = iter([_call_fake(model_id, messages, temperature, max_tokens)])
+        elif router.provider_for(model_id) == 'gemini':
+            stream = _stream_gemini(model_id, messages, temperature, max_tokens)
+        else:
+            stream = _stream_groq(model_id, messages, temperature, max_tokens)
+        for piece in stream:
+            pieces.append(piece)
+            yield piece
+    except Exception:
+        router.record(model_id, time.monotonic() - started, ok=False)
+        raise
+    elapsed = time.monotonic() - started
+    router.record(model_id, elapsed, ok=True)
+    if cassette_mode == 'record':
+        llm_cassette.record(model_id, messages, temperature, max_tokens, ''.join(pieces), elapsed)
+
+
+def _iter_sse_data(response):
+    """Payloads of the data: lines in a server-sent events response"""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith('data:'):
+            data = line[5:].strip()
+            if data == '[DONE]':
+                return
+            yield json.loads(data)
+
+
+def _stream_groq(model_id, messages, temperature, max_tokens):
+    """Stream a Groq chat completion"""
+    import requests
+    from .llm_scheduler import scheduler, parse_duration
+    
+    url = "https://api.groq.com/openai/v1/chat/completions"
+    if getattr(settings, 'LLM_BACKEND', 'live') == 'standin':
+        url = f"{settings.LLM_STANDIN_URL.rstrip('/')}/openai/v1/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {settings.GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model_id,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    
+    with requests.post(url, headers=headers, json=payload, stream=True) as response:
+        scheduler.observe_headers(model_id, response.headers)
+        
+        if response.status_code == 429:
+            retry_after = parse_duration(response.headers.get('retry-after')) or 1.0
+            print(f"[ERROR] Groq rate limit hit for {model_id}, retry after {retry_after:.1f}s")
+            raise RateLimitExceeded(f"Groq rate limit for {model_id}", retry_after=retry_after)
+        
+        if response.status_code != 200:
+            print(f"[ERROR] Groq API returned {response.status_code}")
+            print(f"[ERROR] Response: {response.text}")
+            raise Exception(f"Groq API error: {response.text}")
+        
+        for event in _iter_sse_data(response):
+            choices = event.get("choices") or [{}]
+            piece = choices[0].get("delta", {}).get("content")
+            if piece:
+                yield piece
+
+
+def _stream_gemini(model_id, messages, temperature, max_tokens):
+    """Stream a Gemini completion (or the local stand-in's REST shim)"""
+    api_model = _gemini_api_model(model_id)
+    prompt = _gemini_prompt(messages)
+    
+    try:
+        if getattr(settings, 'LLM_BACKEND', 'live') == 'standin':
+            yield from _stream_gemini_rest(settings.LLM_STANDIN_URL, api_model, prompt, temperature, max_tokens)
+            return
+        
+        import google.generativeai as genai
+        
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        model = genai.GenerativeModel(api_model)
+        response = model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+            ),
+            stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        _observe_gemini_error(model_id, e)
+        raise
+
+
+def _stream_gemini_rest(base_url, model_id, prompt, temperature, max_tokens):
+    """Stream a Gemini streamGenerateContent REST endpoint (used for the local stand-in)"""
+    import requests
+    
+    url = f"{base_url.rstrip('/')}/v1beta/models/{model_id}:streamGenerateContent"
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": temperature, "maxOutputTokens": max_tokens}
+    }
+    params = {"key": settings.GEMINI_API_KEY or "", "alt": "sse"}
+    
+    with requests.post(url, params=params, json=payload, stream=True) as response:
+        if response.status_code != 200:
+            message = response.json().get("error", {}).get("message", response.text)
+            print(f"[ERROR] Gemini API returned {response.status_code}: {message}")
+            raise Exception(f"Gemini API error {response.status_code}: {message}")
+        
+        for event in _iter_sse_data(response):
+            for candidate in event.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+
 def get_vectorizer():
     """Get TF-IDF vectorizer for embeddings"""
     global _vectorizer
@@ -241,6 +545,13 @@ def create_vector_store(document_id: int, chunks: List[str]) -> Tuple[None, List
         pickle.dump(vectorizer, f)
     
     print(f"[INFO] Saved {len(chunks)} chunks, embeddings, and vectorizer for document {document_id}")
+    
+    # Answers cached against the previous index are no longer trustworthy
+    from .semantic_cache import invalidate_document
+    invalidate_document(document_id)
+    # Neither are the quiz context clusters
+    from .models import Document
+    Document.objects.filter(id=document_id).update(chunk_clusters={})
     return None, chunks
 
 
@@ -263,6 +574,15 @@ def load_vector_store(document_id: int) -> Tuple[np.ndarray, List[str], object]:
     return embeddings, chunks, vectorizer
 
 
+def load_vectorizer(document_id: int):
+    """Load only the fitted vectorizer for a document (None if not indexed)"""
+    vectorizer_path = VECTOR_STORE_DIR / f'doc_{document_id}_vectorizer.pkl'
+    if not vectorizer_path.exists():
+        return None
+    with open(vectorizer_path, 'rb') as f:
+        return pickle.load(f)
+
+
 def retrieve_relevant_chunks(query: str, document_id: int, k: int = 3) -> List[str]:
     """Retrieve most relevant chunks for a query using cosine similarity"""
     from sklearn.metrics.pairwise import cosine_similarity
@@ -288,13 +608,28 @@ def retrieve_relevant_chunks(query: str, document_id: int, k: int = 3) -> List[s
     return relevant_chunks
 
 
-def generate_answer(query: str, context: str, model_id: str = 'llama-3.1-8b-instant', chat_history: List[dict] = None) -> str:
-    """Generate answer using LLM with RAG context - supports multiple models with fallback"""
+def generate_answer(query: str, context, model_id: str = 'llama-3.1-8b-instant', chat_history: List[dict] = None, cache_policy: str = None, summary: str = '') -> str:
+    """
+    Generate answer using LLM with RAG context - supports multiple models with fallback
+    
+    Instructions and the query are always sent; retrieved chunks (most relevant
+    first) and then recent history fill whatever remains of the model's
+    input token budget.
+    
+    Args:
+        query: User question
+        context: Retrieved chunks (list, most relevant first) or a pre-joined string
+        model_id: Model identifier
+        chat_history: Earlier messages not covered by summary, oldest first
+        cache_policy: Optional LLM response cache policy name
+        summary: Rolling summary of turns older than chat_history
+    """
+    from .token_budget import TokenBudget
+    
     if chat_history is None:
         chat_history = []
     
-    # Prepare system message with context
-    system_message = f"""You are a helpful AI assistant for students. You answer questions based on the provided context from their course materials.
+    system_template = """You are a helpful AI assistant for students. You answer questions based on the provided context from their course materials.
 
 Context from documents:
 {context}
@@ -306,11 +641,30 @@ Instructions:
 - If relevant, provide examples or explanations to help the student understand better
 """
     
+    summary_section = f"\nSummary of the earlier conversation:\n{summary}\n" if summary else ""
+    
+    budget = TokenBudget.for_model(model_id, max_output_tokens=1024)
+    budget.reserve(system_template + summary_section)
+    budget.reserve(query)
+    
+    # Context has priority over history: keep the most relevant chunks that fit
+    if isinstance(context, str):
+        context = budget.fit(context)
+    else:
+        context = "\n\n".join(budget.take(context))
+    
+    # Then the history since the summary, newest first, up to the first message that no longer fits
+    recent_history = budget.take_while_fits(reversed(chat_history), text_of=lambda msg: msg["content"])
+    recent_history.reverse()
+    
+    # Prepare system message with context
+    system_message = system_template.format(context=context) + summary_section
+    
     # Build messages for API
     messages = [{"role": "system", "content": system_message}]
     
-    # Add chat history (last 5 messages for context)
-    for msg in chat_history[-5:]:
+    # Add chat history
+    for msg in recent_history:
         messages.append({
             "role": msg["role"],
             "content": msg["content"]
@@ -322,10 +676,14 @@ Instructions:
     try:
         print(f"[DEBUG] Calling LLM API ({model_id}) with query: {query[:50]}...")
         # Call unified LLM API (supports Gemini + Groq)
-        answer = call_llm_api(model_id, messages, temperature=0.7, max_tokens=1024)
+        answer = call_llm_api(model_id, messages, temperature=0.7, max_tokens=1024, cache_policy=cache_policy)
         print(f"[DEBUG] LLM API response received: {answer[:100]}...")
         return answer
     
+    except RateLimitExceeded:
+        # Let the view answer 429 with Retry-After instead of an apology message
+        raise
+    
     except Exception as e:
         error_str = str(e).lower()
         print(f"[ERROR] Error generating answer: {type(e).__name__}: {str(e)}")
@@ -337,7 +695,7 @@ Instructions:
                 # Try with Groq model
                 fallback_model = 'llama-3.3-70b-versatile'
                 print(f"[INFO] Retrying with Groq model: {fallback_model}")
-                answer = call_llm_api(fallback_model, messages, temperature=0.7, max_tokens=1024)
+                answer = call_llm_api(fallback_model, messages, temperature=0.7, max_tokens=1024, cache_policy=cache_policy)
                 return answer
             except Exception as fallback_error:
                 print(f"[ERROR] Groq fallback also failed: {fallback_error}")
@@ -365,11 +723,7 @@ def process_query(query: str, document_id: int, chat_history: List[dict] = None)
         print("[ERROR] No relevant chunks found!")
         return "I couldn't find relevant information in the document. Please make sure the document has been properly uploaded and processed."
     
-    # Combine chunks into context
-    context = "\n\n".join(relevant_chunks)
-    print(f"[DEBUG] Context combined, total length: {len(context)} characters")
-    
-    # Generate answer
-    answer = generate_answer(query, context, chat_history)
+    # Generate answer (chunks are packed into the model's token budget)
+    answer = generate_answer(query, relevant_chunks, chat_history=chat_history)
     
     return answer
@@ -2,10 +2,13 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.contrib.admin.views.decorators import staff_member_required
 from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Avg
+from django.db.models import Avg, F
+from django.db import transaction
+from django.utils import timezone
 import json
 import os
 from io import BytesIO
@@ -14,7 +17,7 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import inch
 
-from .models import Document, Chat, Message, AIModel, ModelUsage, ModelFeedback, Quiz, QuizQuestion, LearningItem
+from .models import Document, Chat, Message, AIModel, ModelFeedback, Quiz, QuizQuestion, LearningItem
 from .utils import (
     extract_text_from_file,
     chunk_text,
@@ -23,6 +26,28 @@ from .utils import (
     generate_answer
 )
 from .quiz_utils import generate_quiz_questions, evaluate_answer
+from .llm_scheduler import RateLimitExceeded, rate_limited_response
+from .pagination import page_params, keyset_page, UnknownCursor
+from . import question_pool, usage_counters
+
+# Messages per page of chat history
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+# Chats and documents per page of the list endpoints
+LIST_PAGE_SIZE = 50
+MAX_LIST_PAGE_SIZE = 200
+
+
+def _add_message(chat, role, content, model_used=None):
+    """Save a chat message and bump the chat's message_count / last_message_at in the same transaction"""
+    with transaction.atomic():
+        message = Message.objects.create(chat=chat, role=role, content=content, model_used=model_used)
+        Chat.objects.filter(id=chat.id).update(
+            message_count=F('message_count') + 1,
+            last_message_at=message.created_at,
+            updated_at=timezone.now()
+        )
+    return message
 
 
 def home(request):
@@ -71,7 +96,7 @@ def upload_documents(request):
             print(f"[DEBUG] Extracted {len(text_content)} characters of text")
             
             document.text_content = text_content
-            document.save()
+            document.save(update_fields=['text_content'])
             print(f"[DEBUG] Document text content saved")
             
             # Create vector store
@@ -83,6 +108,10 @@ def upload_documents(request):
             create_vector_store(document.id, chunks)
             print(f"[DEBUG] Vector store created successfully")
             
+            # Pre-generate the document's quiz question pool in the background
+            if question_pool.is_enabled() and question_pool.get_config()['BUILD_ON_UPLOAD']:
+                question_pool.schedule_build(document.id)
+            
             uploaded_docs.append({
                 'id': document.id,
                 'title': document.title,
@@ -109,9 +138,10 @@ def upload_documents(request):
 
 
 def chat_interface(request):
-    """Render chatbot interface"""
-    documents = Document.objects.all()
-    chats = Chat.objects.all()
+    """Render chatbot interface (first page of chats; the page script loads the rest)"""
+    # The document dropdown has no load-more, so it lists every document
+    documents = Document.objects.only('id', 'title')
+    chats = Chat.objects.only('id', 'name', 'updated_at').order_by('-updated_at', '-id')[:LIST_PAGE_SIZE]
     ai_models = AIModel.objects.filter(is_active=True)
     return render(request, 'chatbot.html', {
         'documents': documents,
@@ -129,7 +159,7 @@ def chat_api(request):
         query = data.get('message')
         document_id = data.get('document_id')
         chat_id = data.get('chat_id')
-        model_id = data.get('model_id', 'llama-3.1-8b-instant')  # Default model
+        model_id = data.get('model_id')
         learn_mode = data.get('learn_mode', False)
         
         if not query:
@@ -138,6 +168,11 @@ def chat_api(request):
                 'message': 'Missing message'
             }, status=400)
         
+        # No pinned model (or 'auto'): let the router pick the fastest healthy one
+        if not model_id or model_id == 'auto':
+            from .model_router import router, TIER_BASIC
+            model_id = router.choose(TIER_BASIC, reason='chat')
+        
         # Get model instance
         try:
             ai_model = AIModel.objects.get(model_id=model_id, is_active=True)
@@ -159,8 +194,8 @@ def chat_api(request):
                 {'role': 'user', 'content': query}
             ]
             
-            # Simple direct call to LLM
-            answer = call_llm_api(model_id, messages)
+            # Simple direct call to LLM; learn-mode explanations are cached, plain replies stay sampled
+            answer = call_llm_api(model_id, messages, cache_policy='learn' if learn_mode else None)
             
             return JsonResponse({
                 'status': 'success',
@@ -186,30 +221,16 @@ def chat_api(request):
             )
         
         # Save user message
-        Message.objects.create(
-            chat=chat,
-            role='user',
-            content=query
-        )
+        _add_message(chat, 'user', query)
         
-        # Get chat history
-        messages = chat.messages.all()
-        chat_history = [
-            {'role': msg.role, 'content': msg.content}
-            for msg in messages
-        ]
+        # Get recent chat history (older turns live in chat.summary)
+        from .chat_memory import get_recent_history, maybe_schedule_summary
+        chat_history = get_recent_history(chat)
         
         # Track model usage
         session_key = request.session.session_key or 'default'
-        usage, created = ModelUsage.objects.get_or_create(
-            session_key=session_key,
-            model=ai_model
-        )
-        usage.prompt_count += 1
-        usage.save()
-        
-        # Check if feedback is needed
-        need_feedback = (usage.prompt_count - usage.last_feedback_at) >= 10
+        # Buffered in-process and flushed in batches; the count includes unflushed prompts
+        prompt_count, need_feedback = usage_counters.record_prompt(session_key, ai_model)
         
         # Check if using Wikipedia
         if ai_model.provider == 'wikipedia':
@@ -219,18 +240,13 @@ def chat_api(request):
             answer = wikipedia_answer(query)
             
             # Save assistant message
-            Message.objects.create(
-                chat=chat,
-                role='assistant',
-                content=answer,
-                model_used=ai_model
-            )
+            _add_message(chat, 'assistant', answer, ai_model)
             
             return JsonResponse({
                 'status': 'success',
                 'chat_id': chat.id,
                 'answer': answer,
-                'prompt_count': usage.prompt_count,
+                'prompt_count': prompt_count,
                 'need_feedback': need_feedback
             })
         
@@ -249,43 +265,45 @@ def chat_api(request):
             answer = handler.chat_with_rag(query, document_text)
             
             # Save assistant message
-            Message.objects.create(
-                chat=chat,
-                role='assistant',
-                content=answer,
-                model_used=ai_model
-            )
+            _add_message(chat, 'assistant', answer, ai_model)
             
             return JsonResponse({
                 'status': 'success',
                 'chat_id': chat.id,
                 'answer': answer,
-                'prompt_count': usage.prompt_count,
+                'prompt_count': prompt_count,
                 'need_feedback': need_feedback
             })
         
-        # Process query with RAG for other models
-        from .utils import generate_answer, retrieve_relevant_chunks
-        chunks = retrieve_relevant_chunks(query, document_id)
-        context = "\n\n".join(chunks)
-        answer = generate_answer(query, context, model_id=model_id, chat_history=chat_history[:-1])
+        # Near-identical opening questions about the same document are served from the semantic cache;
+        # follow-ups ("explain that in more detail") depend on the history and always go to the model
+        from .semantic_cache import lookup_answer, store_answer
+        first_turn = not chat_history[:-1] and not chat.summary
+        answer, query_vector = lookup_answer(query, document_id, model_id) if first_turn else (None, None)
+        
+        if answer is None:
+            # Process query with RAG for other models
+            from .utils import generate_answer, retrieve_relevant_chunks
+            chunks = retrieve_relevant_chunks(query, document_id)
+            answer = generate_answer(query, chunks, model_id=model_id, chat_history=chat_history[:-1], summary=chat.summary)
+            if first_turn:
+                store_answer(query, document_id, model_id, answer, vector=query_vector)
         
         # Save assistant message
-        Message.objects.create(
-            chat=chat,
-            role='assistant',
-            content=answer,
-            model_used=ai_model
-        )
+        _add_message(chat, 'assistant', answer, ai_model)
+        maybe_schedule_summary(chat)
         
         return JsonResponse({
             'status': 'success',
             'chat_id': chat.id,
             'answer': answer,
-            'prompt_count': usage.prompt_count,
+            'prompt_count': prompt_count,
             'need_feedback': need_feedback
         })
     
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -297,19 +315,37 @@ def chat_api(request):
 
 @require_http_methods(["GET"])
 def get_chats(request):
-    """Get all chats"""
-    chats = Chat.objects.all()
+    """
+    Get one page of chats, most recently active first
+
+    ?before=<chat id> continues after the last chat of the previous page.
+    The document title comes from the same query (select_related), and
+    message counts from the denormalized Chat columns.
+    """
+    chats = Chat.objects.select_related('document').only(
+        'id', 'name', 'updated_at', 'message_count', 'last_message_at', 'document__id', 'document__title'
+    )
+    try:
+        limit, cursor = page_params(request, LIST_PAGE_SIZE, MAX_LIST_PAGE_SIZE)
+        chats, next_cursor = keyset_page(chats, 'updated_at', limit, cursor)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit and before must be integers'}, status=400)
+    except UnknownCursor:
+        return JsonResponse({'status': 'error', 'message': 'Unknown chat cursor'}, status=404)
+    
     chat_list = [
         {
             'id': chat.id,
             'name': chat.name,
-            'document_id': chat.document.id if chat.document else None,
+            'document_id': chat.document_id,
             'document_title': chat.document.title if chat.document else None,
+            'message_count': chat.message_count,
+            'last_message_at': chat.last_message_at.strftime('%Y-%m-%d %H:%M:%S') if chat.last_message_at else None,
             'updated_at': chat.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
         for chat in chats
     ]
-    return JsonResponse({'chats': chat_list})
+    return JsonResponse({'chats': chat_list, 'has_more': next_cursor is not None, 'next_cursor': next_cursor})
 
 
 @csrf_exempt
@@ -339,23 +375,46 @@ def rename_chat(request):
 
 @require_http_methods(["GET"])
 def get_chat_messages(request, chat_id):
-    """Get all messages for a chat"""
-    chat = get_object_or_404(Chat, id=chat_id)
-    messages = chat.messages.all()
+    """
+    Get one page of a chat's messages, oldest first
+
+    Without a cursor the newest page is returned. ?before=<message id> pages
+    back through older history and ?after=<message id> fetches newer
+    messages; ?limit= sets the page size. Pages are keyset queries on
+    (created_at, id), served by the (chat, created_at) index.
+    """
+    chat = get_object_or_404(Chat.objects.only('id', 'name'), id=chat_id)
+    after = request.GET.get('after')
+    try:
+        limit, cursor = page_params(request, MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGE_SIZE, 'after' if after else 'before')
+        page, next_cursor = keyset_page(
+            Message.objects.filter(chat_id=chat.id).values('id', 'role', 'content', 'created_at'),
+            'created_at', limit, cursor, descending=not after
+        )
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit, before and after must be integers'}, status=400)
+    except UnknownCursor:
+        return JsonResponse({'status': 'error', 'message': 'Unknown message cursor'}, status=404)
+    if not after:
+        page.reverse()
     
     message_list = [
         {
-            'role': msg.role,
-            'content': msg.content,
-            'created_at': msg.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            'id': msg['id'],
+            'role': msg['role'],
+            'content': msg['content'],
+            'created_at': msg['created_at'].strftime('%Y-%m-%d %H:%M:%S')
         }
-        for msg in messages
+        for msg in page
     ]
     
     return JsonResponse({
         'chat_id': chat.id,
         'chat_name': chat.name,
-        'messages': message_list
+        'messages': message_list,
+        'has_more': next_cursor is not None,
+        # Cursor for the next page in the direction being paged
+        'next_cursor': next_cursor
     })
 
 
@@ -424,8 +483,16 @@ def delete_chat(request):
 
 @require_http_methods(["GET"])
 def get_documents(request):
-    """Get all documents"""
-    documents = Document.objects.all()
+    """Get one page of documents, newest first (?before=<document id> for the next page)"""
+    documents = Document.objects.only('id', 'title', 'file_type', 'uploaded_at')
+    try:
+        limit, cursor = page_params(request, LIST_PAGE_SIZE, MAX_LIST_PAGE_SIZE)
+        documents, next_cursor = keyset_page(documents, 'uploaded_at', limit, cursor)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit and before must be integers'}, status=400)
+    except UnknownCursor:
+        return JsonResponse({'status': 'error', 'message': 'Unknown document cursor'}, status=404)
+    
     doc_list = [
         {
             'id': doc.id,
@@ -435,7 +502,7 @@ def get_documents(request):
         }
         for doc in documents
     ]
-    return JsonResponse({'documents': doc_list})
+    return JsonResponse({'documents': doc_list, 'has_more': next_cursor is not None, 'next_cursor': next_cursor})
 
 
 @require_http_methods(["GET"])
@@ -486,12 +553,7 @@ def submit_feedback(request):
         )
         
         # Update last_feedback_at in ModelUsage
-        try:
-            usage = ModelUsage.objects.get(session_key=session_key, model=ai_model)
-            usage.last_feedback_at = usage.prompt_count
-            usage.save()
-        except ModelUsage.DoesNotExist:
-            pass
+        usage_counters.mark_feedback(session_key, ai_model)
         
         return JsonResponse({
             'status': 'success',
@@ -604,3 +666,23 @@ def delete_document(request, document_id):
             'status': 'error',
             'message': str(e)
         }, status=500)
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def metrics_api(request):
+    """Expose LLM layer metrics (cache hit rates, scheduler queues, routing, counters, gauges) to staff"""
+    from . import metrics
+    from . import llm_cache, semantic_cache, hedging
+    from .llm_scheduler import scheduler
+    from .model_router import router
+    
+    return JsonResponse({
+        'status': 'success',
+        'llm_cache': llm_cache.get_cache_stats(),
+        'semantic_cache': semantic_cache.get_cache_stats(),
+        'scheduler': scheduler.get_stats(),
+        'router': router.get_stats(),
+        'hedging': hedging.get_stats(),
+        **metrics.snapshot()
+    })
@@ -0,0 +1,126 @@
+"""
+Database overhead of saving generated questions: per-row create() vs bulk_create() in one transaction
+
+Saves the same quizzes and question papers both ways on a throwaway SQLite
+database file (so every autocommitted row pays for its own commit) and prints
+the time per save and the number of queries it issued. No LLM calls are made.
+
+Usage:
+    python testing/benchmark_bulk_writes.py [--quizzes 50] [--questions 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.db import connection, connections, transaction
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases, CaptureQueriesContext
+
+from chatbot.models import Quiz, QuizQuestion, QuestionPaper, GeneratedQuestion
+from chatbot.quiz_views import _create_quiz
+from chatbot.question_paper_views import _save_paper
+
+
+def make_questions(n):
+    return [
+        {
+            'question': f'Question {i}: which statement about topic {i} is correct?',
+            'options': [f'A) Option {i}.1', f'B) Option {i}.2', f'C) Option {i}.3', f'D) Option {i}.4'],
+            'correct_answer': f'A) Option {i}.1',
+            'explanation': f'Explanation for question {i}.',
+        }
+        for i in range(n)
+    ]
+
+
+def quiz_per_row(questions):
+    """Previous behaviour: one autocommitted INSERT per question"""
+    quiz = Quiz.objects.create(topic='bench', source_type='prompt', total_questions=len(questions))
+    for idx, q_data in enumerate(questions):
+        QuizQuestion.objects.create(
+            quiz=quiz,
+            question=q_data['question'],
+            options=q_data['options'],
+            correct_answer=q_data['correct_answer'],
+            explanation=q_data.get('explanation', ''),
+            order=idx
+        )
+    # The view then re-read the questions for their ids
+    return list(quiz.questions.all())
+
+
+def quiz_bulk(questions):
+    _, saved = _create_quiz(questions, topic='bench', source_type='prompt', total_questions=len(questions))
+    return saved
+
+
+def paper_per_row(questions_by_marks):
+    paper = QuestionPaper.objects.create(title='bench', subject='bench', paper_type='important')
+    for marks, questions in questions_by_marks.items():
+        for idx, q in enumerate(questions):
+            GeneratedQuestion.objects.create(
+                paper=paper, question_text=q['question'], marks=int(marks), answer_hint='', order=idx
+            )
+    return paper
+
+
+def paper_bulk(questions_by_marks):
+    return _save_paper(questions_by_marks, 'hint', title='bench', subject='bench', paper_type='important')
+
+
+def measure(name, fn, payload, runs):
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(runs):
+            start = time.perf_counter()
+            fn(payload)
+            timings.append(time.perf_counter() - start)
+    per_run = len(queries) / runs
+    print(f"{name:<22} mean {statistics.mean(timings) * 1000:8.2f} ms   "
+          f"p50 {statistics.median(timings) * 1000:8.2f} ms   {per_run:5.1f} queries/save")
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--quizzes', type=int, default=50, help='Saves per variant')
+    parser.add_argument('--questions', type=int, default=20, help='Questions per quiz / paper')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='bulk-bench-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'bench.sqlite3')
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        questions = make_questions(args.questions)
+        by_marks = {'2': questions[:args.questions // 2], '5': questions[args.questions // 2:]}
+        print(f"{args.quizzes} saves of {args.questions} questions each (SQLite file in {scratch})\n")
+
+        slow = measure('quiz: create() loop', quiz_per_row, questions, args.quizzes)
+        fast = measure('quiz: bulk_create', quiz_bulk, questions, args.quizzes)
+        print(f"{'':<22} {slow / fast:.1f}x faster\n")
+
+        slow = measure('paper: create() loop', paper_per_row, by_marks, args.quizzes)
+        fast = measure('paper: bulk_create', paper_bulk, by_marks, args.quizzes)
+        print(f"{'':<22} {slow / fast:.1f}x faster")
+
+        ids = [question.id for question in quiz_bulk(questions)]
+        assert all(ids) and ids == sorted(ids), 'bulk_create did not return question ids'
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
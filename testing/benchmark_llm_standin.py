@@ -0,0 +1,170 @@
+"""
+Throughput / latency benchmark for chat, quiz and paper endpoints against the local LLM stand-in
+
+Runs without API keys: starts the stand-in in-process, points the app at it
+(LLM_BACKEND=standin) and drives the views through Django's test client on a
+throwaway test database.
+
+Usage:
+    python testing/benchmark_llm_standin.py [--requests 40] [--concurrency 8] [--latency 0.6] [--error-rate 0.0]
+
+Record a cassette once, then replay it to measure app overhead without any LLM latency:
+    python testing/benchmark_llm_standin.py --cassette-mode record --cassette /tmp/bench.json.gz
+    python testing/benchmark_llm_standin.py --cassette-mode replay --cassette /tmp/bench.json.gz [--simulate-latency]
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases, override_settings
+
+from chatbot.llm_standin import start_in_thread
+
+
+def make_docx(text):
+    """Small in-memory .docx 'previous paper' for the predict endpoint"""
+    from docx import Document as DocxDocument
+    document = DocxDocument()
+    for line in text.splitlines():
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    buffer.seek(0)
+    buffer.name = 'previous_paper.docx'
+    return buffer
+
+
+def chat_request(client, i):
+    return client.post('/api/chat/', json.dumps({
+        'message': f'Explain topic number {i} in simple words',
+        'model_id': 'llama-3.1-8b-instant',
+        'learn_mode': True,
+    }), content_type='application/json')
+
+
+def quiz_request(client, i):
+    return client.post('/api/quiz/generate/', json.dumps({
+        'source_type': 'prompt',
+        'topic': f'Operating systems unit {i}',
+        'num_questions': 5,
+    }), content_type='application/json')
+
+
+def predict_request(client, i):
+    paper = make_docx(f"Q{i}. Explain deadlock.\nQ2. What is paging?\nQ3. Describe process scheduling.")
+    return client.post('/api/question-paper/predict/', {
+        'subject': f'Operating Systems {i}',
+        'requirements': json.dumps({'2': 3, '5': 2}),
+        'previous_papers': paper,
+    })
+
+
+def run_scenario(name, request_fn, total, concurrency):
+    """Fire total requests with the given concurrency; report throughput and latency percentiles"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(i):
+        client = Client()
+        started = time.perf_counter()
+        response = request_fn(client, i)
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]
+    print(f"{name:<10} {total / wall:>8.2f} req/s   p50 {statistics.median(latencies):.3f}s   "
+          f"p95 {p95:.3f}s   max {latencies[-1]:.3f}s   statuses {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.6, help='Median stand-in latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cassette-mode', choices=['off', 'record', 'replay'], default='off')
+    parser.add_argument('--cassette', help='Cassette file for --cassette-mode')
+    parser.add_argument('--simulate-latency', action='store_true', help='Replay with recorded latencies')
+    args = parser.parse_args()
+
+    server, url = None, 'cassette replay'
+    if args.cassette_mode != 'replay':
+        server, url = start_in_thread(config={
+            'LATENCY': {'distribution': 'lognormal', 'median': args.latency, 'sigma': 0.5},
+            'ERROR_RATE': args.error_rate,
+            'SEED': args.seed,
+        })
+        settings.LLM_BACKEND = 'standin'
+        settings.LLM_STANDIN_URL = url
+    settings.LLM_CASSETTE = dict(
+        settings.LLM_CASSETTE,
+        MODE=args.cassette_mode,
+        PATH=args.cassette or settings.LLM_CASSETTE['PATH'],
+        SIMULATE_LATENCY=args.simulate_latency
+    )
+    # Measure the full request path, not cache hits
+    settings.LLM_CACHE = dict(settings.LLM_CACHE, ENABLED=False)
+    settings.ALLOWED_HOSTS = ['*']
+
+    # File-backed test database: in-memory SQLite raises "table is locked" under concurrent writes
+    scratch = tempfile.mkdtemp(prefix='standin-bench-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'bench.sqlite3')
+    database['OPTIONS']['timeout'] = 30
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    # Uploaded previous papers go to a scratch directory
+    media = override_settings(MEDIA_ROOT=os.path.join(scratch, 'media'))
+    media.enable()
+    try:
+        call_command('populate_models', verbosity=0)
+        print(f"Stand-in at {url} (median latency {args.latency}s, error rate {args.error_rate})")
+        print(f"{args.requests} requests per scenario, concurrency {args.concurrency}\n")
+        # Warm up URLconf and view imports so the first scenario is not penalised
+        Client().get('/api/metrics/')
+        run_scenario('chat', chat_request, args.requests, args.concurrency)
+        run_scenario('quiz', quiz_request, args.requests, args.concurrency)
+        run_scenario('predict', predict_request, args.requests, args.concurrency)
+    finally:
+        media.disable()
+        teardown_databases(old_config, verbosity=0)
+        if server is not None:
+            server.shutdown()
+        if args.cassette_mode == 'record':
+            from chatbot.llm_cassette import get_cassette
+            get_cassette().flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Offline test for near-duplicate filtering of generated questions"""
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from chatbot.dedup import NearDuplicateIndex, dedupe, jaccard, shingles
+
+WORDS = """process thread memory paging segment cache disk file socket kernel deadlock mutex semaphore
+scheduler queue stack heap pointer array tree graph hash index table query join lock buffer packet
+router switch protocol cipher token parser compiler linker loader register interrupt signal pipe""".split()
+
+
+def test_reworded_questions_are_duplicates():
+    """Reworded, reordered and re-cased variants of a question are caught"""
+    print("Testing reworded variants...")
+    pairs = [
+        ("What is paging in operating systems?", "Explain paging in an operating system."),
+        ("Which scheduling algorithm gives the shortest average waiting time?",
+         "The shortest average waiting time is given by which scheduling algorithm?"),
+        ("Define a deadlock and its four necessary conditions.",
+         "DEFINE deadlock and the four necessary conditions"),
+    ]
+    results = []
+    for original, variant in pairs:
+        index = NearDuplicateIndex()
+        index.add(original)
+        results.append(index.is_duplicate(variant))
+    ok = all(results)
+    print(f"[{'OK' if ok else 'X'}] {sum(results)}/{len(pairs)} variants detected")
+    return ok
+
+
+def test_distinct_questions_are_kept():
+    """Questions on the same topic but about different things survive"""
+    print("Testing distinct questions...")
+    questions = [
+        "What is a deadlock?",
+        "What is a semaphore?",
+        "What is the purpose of the TLB in paging?",
+        "What is paging?",
+        "What are the advantages of segmentation over paging?",
+        "Which page replacement algorithm suffers from Belady's anomaly?",
+        "What is the time complexity of merge sort?",
+        "What is the space complexity of merge sort?",
+        "Which of the following is a property of a B-tree?",
+        "Which of the following is NOT a property of a B-tree?",
+    ]
+    kept = dedupe(questions)
+    ok = kept == questions
+    print(f"[{'OK' if ok else 'X'}] kept {len(kept)}/{len(questions)} distinct questions")
+    return ok
+
+
+def test_existing_pool_is_respected():
+    """New questions that repeat an existing pool are dropped, first of a group wins"""
+    print("Testing dedupe against an existing pool...")
+    items = [{'question': "Explain paging in an operating system."},
+             {'question': "What is a mutex?"},
+             {'question': "What is a mutex"}]
+    kept = dedupe(items, text_of=lambda q: q['question'], existing=["What is paging in operating systems?"])
+    ok = [q['question'] for q in kept] == ["What is a mutex?"]
+    print(f"[{'OK' if ok else 'X'}] kept {[q['question'] for q in kept]}")
+    return ok
+
+
+def test_recall_at_threshold():
+    """Pairs just at the 0.6 threshold are found, not only clearly similar ones"""
+    print("Testing recall at the threshold...")
+    rng = random.Random(3)
+    pairs = []
+    while len(pairs) < 300:
+        words = [f"t{rng.randrange(100000)}x" for _ in range(rng.randint(8, 16))]
+        variant = list(words)
+        for _ in range(rng.randint(1, 4)):
+            variant[rng.randrange(len(variant))] = f"t{rng.randrange(100000)}x"
+        score = jaccard(shingles(' '.join(words)), shingles(' '.join(variant)))
+        if 0.6 <= score < 0.65:
+            pairs.append((' '.join(words), ' '.join(variant)))
+
+    found = 0
+    for original, variant in pairs:
+        index = NearDuplicateIndex()
+        index.add(original)
+        found += index.is_duplicate(variant)
+    recall = found / len(pairs)
+    ok = recall >= 0.95
+    print(f"[{'OK' if ok else 'X'}] {found}/{len(pairs)} pairs with Jaccard 0.60-0.65 detected ({recall:.0%})")
+    return ok
+
+
+def test_scales_linearly():
+    """Filtering 4x the questions takes roughly 4x (not 16x) the time"""
+    print("Testing scaling...")
+    rng = random.Random(7)
+
+    def make(n):
+        return [f"How does the {' '.join(rng.sample(WORDS, 4))} work?" for _ in range(n)]
+
+    timings = []
+    for n in (500, 2000):
+        questions = make(n)
+        started = time.perf_counter()
+        dedupe(questions)
+        timings.append(time.perf_counter() - started)
+    ratio = timings[1] / timings[0]
+    ok = ratio < 8
+    print(f"[{'OK' if ok else 'X'}] 500 in {timings[0]:.2f}s, 2000 in {timings[1]:.2f}s (x{ratio:.1f})")
+    return ok
+
+
+if __name__ == '__main__':
+    results = [
+        test_reworded_questions_are_duplicates(),
+        test_distinct_questions_are_kept(),
+        test_existing_pool_is_respected(),
+        test_recall_at_threshold(),
+        test_scales_linearly(),
+    ]
+    print(f"\n{sum(results)}/{len(results)} passed")
@@ -0,0 +1,80 @@
+"""Offline test for tolerant JSON salvage of quiz and question-paper responses"""
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from chatbot.json_repair import (
+    IncrementalJSONParser, parse_json_lenient, salvage_quiz_questions, salvage_questions_by_marks
+)
+
+QUESTION = '''{
+    "question": "What is paging%s?",
+    "options": ["A) one", "B) two", "C) three", "D) four"],
+    "correct_answer": "A) one",
+    "explanation": "Because."
+  }'''
+
+
+def test_repairs_common_defects():
+    """Code fences, smart quotes, trailing commas and raw newlines are repaired"""
+    print("Testing defect repair...")
+    text = (
+        "Here is your quiz:\n```json\n[\n  " + QUESTION % 1 + ",\n  "
+        + '{“question”: “Define a “page” frame", "options": ["A", "B",], '
+        + '"correct_answer": "A", "explanation": "Line one\nline two",},\n]\n```'
+    )
+    questions = salvage_quiz_questions(text)
+    ok = len(questions) == 2 and questions[1]['explanation'] == "Line one\nline two"
+    print(f"[{'OK' if ok else 'X'}] salvaged {len(questions)}/2 questions")
+    return ok
+
+
+def test_truncated_response_keeps_complete_items():
+    """A response cut off mid-item keeps every complete item"""
+    print("Testing truncated response...")
+    text = "[" + ",".join(QUESTION % i for i in range(3)) + ', {"question": "Cut o'
+    questions = salvage_quiz_questions(text)
+    ok = len(questions) == 3 and parse_json_lenient(text) is None
+    print(f"[{'OK' if ok else 'X'}] salvaged {len(questions)}/3 questions from truncated text")
+    return ok
+
+
+def test_malformed_item_is_skipped():
+    """One broken item does not discard its neighbours"""
+    print("Testing malformed item...")
+    text = "[" + QUESTION % 1 + ', {"question": "Broken" "options": []}, ' + QUESTION % 2 + "]"
+    questions = salvage_quiz_questions(text)
+    ok = [q['question'] for q in questions] == ["What is paging1?", "What is paging2?"]
+    print(f"[{'OK' if ok else 'X'}] kept {len(questions)} valid questions around a broken one")
+    return ok
+
+
+def test_streaming_paper_by_marks():
+    """Marks-keyed paper items are emitted as soon as they close, chunk by chunk"""
+    print("Testing incremental paper parsing...")
+    text = '{"2": [{"question": "Q1"}, {"question": "Q2"}], "5": [{"question": "Q3", "hint": "h"}]}'
+    parser = IncrementalJSONParser()
+    seen = []
+    for i in range(0, len(text), 7):
+        seen.extend(key for key, _ in parser.feed(text[i:i + 7]))
+    by_marks = salvage_questions_by_marks(text)
+    ok = seen == ['2', '2', '5'] and {k: len(v) for k, v in by_marks.items()} == {'2': 2, '5': 1}
+    print(f"[{'OK' if ok else 'X'}] emitted keys {seen}")
+    return ok
+
+
+if __name__ == '__main__':
+    results = [
+        test_repairs_common_defects(),
+        test_truncated_response_keeps_complete_items(),
+        test_malformed_item_is_skipped(),
+        test_streaming_paper_by_marks(),
+    ]
+    print(f"\n{sum(results)}/{len(results)} passed")
@@ -0,0 +1,127 @@
+"""Query-count test: chat, document and message list endpoints must not issue a query per row"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases, CaptureQueriesContext
+
+from chatbot.models import Chat, Document, Message
+from chatbot.views import _add_message
+
+
+def add_rows(count):
+    """count documents, each with a chat of two messages"""
+    for i in range(count):
+        document = Document.objects.create(title=f'Doc {i}.pdf', file_type='pdf', text_content='text ' * 2000)
+        chat = Chat.objects.create(name=f'Chat {i}', document=document)
+        _add_message(chat, 'user', f'Question {i}')
+        _add_message(chat, 'assistant', f'Answer {i}')
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200, f"{url} returned {response.status_code}"
+    return len(queries)
+
+
+def page_through(client, url, key):
+    """Every row reachable by following next_cursor, in order"""
+    rows, cursor = [], None
+    while True:
+        data = client.get(url + (f'&before={cursor}' if cursor else '')).json()
+        rows.extend(row['id'] for row in data[key])
+        if not data['has_more']:
+            return rows
+        cursor = data['next_cursor']
+
+
+def test_query_counts_do_not_grow():
+    """Queries per request stay the same with 5 and with 60 rows"""
+    print("Testing query counts with 5 and 60 chats / documents...")
+    client = Client()
+    chat = Chat.objects.order_by('id').first()
+    urls = ['/api/chats/', '/api/documents/', '/chat/', f'/api/chat/{chat.id}/messages/']
+
+    small = {url: count_queries(client, url) for url in urls}
+    add_rows(55)
+    large = {url: count_queries(client, url) for url in urls}
+
+    ok = True
+    for url in urls:
+        same = small[url] == large[url]
+        ok = ok and same
+        print(f"[{'OK' if same else 'X'}] {url}: {small[url]} queries with 5 rows, {large[url]} with 60")
+    return ok
+
+
+def test_pages_cover_every_row():
+    """Following the cursors returns every chat and document exactly once"""
+    print("Testing keyset pages...")
+    client = Client()
+    chats = page_through(client, '/api/chats/?limit=7', 'chats')
+    documents = page_through(client, '/api/documents/?limit=7', 'documents')
+    expected_chats = list(Chat.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+    expected_documents = list(Document.objects.order_by('-uploaded_at', '-id').values_list('id', flat=True))
+    ok = chats == expected_chats and documents == expected_documents
+    print(f"[{'OK' if ok else 'X'}] {len(chats)} chats and {len(documents)} documents in 7-row pages")
+    return ok
+
+
+def test_pages_seek_the_index():
+    """Later pages are an index range on (field, id), not a scan or a sort"""
+    print("Testing query plans of later pages...")
+    client = Client()
+    ok = True
+    for url, key in [('/api/chats/?limit=7', 'chats'), ('/api/documents/?limit=7', 'documents')]:
+        cursor = client.get(url).json()['next_cursor']
+        with CaptureQueriesContext(connection) as queries:
+            client.get(f'{url}&before={cursor}')
+        page_sql = queries.captured_queries[-1]['sql']
+        with connection.cursor() as db:
+            db.execute('EXPLAIN QUERY PLAN ' + page_sql)
+            plan = ' / '.join(row[-1] for row in db.fetchall())
+        seeks = 'USING' in plan and 'INDEX' in plan and '<?' in plan and 'TEMP B-TREE' not in plan
+        ok = ok and seeks
+        print(f"[{'OK' if seeks else 'X'}] {key}: {plan}")
+    return ok
+
+
+def test_message_stats_are_maintained():
+    """message_count and last_message_at follow the messages that were added"""
+    print("Testing denormalized chat message stats...")
+    chat = Chat.objects.order_by('id').first()
+    latest = Message.objects.filter(chat=chat).order_by('-created_at').values_list('created_at', flat=True).first()
+    ok = chat.message_count == Message.objects.filter(chat=chat).count() == 2 and chat.last_message_at == latest
+    print(f"[{'OK' if ok else 'X'}] message_count {chat.message_count}, last_message_at {chat.last_message_at}")
+    return ok
+
+
+if __name__ == '__main__':
+    scratch = tempfile.mkdtemp(prefix='list-queries-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'test.sqlite3')
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        add_rows(5)
+        results = [
+            test_query_counts_do_not_grow(),
+            test_pages_cover_every_row(),
+            test_pages_seek_the_index(),
+            test_message_stats_are_maintained(),
+        ]
+    finally:
+        teardown_databases(old_config, verbosity=0)
+    print(f"\n{sum(results)}/{len(results)} passed")
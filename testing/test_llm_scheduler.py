@@ -0,0 +1,113 @@
+"""Offline test for the LLM rate-limit scheduler against the fake provider"""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from chatbot.fake_provider import FakeRateLimitedProvider, set_fake_provider
+from chatbot.llm_scheduler import scheduler, RateLimitExceeded, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from chatbot.utils import _call_provider
+
+MODEL = 'llama-3.1-8b-instant'
+
+
+def setup(rpm, tpm, provider_rpm=None):
+    settings.LLM_BACKEND = 'fake'
+    settings.LLM_SCHEDULER = {
+        'ENABLED': True,
+        'DEFAULT_LIMITS': {'rpm': rpm, 'tpm': tpm},
+        'LIMITS': {},
+        'DEADLINES': {PRIORITY_INTERACTIVE: 10, PRIORITY_BATCH: 10},
+    }
+    set_fake_provider(FakeRateLimitedProvider(rpm=provider_rpm or rpm, tpm=tpm, latency=0.01))
+    scheduler.reset()
+
+
+def call(content, priority, deadline=None):
+    messages = [{'role': 'user', 'content': content}]
+    return _call_provider(MODEL, messages, 0.7, 50, priority, deadline)
+
+
+def test_no_429_under_burst():
+    """A burst larger than the per-minute token quota is paced, never rejected upstream"""
+    print("Testing burst of 70 requests (~3800 tokens) against 3000 tpm...")
+    setup(rpm=600, tpm=3000)
+    settings.LLM_SCHEDULER['DEADLINES'] = {PRIORITY_INTERACTIVE: 60, PRIORITY_BATCH: 60}
+    provider = FakeRateLimitedProvider(rpm=600, tpm=3000, latency=0.01)
+    set_fake_provider(provider)
+    errors = []
+
+    def worker(i):
+        try:
+            call(f'question {i}', PRIORITY_BATCH)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(70)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ok = not errors and provider.rejected == 0
+    print(f"[{'OK' if ok else 'X'}] served={provider.calls} upstream_429s={provider.rejected} errors={len(errors)}")
+    return ok
+
+
+def test_interactive_jumps_queue():
+    """With the bucket drained, an interactive request is admitted before queued batch work"""
+    print("Testing interactive priority over batch...")
+    setup(rpm=60, tpm=100000, provider_rpm=10000)  # scheduler refills one request per second
+    for i in range(60):
+        call(f'drain {i}', PRIORITY_BATCH)
+
+    order = []
+
+    def worker(name, priority):
+        call(name, priority)
+        order.append(name)
+
+    batch = [threading.Thread(target=worker, args=(f'batch-{i}', PRIORITY_BATCH)) for i in range(3)]
+    for t in batch:
+        t.start()
+    time.sleep(0.2)
+    interactive = threading.Thread(target=worker, args=('interactive', PRIORITY_INTERACTIVE))
+    interactive.start()
+    for t in batch + [interactive]:
+        t.join()
+
+    ok = order[0] == 'interactive'
+    print(f"[{'OK' if ok else 'X'}] admission order: {order}")
+    return ok
+
+
+def test_sheds_past_deadline():
+    """A request that cannot start within its deadline fails fast with retry_after"""
+    print("Testing load shedding...")
+    setup(rpm=2, tpm=100000)
+    call('one', PRIORITY_INTERACTIVE)
+    call('two', PRIORITY_INTERACTIVE)
+    started = time.monotonic()
+    try:
+        call('three', PRIORITY_INTERACTIVE, deadline=1)
+    except RateLimitExceeded as e:
+        elapsed = time.monotonic() - started
+        ok = elapsed < 0.5 and e.retry_after > 1
+        print(f"[{'OK' if ok else 'X'}] shed after {elapsed:.2f}s, retry_after={e.retry_after:.1f}s")
+        return ok
+    print("[X] request was not shed")
+    return False
+
+
+if __name__ == '__main__':
+    results = [test_no_429_under_burst(), test_interactive_jumps_queue(), test_sheds_past_deadline()]
+    print(f"\n{sum(results)}/{len(results)} passed")
@@ -0,0 +1,158 @@
+"""Offline test for segmenting previous papers into questions, grouping repeats and ranking chosen papers"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from chatbot.dedup import NearDuplicateIndex
+from chatbot.fake_provider import FakeRateLimitedProvider, set_fake_provider
+from chatbot.models import PreviousPaper
+from chatbot.paper_mining import segment_questions, get_config, mine_subject, topic_table, papers_without_questions
+
+PAPER_2021 = """B.E. DEGREE EXAMINATION NOV/DEC 2021
+Time: 3 hours   Max Marks: 100
+PART A (10 x 2 = 20 marks)
+1. What is a process control block?
+2. Define deadlock. (CO2)
+PART B (5 x 16 = 80 marks)
+11. (a) Explain the Banker's algorithm for deadlock avoidance
+with an example.
+OR
+(b) Discuss paging with a neat diagram and explain the TLB. [16]
+12. (a) Explain round robin scheduling with an example (8 marks)
+"""
+
+PAPER_2023 = """PART A - 2 marks each
+Q1. Define a deadlock
+Q2. What is the use of a process control block (PCB)?
+PART B
+Q11. Explain Banker's algorithm for deadlock avoidance with example. (16 marks)
+Q12. Explain paging and the role of TLB with a neat diagram (16 M)
+"""
+
+
+def test_segmentation():
+    """Numbering, sub-parts, continuation lines, annotations and marks are handled"""
+    print("Testing segmentation...")
+    questions = segment_questions(PAPER_2021)
+    expected = [
+        ("What is a process control block?", 2),
+        ("Define deadlock", 2),
+        ("Explain the Banker's algorithm for deadlock avoidance with an example", 16),
+        ("Discuss paging with a neat diagram and explain the TLB", 16),
+        ("Explain round robin scheduling with an example", 8),
+    ]
+    got = [(q['text'], q['marks']) for q in questions]
+    ok = got == expected
+    print(f"[{'OK' if ok else 'X'}] segmented {len(got)}/{len(expected)} questions")
+    if not ok:
+        print(f"    got {got}")
+    return ok
+
+
+def test_repeats_across_years_match():
+    """Rephrased repeats in a later paper match the earlier question, new ones do not"""
+    print("Testing cross-year matching...")
+    config = get_config()
+    index = NearDuplicateIndex(threshold=config['MATCH_THRESHOLD'], bands=config['LSH_BANDS'])
+    earlier = segment_questions(PAPER_2021)
+    for question in earlier:
+        index.add(question['text'])
+    matches = [index.best_match(q['text']) for q in segment_questions(PAPER_2023)]
+    matched = [earlier[position]['text'] if score >= index.threshold else None for position, score in matches]
+    ok = matched == [
+        "Define deadlock",
+        "What is a process control block?",
+        "Explain the Banker's algorithm for deadlock avoidance with an example",
+        "Discuss paging with a neat diagram and explain the TLB",
+    ]
+    print(f"[{'OK' if ok else 'X'}] {sum(1 for m in matched if m)}/4 repeats matched")
+    return ok
+
+
+PAPER_NETWORKS = """PART A - 2 marks each
+1. What is a routing table?
+2. Define the sliding window protocol
+PART B
+11. Explain the TCP three-way handshake with a diagram (16 marks)
+"""
+
+PAPER_DBMS = """PART A (5 x 2 = 10 marks)
+1. What is a foreign key?
+2. Define third normal form
+"""
+
+# Prose that cannot be split into numbered questions
+PAPER_NOTES = "Important areas this year: deadlock recovery, virtual memory thrashing and disk scheduling."
+
+
+def test_prediction_uses_only_chosen_papers():
+    """The ranked table and the predicted paper follow the papers the student picked"""
+    print("Testing prediction from chosen papers...")
+    a = PreviousPaper.objects.create(subject='Operating Systems', text_content=PAPER_2021)
+    b = PreviousPaper.objects.create(subject='Operating Systems', text_content=PAPER_NETWORKS)
+    other = PreviousPaper.objects.create(subject='DBMS', text_content=PAPER_DBMS)
+    notes = PreviousPaper.objects.create(subject='Operating Systems', text_content=PAPER_NOTES)
+    mine_subject('Operating Systems')
+    mine_subject('DBMS')
+
+    table_a = topic_table('Operating Systems', paper_ids=[a.id])
+    table_b = topic_table('Operating Systems', paper_ids=[b.id])
+    table_mixed = topic_table('Operating Systems', paper_ids=[a.id, other.id])
+    tables_ok = ('Banker' in table_a and 'handshake' not in table_a
+                 and 'handshake' in table_b and 'Banker' not in table_b
+                 and 'foreign key' in table_mixed)
+    unsegmented_ok = papers_without_questions([a.id, notes.id]) == {notes.id}
+
+    def predict(paper_ids):
+        return Client().post('/api/question-paper/predict/', {
+            'requirements': json.dumps({'2': 2}),
+            'previous_paper_ids': str(paper_ids),
+        }).json()['questions']
+
+    predictions_ok = predict(a.id) != predict(b.id)
+    # The notes are passed as text alongside the table, not dropped
+    predictions_ok = predictions_ok and predict(f'{a.id},{notes.id}') != predict(a.id)
+    ok = tables_ok and unsegmented_ok and predictions_ok
+    print(f"[{'OK' if ok else 'X'}] tables follow the chosen papers: {tables_ok}, "
+          f"unsegmented paper found: {unsegmented_ok}, predictions differ: {predictions_ok}")
+    return ok
+
+
+if __name__ == '__main__':
+    scratch = tempfile.mkdtemp(prefix='paper-mining-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'test.sqlite3')
+    # Predictions come from the offline provider; nothing is cached between the two requests
+    settings.LLM_BACKEND = 'fake'
+    settings.LLM_CACHE = dict(settings.LLM_CACHE, ENABLED=False)
+    settings.LLM_SCHEDULER = dict(settings.LLM_SCHEDULER, ENABLED=False)
+    settings.ALLOWED_HOSTS = ['*']
+    set_fake_provider(FakeRateLimitedProvider(rpm=10000, tpm=10000000, latency=0))
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        call_command('populate_models', verbosity=0)
+        results = [
+            test_segmentation(),
+            test_repeats_across_years_match(),
+            test_prediction_uses_only_chosen_papers(),
+        ]
+    finally:
+        teardown_databases(old_config, verbosity=0)
+    print(f"\n{sum(results)}/{len(results)} passed")
@@ -0,0 +1,116 @@
+"""Offline test: progressive quizzes whose generator died stop reporting 'generating'"""
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+from django.utils import timezone
+
+from chatbot import progressive_quiz
+from chatbot.models import Quiz, QuizQuestion
+
+
+def make_quiz(started_seconds_ago, questions=0):
+    """A quiz left 'generating' by a generator that started that long ago"""
+    quiz = Quiz.objects.create(
+        topic='Deadlocks', source_type='prompt', total_questions=10,
+        generation_status=Quiz.STATUS_GENERATING,
+        generation_started_at=timezone.now() - timedelta(seconds=started_seconds_ago)
+    )
+    for i in range(questions):
+        QuizQuestion.objects.create(
+            quiz=quiz, question=f'Question {i}?', options=['A) a', 'B) b', 'C) c', 'D) d'],
+            correct_answer='A) a', order=i
+        )
+    return quiz
+
+
+def poll(quiz):
+    return Client().get(f'/api/quiz/{quiz.id}/questions/?after=-1').json()
+
+
+def test_running_generation_is_left_alone():
+    """A quiz within STALE_AFTER keeps generating"""
+    print("Testing a quiz that is still within the stale threshold...")
+    data = poll(make_quiz(started_seconds_ago=60))
+    ok = data['generation_status'] == Quiz.STATUS_GENERATING
+    print(f"[{'OK' if ok else 'X'}] status after 60s: {data['generation_status']}")
+    return ok
+
+
+def test_stale_quiz_without_questions_fails():
+    """A quiz stuck without questions is failed with a message for the student"""
+    print("Testing a stale quiz with no questions...")
+    quiz = make_quiz(started_seconds_ago=600)
+    data = poll(quiz)
+    stored = Quiz.objects.get(id=quiz.id).generation_status
+    ok = data['generation_status'] == stored == Quiz.STATUS_FAILED and bool(data['message'])
+    print(f"[{'OK' if ok else 'X'}] status after 600s: {data['generation_status']} ({data['message']!r})")
+    return ok
+
+
+def test_stale_quiz_keeps_partial_questions():
+    """Questions saved before the generator died are served and counted"""
+    print("Testing a stale quiz with 3 of 10 questions...")
+    data = poll(make_quiz(started_seconds_ago=600, questions=3))
+    ok = (data['generation_status'] == Quiz.STATUS_FAILED and len(data['questions']) == 3
+          and data['total_questions'] == 3 and not data['message'])
+    print(f"[{'OK' if ok else 'X'}] status {data['generation_status']}, "
+          f"{len(data['questions'])} questions, total_questions {data['total_questions']}")
+    return ok
+
+
+def test_late_generator_keeps_quiz_failed():
+    """A generator that finishes after the quiz was reported stale does not revive it"""
+    print("Testing a generator that outlives STALE_AFTER...")
+    quiz = make_quiz(started_seconds_ago=0)
+
+    def outlive_stale_after(topic, source_text, num_questions, label, on_question):
+        Quiz.objects.filter(id=quiz.id).update(generation_started_at=timezone.now() - timedelta(seconds=600))
+        poll(quiz)
+        for i in range(num_questions):
+            on_question({'question': f'Late question about topic {i} number {i * 7}?',
+                         'options': ['A) a', 'B) b', 'C) c', 'D) d'], 'correct_answer': 'A) a'})
+
+    generate_in_batches = progressive_quiz.generate_in_batches
+    progressive_quiz.generate_in_batches = outlive_stale_after
+    try:
+        progressive_quiz.generate_into_quiz(quiz.id, 'Deadlocks', 10)
+    finally:
+        progressive_quiz.generate_in_batches = generate_in_batches
+    stored = Quiz.objects.get(id=quiz.id)
+    ok = stored.generation_status == Quiz.STATUS_FAILED
+    print(f"[{'OK' if ok else 'X'}] status after the generator finished: {stored.generation_status}")
+    return ok
+
+
+if __name__ == '__main__':
+    scratch = tempfile.mkdtemp(prefix='progressive-quiz-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'test.sqlite3')
+    settings.PROGRESSIVE_QUIZ = dict(settings.PROGRESSIVE_QUIZ, STALE_AFTER=300)
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        results = [
+            test_running_generation_is_left_alone(),
+            test_stale_quiz_without_questions_fails(),
+            test_stale_quiz_keeps_partial_questions(),
+            test_late_generator_keeps_quiz_failed(),
+        ]
+    finally:
+        teardown_databases(old_config, verbosity=0)
+    print(f"\n{sum(results)}/{len(results)} passed")
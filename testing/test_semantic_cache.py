@@ -0,0 +1,93 @@
+"""Offline test: semantic answer cache hits paraphrases but not different questions"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from chatbot import semantic_cache, utils
+from chatbot.models import Document
+
+MODEL = 'llama-3.1-8b-instant'
+CACHED_QUERY = 'what is normalization'
+CACHED_ANSWER = 'Normalization organises tables to reduce redundancy.'
+
+CHUNKS = [
+    "Normalization organises the tables of a relational database to reduce redundancy. "
+    "Each normal form removes a kind of anomaly from inserts, updates and deletes.",
+    "Denormalization adds redundant columns back to speed up reads at the cost of writes.",
+    "Sharding splits the rows of a table across several database servers.",
+    "Indexes let the database find rows without scanning the whole table.",
+]
+
+
+def make_document():
+    """An indexed document with one cached answer"""
+    document = Document.objects.create(title='Databases', file_type='pdf', text_content='\n'.join(CHUNKS))
+    utils.create_vector_store(document.id, CHUNKS)
+    semantic_cache.store_answer(CACHED_QUERY, document.id, MODEL, CACHED_ANSWER)
+    return document
+
+
+def test_paraphrase_hits(document):
+    """A rephrasing in the document's vocabulary is answered from the cache"""
+    print("Testing an in-vocabulary paraphrase...")
+    answer, _ = semantic_cache.lookup_answer('explain normalization', document.id, MODEL)
+    ok = answer == CACHED_ANSWER
+    print(f"[{'OK' if ok else 'X'}] 'explain normalization' -> {answer!r}")
+    return ok
+
+
+def test_different_questions_miss(document):
+    """Questions whose distinguishing words are outside the vocabulary are not served the cached answer"""
+    print("Testing questions with out-of-vocabulary content words...")
+    ok = True
+    for query in ('what are the disadvantages of normalization',
+                  'how does normalization differ from denormalization and sharding'):
+        answer, _ = semantic_cache.lookup_answer(query, document.id, MODEL)
+        ok = ok and answer is None
+        print(f"[{'OK' if answer is None else 'X'}] {query!r} -> {answer!r}")
+    return ok
+
+
+def test_out_of_vocabulary_queries_are_not_stored(document):
+    """An answer to an out-of-vocabulary query cannot later be served for the base question"""
+    print("Testing that out-of-vocabulary queries are not cached...")
+    other = Document.objects.create(title='Databases again', file_type='pdf')
+    utils.create_vector_store(other.id, CHUNKS)
+    semantic_cache.store_answer('what are the disadvantages of normalization', other.id, MODEL, 'Slower writes.')
+    answer, _ = semantic_cache.lookup_answer(CACHED_QUERY, other.id, MODEL)
+    ok = answer is None
+    print(f"[{'OK' if ok else 'X'}] {CACHED_QUERY!r} after storing a different question -> {answer!r}")
+    return ok
+
+
+if __name__ == '__main__':
+    scratch = tempfile.mkdtemp(prefix='semantic-cache-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'test.sqlite3')
+    utils.VECTOR_STORE_DIR = Path(scratch)
+    settings.SEMANTIC_CACHE = dict(getattr(settings, 'SEMANTIC_CACHE', {}), ENABLED=True, ALIAS='default')
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        document = make_document()
+        results = [
+            test_paraphrase_hits(document),
+            test_different_questions_miss(document),
+            test_out_of_vocabulary_queries_are_not_stored(document),
+        ]
+    finally:
+        teardown_databases(old_config, verbosity=0)
+    print(f"\n{sum(results)}/{len(results)} passed")
@@ -0,0 +1,123 @@
+"""Offline test for buffered ModelUsage prompt counters on a throwaway SQLite database"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_assistant.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases, CaptureQueriesContext
+
+from chatbot import usage_counters
+from chatbot.models import AIModel, ModelUsage
+
+
+def setup(flush_every, flush_interval=3600):
+    settings.USAGE_COUNTERS = {'BUFFERED': True, 'FLUSH_EVERY': flush_every, 'FLUSH_INTERVAL': flush_interval}
+    usage_counters.flush()
+    ModelUsage.objects.all().delete()
+
+
+def test_concurrent_prompts_are_counted():
+    """Prompts from many threads on the shared 'default' session all reach the database"""
+    print("Testing 8 threads x 50 prompts on one session...")
+    setup(flush_every=25)
+    model = AIModel.objects.first()
+
+    def worker():
+        try:
+            for _ in range(50):
+                usage_counters.record_prompt('default', model)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    usage_counters.flush()
+
+    count = ModelUsage.objects.get(session_key='default', model=model).prompt_count
+    ok = count == 400
+    print(f"[{'OK' if ok else 'X'}] stored prompt_count {count} (expected 400)")
+    return ok
+
+
+def test_writes_are_coalesced():
+    """A run of prompts costs one read and one write transaction, not a write per prompt"""
+    print("Testing write coalescing...")
+    setup(flush_every=50)
+    model = AIModel.objects.first()
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(49):
+            usage_counters.record_prompt('session-a', model)
+    writes = [q for q in queries.captured_queries if not q['sql'].startswith('SELECT')]
+    with CaptureQueriesContext(connection) as queries:
+        usage_counters.record_prompt('session-a', model)
+    flushed = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+    count = ModelUsage.objects.get(session_key='session-a', model=model).prompt_count
+    ok = not writes and len(flushed) == 1 and count == 50
+    print(f"[{'OK' if ok else 'X'}] {len(writes)} writes for 49 buffered prompts, "
+          f"{len(flushed)} UPDATE at the 50th, stored count {count}")
+    return ok
+
+
+def test_feedback_threshold_uses_buffered_count():
+    """need_feedback fires on the 10th unflushed prompt and resets after feedback"""
+    print("Testing feedback threshold...")
+    setup(flush_every=1000)
+    model = AIModel.objects.first()
+    flags = [usage_counters.record_prompt('session-b', model)[1] for _ in range(10)]
+    usage_counters.mark_feedback('session-b', model)
+    count, need_feedback = usage_counters.record_prompt('session-b', model)
+    ok = flags == [False] * 9 + [True] and count == 11 and not need_feedback
+    print(f"[{'OK' if ok else 'X'}] first request at prompt {flags.index(True) + 1 if True in flags else None}, "
+          f"after feedback: count {count}, need_feedback {need_feedback}")
+    return ok
+
+
+def test_quiet_traffic_is_flushed_by_timer():
+    """Prompts followed by silence reach the database after FLUSH_INTERVAL"""
+    print("Testing the FLUSH_INTERVAL timer...")
+    setup(flush_every=1000, flush_interval=0.2)
+    model = AIModel.objects.first()
+    for _ in range(3):
+        usage_counters.record_prompt('session-c', model)
+    time.sleep(1)
+    row = ModelUsage.objects.filter(session_key='session-c', model=model).first()
+    count = row.prompt_count if row else 0
+    ok = count == 3
+    print(f"[{'OK' if ok else 'X'}] stored prompt_count {count} after 1s without prompts (expected 3)")
+    return ok
+
+
+if __name__ == '__main__':
+    scratch = tempfile.mkdtemp(prefix='usage-counters-')
+    database = connections['default'].settings_dict
+    database['TEST']['NAME'] = os.path.join(scratch, 'test.sqlite3')
+    database['OPTIONS']['timeout'] = 30
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        AIModel.objects.create(name='Test model', model_id='test-model', provider='groq')
+        results = [
+            test_concurrent_prompts_are_counted(),
+            test_writes_are_coalesced(),
+            test_feedback_threshold_uses_buffered_count(),
+            test_quiet_traffic_is_flushed_by_timer(),
+        ]
+    finally:
+        usage_counters.flush()
+        teardown_databases(old_config, verbosity=0)
+    print(f"\n{sum(results)}/{len(results)} passed")